@@ -0,0 +1,79 @@
+"""
+Compares clean_data.compute_distributions() with its original list based implementation, on a synthetic edges.csv.
+
+Usage : python benchmarks/compute_distributions.py [edges_count]
+"""
+import contextlib
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import graphGitHub.clean_data as preprocess
+
+
+def legacy_compute_distributions(edges_file):
+    # Original implementation of compute_distributions(), without plots.
+    with open(edges_file, "r") as edges:
+        contributions = csv.DictReader(edges, delimiter=",")
+        rep_by_users_counts = {}
+        users_by_rep_counts = {}
+
+        for contribution in contributions:
+            user = contribution["Source"]
+            if user not in list(rep_by_users_counts.keys()):
+                rep_by_users_counts[user] = 1
+            else:
+                rep_by_users_counts[user] = rep_by_users_counts[user] + 1
+
+            repository = contribution["Target"]
+            if repository not in list(users_by_rep_counts.keys()):
+                users_by_rep_counts[repository] = 1
+            else:
+                users_by_rep_counts[repository] = users_by_rep_counts[repository] + 1
+
+        return users_by_rep_counts, rep_by_users_counts
+
+
+def write_edges(path, edges_count, seed=0):
+    # Writes a bipartite edges.csv file with power law distributed degrees.
+    generator = random.Random(seed)
+    users_count = max(1, edges_count // 4)
+    repositories_count = max(1, edges_count // 8)
+    with open(path, "w") as edges_file:
+        edges_file.write("Source,Target,Weight\n")
+        for _ in range(edges_count):
+            # Log-uniform ids : the degree of the node of rank k is proportional to 1 / k.
+            user = int(users_count ** generator.random()) - 1
+            repository = users_count + int(repositories_count ** generator.random()) - 1
+            edges_file.write(str(user) + "," + str(repository) + "," + str(generator.randint(1, 500)) + "\n")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    # compute_distributions() prints its progress
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(edges_count):
+    with tempfile.TemporaryDirectory() as folder:
+        edges_path = os.path.join(folder, "edges.csv")
+        write_edges(edges_path, edges_count)
+
+        legacy_result, legacy_time = timed(legacy_compute_distributions, edges_path)
+        result, new_time = timed(preprocess.compute_distributions, edges_path, False)
+
+    assert result == legacy_result, "compute_distributions() results differ from the original implementation."
+    print(str(edges_count) + " edges, " + str(len(result[0])) + " repositories, " + str(len(result[1])) + " users")
+    print("original : " + str(round(legacy_time, 3)) + "s")
+    print("current  : " + str(round(new_time, 3)) + "s")
+    print("speedup  : x" + str(round(legacy_time / new_time, 1)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
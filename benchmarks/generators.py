@@ -0,0 +1,118 @@
+"""
+Synthetic datasets with power law distributed degrees, in the formats written by the crawlers :
+    - rest/users.csv, rest/repositories.csv and rest/contributions.csv, for rest_api.raw2gephi() and clean_data,
+    - graphql/graphql_data.txt, for graphql_api.graphql2csv(),
+    - in memory contributions, served by the mock GitHub API of mock_github.py.
+
+Node ranks are drawn log-uniformly, so that the degree of the node of rank k is proportional to 1 / k.
+
+Usage : python benchmarks/generators.py destination_folder [edges_count]
+"""
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+# Number of contributions generated and written at once.
+_CHUNK_SIZE = 1000000
+_LANGUAGES = ("Python", "JavaScript", "Java", "Go", "C", "Rust", None)
+
+
+def nodes_counts(edges_count):
+    """
+    Returns the number of users and repositories of a dataset of edges_count contributions.
+    """
+    return max(1, edges_count // 4), max(1, edges_count // 8)
+
+
+def _power_law_ranks(generator, nodes_count, size):
+    return (nodes_count ** generator.random(size)).astype(np.int64) - 1
+
+
+def contributions(edges_count, seed=0):
+    """
+    Returns the contributions of a dataset, sorted by repository, without duplicated (repository, user) pairs. Users
+    and repositories are identified by their rank, their GitHub ids are rank + 1.
+
+    :return: A size 3 tuple containing the repository ranks, user ranks and contributions count of each contribution.
+    :rtype: tuple of numpy.ndarray
+    """
+    generator = np.random.default_rng(seed)
+    users_count, repositories_count = nodes_counts(edges_count)
+    repositories = _power_law_ranks(generator, repositories_count, edges_count)
+    users = _power_law_ranks(generator, users_count, edges_count)
+    pairs = np.unique(repositories * users_count + users)
+    counts = generator.integers(1, 500, len(pairs), endpoint=True)
+    return pairs // users_count, pairs % users_count, counts
+
+
+def write_rest_dataset(folder, edges_count, seed=0):
+    """
+    Writes the rest/users.csv, rest/repositories.csv and rest/contributions.csv files of a dataset of edges_count
+    contributions in folder. Contributions are generated and written by chunks, so that 10^8 contributions can be
+    written with a constant memory usage.
+    """
+    rest_folder = os.path.join(folder, "rest")
+    os.makedirs(rest_folder, exist_ok=True)
+    users_count, repositories_count = nodes_counts(edges_count)
+    with open(os.path.join(rest_folder, "users.csv"), "w") as users_file:
+        for first in range(0, users_count, _CHUNK_SIZE):
+            ids = np.arange(first + 1, min(users_count, first + _CHUNK_SIZE) + 1)
+            users_file.write("".join(str(i) + ", user" + str(i) + "\n" for i in ids.tolist()))
+    with open(os.path.join(rest_folder, "repositories.csv"), "w") as repositories_file:
+        for first in range(0, repositories_count, _CHUNK_SIZE):
+            ids = np.arange(first + 1, min(repositories_count, first + _CHUNK_SIZE) + 1)
+            repositories_file.write("".join(str(i) + ",owner" + str(i) + "/repository" + str(i) + "\n"
+                                            for i in ids.tolist()))
+
+    generator = np.random.default_rng(seed)
+    with open(os.path.join(rest_folder, "contributions.csv"), "w") as contributions_file:
+        for first in range(0, edges_count, _CHUNK_SIZE):
+            size = min(_CHUNK_SIZE, edges_count - first)
+            chunk = np.column_stack((_power_law_ranks(generator, repositories_count, size) + 1,
+                                     _power_law_ranks(generator, users_count, size) + 1,
+                                     generator.integers(1, 500, size, endpoint=True)))
+            np.savetxt(contributions_file, chunk, fmt="%d", delimiter=",")
+
+
+def graphql_user(rank, seed=0, repositories_count=100000, repositories_by_user=20):
+    """
+    Returns the user node of the given rank, as fetched by graphql_api.fetch_data(). Nodes only depend on their rank
+    and seed, so that any page of users can be generated on demand.
+    """
+    generator = random.Random(seed * 1000003 + rank)
+    total_count = int(repositories_by_user * 10 ** generator.random()) if generator.random() < 0.2 \
+        else int(repositories_by_user ** generator.random())
+    repositories = sorted({int(repositories_count ** generator.random()) for _ in range(total_count)})
+    nodes = []
+    for repository in repositories[:repositories_by_user]:
+        language = _LANGUAGES[repository % len(_LANGUAGES)]
+        nodes.append({"stargazers": {"totalCount": repositories_count // (repository + 1)},
+                      "primaryLanguage": None if language is None else {"name": language},
+                      "id": "R" + str(repository),
+                      "name": "repository" + str(repository)})
+    return {"id": "U" + str(rank),
+            "name": "user" + str(rank),
+            "repositoriesContributedTo": {"totalCount": len(repositories),
+                                          "pageInfo": {"endCursor": None,
+                                                       "hasNextPage": len(repositories) > repositories_by_user},
+                                          "nodes": nodes}}
+
+
+def write_graphql_dataset(folder, users_count, seed=0, repositories_by_user=20):
+    """
+    Writes the graphql/graphql_data.txt file of users_count users in folder.
+    """
+    graphql_folder = os.path.join(folder, "graphql")
+    os.makedirs(graphql_folder, exist_ok=True)
+    with open(os.path.join(graphql_folder, "graphql_data.txt"), "w") as raw_data:
+        for rank in range(users_count):
+            raw_data.write(json.dumps(graphql_user(rank, seed, users_count, repositories_by_user)) + "\n")
+
+
+if __name__ == "__main__":
+    edges = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    write_rest_dataset(sys.argv[1], edges)
+    write_graphql_dataset(sys.argv[1], nodes_counts(edges)[0] // 10)
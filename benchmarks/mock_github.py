@@ -0,0 +1,199 @@
+"""
+Local mock of the GitHub API endpoints used by the crawlers, serving a synthetic dataset of generators.py :
+    - REST GET /repositories?since=, /repos/{owner}/{name}/contributors and /rate_limit,
+    - GraphQL POST /graphql search of users.
+
+Responses are paginated as GitHub does (Link headers, cursors and the 1000 results limit of the search), carry the
+X-RateLimit headers, and can be delayed by a fixed latency, so that crawls can be measured without using any quota.
+
+Usage : python benchmarks/mock_github.py [edges_count] [port]
+"""
+import base64
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import generators
+
+_CONTRIBUTORS_PATH = re.compile(r"^/repos/owner(\d+)/repository\d+/contributors$")
+
+
+class MockGitHub:
+    """
+    Mock GitHub API server, running in a background thread.
+
+    :param edges_count: Number of contributions of the served dataset.
+    :param seed: Seed of the served dataset.
+    :param latency: Delay added to each response, in seconds.
+    :param rate_limit: Number of requests allowed by rate limit window. Exhausted windows are answered with 403.
+    :param rate_limit_window: Duration of a rate limit window, in seconds.
+    :param repositories_by_page: Number of repositories by page of /repositories.
+    :param search_limit: Maximum number of results of a GraphQL search.
+    :param port: Listened port, 0 for any free port.
+    """
+
+    def __init__(self, edges_count=100000, seed=0, latency=0.0, rate_limit=10 ** 9, rate_limit_window=3600,
+                 repositories_by_page=100, search_limit=1000, port=0):
+        self.seed = seed
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.repositories_by_page = repositories_by_page
+        self.search_limit = search_limit
+        self.requests_count = 0
+
+        self.users_count, self.repositories_count = generators.nodes_counts(edges_count)
+        repositories, self._users, self._counts = generators.contributions(edges_count, seed)
+        # Contributors of each repository, in CSR format.
+        self._indptr = np.zeros(self.repositories_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(repositories, minlength=self.repositories_count), out=self._indptr[1:])
+
+        self._lock = threading.Lock()
+        self._remaining = rate_limit
+        self._reset = time.time() + rate_limit_window
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:" + str(self._server.server_port) + "/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def charge(self):
+        # Consumes a request of the current rate limit window, and returns the rate limit headers.
+        with self._lock:
+            self.requests_count += 1
+            if time.time() >= self._reset:
+                self._remaining = self.rate_limit
+                self._reset = time.time() + self.rate_limit_window
+            allowed = self._remaining > 0
+            self._remaining = max(0, self._remaining - 1)
+            return allowed, {"X-RateLimit-Limit": str(self.rate_limit),
+                             "X-RateLimit-Remaining": str(self._remaining),
+                             "X-RateLimit-Reset": str(int(self._reset))}
+
+    def rate_limit_status(self):
+        with self._lock:
+            resource = {"limit": self.rate_limit, "remaining": self._remaining, "reset": int(self._reset)}
+        return {"resources": {"core": resource, "graphql": resource}, "rate": resource}
+
+    def repositories(self, since):
+        first = max(0, since)
+        return [{"id": rank + 1, "full_name": "owner" + str(rank + 1) + "/repository" + str(rank + 1)}
+                for rank in range(first, min(first + self.repositories_by_page, self.repositories_count))]
+
+    def contributors(self, repository_id):
+        start, end = self._indptr[repository_id - 1], self._indptr[repository_id]
+        # Sorted by contributions, as GitHub does.
+        order = np.argsort(-self._counts[start:end], kind="stable") + start
+        return [{"id": user + 1, "login": "user" + str(user + 1), "contributions": count}
+                for user, count in zip(self._users[order].tolist(), self._counts[order].tolist())]
+
+    def search_users(self, first, after, repositories_by_user):
+        start = 0 if after is None else int(base64.b64decode(after)) + 1
+        end = min(start + first, self.users_count, self.search_limit)
+        edges = [{"node": generators.graphql_user(rank, self.seed, self.repositories_count, repositories_by_user),
+                  "cursor": base64.b64encode(str(rank).encode()).decode()}
+                 for rank in range(start, end)]
+        return {"userCount": self.users_count,
+                "pageInfo": {"endCursor": edges[-1]["cursor"] if len(edges) > 0 else None,
+                             "hasNextPage": end < min(self.users_count, self.search_limit)},
+                "edges": edges}
+
+
+def _handler(mock):
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive connections, as with GitHub.
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers):
+            data = b"" if body is None else json.dumps(body).encode("utf-8")
+            if mock.latency > 0:
+                time.sleep(mock.latency)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _rate_limited(self):
+            allowed, headers = mock.charge()
+            if not allowed:
+                self._send(403, {"message": "API rate limit exceeded"}, headers)
+            return headers if allowed else None
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/rate_limit":
+                self._send(200, mock.rate_limit_status(), {})
+                return
+            headers = self._rate_limited()
+            if headers is None:
+                return
+            if url.path == "/repositories":
+                self._send(200, mock.repositories(int(query.get("since", ["0"])[0])), headers)
+                return
+            match = _CONTRIBUTORS_PATH.match(url.path)
+            if match is None or not 0 < int(match.group(1)) <= mock.repositories_count:
+                self._send(404, {"message": "Not Found"}, headers)
+                return
+            contributors = mock.contributors(int(match.group(1)))
+            if len(contributors) == 0:
+                self._send(204, None, headers)
+                return
+            per_page = int(query.get("per_page", ["30"])[0])
+            page = int(query.get("page", ["1"])[0])
+            if page * per_page < len(contributors):
+                headers["Link"] = "<" + mock.url + url.path.lstrip("/") + "?per_page=" + str(per_page) \
+                                  + "&page=" + str(page + 1) + ">; rel=\"next\""
+            self._send(200, contributors[(page - 1) * per_page:page * per_page], headers)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            headers = self._rate_limited()
+            if headers is None:
+                return
+            if urlparse(self.path).path != "/graphql" or "search" not in request.get("query", ""):
+                self._send(200, {"errors": [{"message": "Unsupported query"}]}, headers)
+                return
+            variables = request.get("variables", {})
+            search = mock.search_users(variables["first"], variables.get("after"), variables["repositories"])
+            reset = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(int(headers["X-RateLimit-Reset"])))
+            rate_limit = {"cost": 1, "remaining": int(headers["X-RateLimit-Remaining"]), "resetAt": reset}
+            self._send(200, {"data": {"rateLimit": rate_limit, "search": search}}, headers)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    with MockGitHub(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+                    port=int(sys.argv[2]) if len(sys.argv) > 2 else 8000) as server:
+        print("Serving the mock GitHub API on " + server.url)
+        threading.Event().wait()
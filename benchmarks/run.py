@@ -0,0 +1,167 @@
+"""
+Offline benchmarks of the crawlers and converters, run against the mock GitHub API of mock_github.py and the synthetic
+datasets of generators.py. Each benchmark runs in its own process, and reports its throughput and its peak memory
+usage (maximum resident set size).
+
+Usage : PYTHONPATH=. python benchmarks/run.py [--edges N] [--crawl-edges N] [--latency S] [--workers N] [benchmark ...]
+
+Available benchmarks : rest_fetch_data, graphql_fetch_data, raw2gephi, graphql2csv, compute_distributions, clean.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import generators
+from mock_github import MockGitHub
+
+
+def rest_fetch_data(folder, options):
+    import graphGitHub.rest_api as api
+    api.entry_point = options.url
+    os.makedirs(os.path.join(folder, "rest"))
+    # Only the first crawl_repositories repositories of the dataset are crawled.
+    with open(os.path.join(options.dataset, "crawl_repositories.csv"), "r") as source:
+        with open(os.path.join(folder, "rest", "repositories.csv"), "w") as destination:
+            shutil.copyfileobj(source, destination)
+    return lambda: api.fetch_data("login", "token", results_folder=folder, workers=options.workers), \
+        os.path.join(folder, "rest", "contributions.csv"), False
+
+
+def graphql_fetch_data(folder, options):
+    import graphGitHub.graphql_api as api
+    api.entry_point = options.url + "graphql"
+    return lambda: api.fetch_data("login", "token", total_node=1000, results_folder=folder, write_json=False), \
+        os.path.join(folder, "graphql", "graphql_data.txt"), False
+
+
+def raw2gephi(folder, options):
+    import graphGitHub.rest_api as api
+    rest_folder = os.path.join(options.dataset, "rest")
+    return lambda: api.raw2gephi(os.path.join(rest_folder, "users.csv"),
+                                 os.path.join(rest_folder, "repositories.csv"),
+                                 os.path.join(rest_folder, "contributions.csv"),
+                                 folder,
+                                 workers=options.workers), \
+        os.path.join(folder, "edges.csv"), True
+
+
+def graphql2csv(folder, options):
+    import graphGitHub.graphql_api as api
+    os.makedirs(os.path.join(folder, "graphql"))
+    os.symlink(os.path.join(options.dataset, "graphql", "graphql_data.txt"),
+               os.path.join(folder, "graphql", "graphql_data.txt"))
+    return lambda: api.graphql2csv(folder), os.path.join(folder, "graphql", "contributions.csv"), False
+
+
+def compute_distributions(folder, options):
+    import graphGitHub.clean_data as preprocess
+    edges_path = os.path.join(options.dataset, "gephi", "edges.csv")
+    return lambda: preprocess.compute_distributions(edges_path, plot=False, workers=options.workers), \
+        edges_path, True
+
+
+def clean(folder, options):
+    import graphGitHub.clean_data as preprocess
+    gephi_folder = os.path.join(options.dataset, "gephi")
+    return lambda: preprocess.clean(os.path.join(gephi_folder, "nodes.csv"),
+                                    os.path.join(gephi_folder, "edges.csv"),
+                                    folder,
+                                    workers=options.workers), \
+        os.path.join(gephi_folder, "edges.csv"), True
+
+
+BENCHMARKS = {function.__name__: function for function in (rest_fetch_data, graphql_fetch_data, raw2gephi,
+                                                           graphql2csv, compute_distributions, clean)}
+
+
+def peak_rss():
+    # Maximum resident set size of the current process, in bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_rows(path, header):
+    # Number of lines of a file, without its header line if any.
+    with open(path, "rb") as file:
+        rows = sum(block.count(b"\n") for block in iter(lambda: file.read(1024 * 1024), b""))
+    return max(0, rows - 1) if header else rows
+
+
+def run_child(options):
+    # Runs a single benchmark in the current process, and prints its results as json.
+    folder = tempfile.mkdtemp(dir=options.dataset)
+    try:
+        # Each benchmark returns the measured function, and the file whose rows it processed.
+        benchmark, rows_path, header = BENCHMARKS[options.child](folder, options)
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            benchmark()
+        duration = time.perf_counter() - start
+        print(json.dumps({"rows": count_rows(rows_path, header), "seconds": duration, "peak_rss": peak_rss()}))
+    finally:
+        shutil.rmtree(folder)
+
+
+def prepare_dataset(folder, options):
+    print("Generating " + str(options.edges) + " contributions...")
+    generators.write_rest_dataset(folder, options.edges)
+    generators.write_graphql_dataset(folder, max(1, generators.nodes_counts(options.edges)[0] // 10))
+    with open(os.path.join(folder, "crawl_repositories.csv"), "w") as repositories_file:
+        for rank in range(min(options.crawl_repositories, generators.nodes_counts(options.crawl_edges)[1])):
+            repositories_file.write(str(rank + 1) + ",owner" + str(rank + 1) + "/repository" + str(rank + 1) + "\n")
+
+    import graphGitHub.rest_api as api
+    os.mkdir(os.path.join(folder, "gephi"))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        api.raw2gephi(os.path.join(folder, "rest", "users.csv"),
+                      os.path.join(folder, "rest", "repositories.csv"),
+                      os.path.join(folder, "rest", "contributions.csv"),
+                      os.path.join(folder, "gephi"))
+
+
+def main(options):
+    if options.child is not None:
+        run_child(options)
+        return
+
+    names = options.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark : " + name)
+    with tempfile.TemporaryDirectory() as dataset, \
+            MockGitHub(options.crawl_edges, latency=options.latency) as server:
+        prepare_dataset(dataset, options)
+        print("{:<24}{:>12}{:>12}{:>14}{:>16}".format("benchmark", "rows", "seconds", "rows/s", "peak RSS (MiB)"))
+        for name in names:
+            command = [sys.executable, os.path.abspath(__file__), "--child", name, "--dataset", dataset,
+                       "--url", server.url, "--workers", str(options.workers)]
+            output = subprocess.run(command, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            print("{:<24}{:>12}{:>12.3f}{:>14.0f}{:>16.1f}".format(name, result["rows"], result["seconds"],
+                                                                   result["rows"] / result["seconds"],
+                                                                   result["peak_rss"] / 1024 / 1024))
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of graphGitHub.")
+    parser.add_argument("benchmarks", nargs="*", help="Benchmarks to run, all by default.")
+    parser.add_argument("--edges", type=int, default=1000000, help="Contributions of the converted dataset.")
+    parser.add_argument("--crawl-edges", type=int, default=100000, help="Contributions served by the mock API.")
+    parser.add_argument("--crawl-repositories", type=int, default=2000, help="Repositories crawled by rest_fetch_data.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency of the mock API, in seconds.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers used by the benchmarked functions.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    main(parse_arguments(sys.argv[1:]))
@@ -1,3 +1,4 @@
+import logging
 import graphGitHub.clean_data as preprocess
 
 
@@ -16,4 +17,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s : %(message)s")
     main()
@@ -1,3 +1,4 @@
+import logging
 import os
 import graphGitHub.graphql_api as api
 
@@ -15,9 +16,10 @@ def main(github_user_name, oauth):
                    first_page_cursor=api.get_last_fetched_page("results"),
                    users_by_query=20)
 
-    # Converts results/graphql/data.json to .csv files
+    # Converts results/graphql/graphql_data.txt to .csv files
     api.graphql2csv(results_folder="results")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s : %(message)s")
     main(your_login, your_oauth_token)
@@ -1,4 +1,7 @@
+import logging
 import graphGitHub.rest_api as api
+from graphGitHub.http_cache import HttpCache
+from graphGitHub.metrics import metrics
 
 your_login = ""
 your_oauth_token = ""
@@ -16,14 +19,28 @@ def main(github_user_name, oauth):
 
     # Fetch all repositories data
     print("Fetching results from " + api.get_last_repository_data_fetched("results"))
+    # Unchanged contributors pages are served from the cache when the crawl is performed again.
     api.fetch_data(github_user_name,
                    oauth,
                    begin_to_repo=api.get_last_repository_data_fetched("results"),
-                   results_folder="results")
+                   results_folder="results",
+                   workers=8,
+                   http_cache=HttpCache("results/rest/http_cache.sqlite"))
 
     convert2gephi()
 
 
+def pipelined_crawl(github_user_name, oauth):
+    # Fetches the next 100 repositories and their contributors at once, writing Gephi files as the crawl goes.
+    api.crawl(github_user_name,
+              oauth,
+              total_repositories=100,
+              results_folder="results",
+              workers=8,
+              http_cache=HttpCache("results/rest/http_cache.sqlite"),
+              gephi_folder="results/rest/gephi_crawl")
+
+
 def convert2gephi():
     # Convert .csv files to nodes.csv and edges.csv
     # /!\ No data cleaning yet
@@ -32,5 +49,18 @@ def convert2gephi():
                   "results/rest/contributions.csv", "results/rest/gephi")
 
 
+def update_gephi():
+    # Only converts the data fetched since the last update : existing nodes keep their ids, so that Gephi layouts of
+    # results/rest/gephi_incremental stay valid. New and changed edges are also written to delta_edges.csv.
+    api.raw2gephi("results/rest/users.csv",
+                  "results/rest/repositories.csv",
+                  "results/rest/contributions.csv", "results/rest/gephi_incremental",
+                  incremental=True)
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s : %(message)s")
+    # Requests, latencies, rate limit and written rows, in the Prometheus text format.
+    export = metrics.export_prometheus("results/metrics.prom")
     main(your_login, your_oauth_token)
+    export.set()
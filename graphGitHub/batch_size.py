@@ -0,0 +1,130 @@
+import collections
+import csv
+import time
+
+# Fields of the recorded metrics of each request.
+METRICS_FIELDS = ("time", "users_by_query", "repositories_by_users", "cost", "latency", "nodes", "error")
+
+
+class BatchSizeController:
+    """
+    Tunes the first: arguments of the GraphQL users queries, users_by_query and repositories_by_users, from the cost,
+    latency and errors observed on the previous requests.
+
+    - users_by_query grows by a quarter while requests succeed under target_latency, and is halved after an error or a
+      slow request, as GitHub answers heavy queries with timeouts and 502 errors. It is then rounded up to fill the
+      rate limit points charged for the query, from the costs returned by GitHub : if a query of at least as many
+      users and repositories was charged some points, the next query gets as many users as the largest recorded query
+      charged these points, that come for free.
+    - repositories_by_users follows the coverage quantile of the repositoriesContributedTo totalCount of the last
+      fetched users, so that most users are complete in a single query. It is bounded by a limit that is halved after
+      an error, and that grows back while requests succeed.
+
+    The metrics of each request are kept in the metrics attribute, and appended to metrics_file if specified.
+
+    :param users_by_query: Initial number of users by query.
+    :type users_by_query: int
+    :param repositories_by_users: Initial number of repositories by user.
+    :type repositories_by_users: int
+    :param max_users_by_query: Maximum number of users by query. GitHub doesn't return more than 100 nodes by page.
+    :type max_users_by_query: int
+    :param max_repositories_by_users: Maximum number of repositories by user.
+    :type max_repositories_by_users: int
+    :param target_latency: Latency, in seconds, above which batches are considered as too heavy.
+    :type target_latency: float
+    :param coverage: Fraction of the users whose repositories should be fully fetched.
+    :type coverage: float
+    :param history: Number of the last requests and users kept to tune the sizes.
+    :type history: int
+    :param metrics_file: Path of a csv file to which metrics are appended.
+    :type metrics_file: path-like object
+    """
+
+    def __init__(self,
+                 users_by_query=20,
+                 repositories_by_users=20,
+                 max_users_by_query=100,
+                 max_repositories_by_users=100,
+                 target_latency=10.0,
+                 coverage=0.9,
+                 history=1000,
+                 metrics_file=None):
+        self.users_by_query = users_by_query
+        self.repositories_by_users = repositories_by_users
+        self.max_users_by_query = max_users_by_query
+        self.max_repositories_by_users = max_repositories_by_users
+        self.target_latency = target_latency
+        self.coverage = coverage
+        self.metrics = collections.deque(maxlen=history)
+        self.metrics_file = metrics_file
+        self._repositories_counts = collections.deque(maxlen=history)
+        # (users_by_query, repositories_by_users, cost) of the last successful requests.
+        self._costs = collections.deque(maxlen=history)
+        self._repositories_limit = max_repositories_by_users
+
+    def sizes(self):
+        """
+        Returns the sizes to use for the next query.
+
+        :return: A size 2 tuple containing users_by_query and repositories_by_users.
+        :rtype: tuple of int
+        """
+        users_by_query = self.users_by_query
+        # The cost of a query only grows with its sizes : the next query is charged at most the lowest cost recorded
+        # for a query at least as large, and so are all the recorded queries charged this cost.
+        costs = [cost for users, repositories, cost in self._costs
+                 if users >= users_by_query and repositories >= self.repositories_by_users]
+        if len(costs) > 0:
+            points = min(costs)
+            users_by_query = max([users_by_query] + [users for users, repositories, cost in self._costs
+                                                     if repositories >= self.repositories_by_users and cost <= points])
+        return min(users_by_query, self.max_users_by_query), self.repositories_by_users
+
+    def record(self, users_by_query, repositories_by_users, cost, latency, users=(), error=None):
+        """
+        Records the result of a query, and tunes the sizes of the next ones.
+
+        :param users_by_query: Number of users requested.
+        :param repositories_by_users: Number of repositories requested by user.
+        :param cost: Cost of the query returned by GitHub, None if it failed.
+        :param latency: Duration of the request, in seconds.
+        :param users: Fetched user nodes.
+        :type users: list of dict
+        :param error: Error of a failed request (status code or GraphQL errors).
+        """
+        metrics = dict(zip(METRICS_FIELDS, (time.time(), users_by_query, repositories_by_users, cost, latency,
+                                            len(users), error)))
+        self.metrics.append(metrics)
+        if self.metrics_file is not None:
+            with open(self.metrics_file, "a", newline="") as metrics_file:
+                csv.writer(metrics_file, lineterminator="\n").writerow(metrics[field] for field in METRICS_FIELDS)
+
+        if cost is not None:
+            self._costs.append((users_by_query, repositories_by_users, cost))
+        for user in users:
+            self._repositories_counts.append(user["repositoriesContributedTo"]["totalCount"])
+
+        if error is not None:
+            self.users_by_query = max(1, users_by_query // 2)
+            self._repositories_limit = max(1, repositories_by_users // 2)
+        elif latency > self.target_latency:
+            self.users_by_query = max(1, users_by_query // 2)
+        else:
+            self.users_by_query = min(self.max_users_by_query, users_by_query + max(1, users_by_query // 4))
+            self._repositories_limit = min(self.max_repositories_by_users,
+                                           self._repositories_limit + max(1, self._repositories_limit // 4))
+
+        repositories_by_users = self.repositories_by_users
+        if len(self._repositories_counts) > 0:
+            counts = sorted(self._repositories_counts)
+            repositories_by_users = counts[min(len(counts) - 1, int(self.coverage * len(counts)))]
+        self.repositories_by_users = max(1, min(self._repositories_limit, repositories_by_users))
+
+    def nodes_by_point(self):
+        """
+        Returns the average number of user nodes fetched by rate limit point, over the recorded requests.
+
+        :rtype: float
+        """
+        points = sum(metrics["cost"] for metrics in self.metrics if metrics["cost"] is not None)
+        return sum(metrics["nodes"] for metrics in self.metrics) / max(points, 1)
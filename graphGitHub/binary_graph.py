@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import warnings
+import numpy as np
+
+# Node types, stored as int8 codes. Ids missing from the original nodes.csv have the -1 code.
+NODE_TYPES = ("user", "repository")
+
+_FORMAT_VERSION = 1
+
+
+class BinaryGraph:
+    """
+    Graph loaded from a binary graph folder, written by write_graph(). All the arrays are read only numpy.memmap, so
+    loading a graph is immediate whatever its size, and data is only read from disk when used.
+
+    Attributes :
+        - indptr : CSR row pointers, edges of node i are in [indptr[i], indptr[i + 1][
+        - indices : Target of each edge (int32)
+        - weights : Weight of each edge (int32)
+        - types : Type code of each node (int8), index in NODE_TYPES or -1 for missing ids
+        - label_offsets, label_data : String table of the node labels, as utf-8 bytes
+    """
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, "meta.json"), "r") as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != _FORMAT_VERSION:
+            raise ValueError("Unsupported binary graph version : " + str(meta["version"]))
+        self.nodes_count = meta["nodes"]
+        self.edges_count = meta["edges"]
+        self.indptr = _load(folder, "indptr")
+        self.indices = _load(folder, "indices")
+        self.weights = _load(folder, "weights")
+        self.types = _load(folder, "types")
+        self.label_offsets = _load(folder, "label_offsets")
+        self.label_data = _load(folder, "label_data")
+
+    def label(self, node):
+        """
+        Returns the label of a node.
+        """
+        return bytes(self.label_data[self.label_offsets[node]:self.label_offsets[node + 1]]).decode("utf-8")
+
+    def nodes(self):
+        """
+        Yields the (id, label, type) of each node, as Strings.
+        """
+        for node in np.flatnonzero(np.asarray(self.types) >= 0).tolist():
+            yield str(node), self.label(node), NODE_TYPES[self.types[node]]
+
+    def sources(self):
+        """
+        Returns the source of each edge, expanded from the CSR row pointers.
+        """
+        return np.repeat(np.arange(self.nodes_count, dtype=np.int32), np.diff(self.indptr))
+
+    def edges(self):
+        """
+        Returns the Source, Target and Weight columns of the edges, sorted by source.
+        """
+        return self.sources(), self.indices, self.weights
+
+
+def load_graph(folder):
+    """
+    Memory maps the binary graph stored in folder.
+
+    :param folder: Path of the binary graph folder.
+    :type folder: path-like object
+    :rtype: BinaryGraph
+    """
+    return BinaryGraph(folder)
+
+
+def is_binary_graph(path):
+    """
+    Returns True if path is a binary graph folder.
+    """
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def write_graph(folder, sources, targets, weights, labels, types):
+    """
+    Writes a graph in the binary format : dense int32 node ids, CSR adjacency sorted by source, int32 weights and a
+    string table of the node labels, each array in its own .npy file.
+
+    :param folder: Path of the destination folder, created if needed.
+    :type folder: path-like object
+    :param sources: Source of each edge.
+    :param targets: Target of each edge.
+    :param weights: Weight of each edge.
+    :param labels: Label of each node id, None for missing ids.
+    :type labels: list of String
+    :param types: Type code of each node id.
+    :type types: numpy.ndarray
+    """
+    if not os.path.isdir(folder):
+        os.mkdir(folder)
+    # Removed first, so that a graph interrupted while its arrays are written again is not seen as complete.
+    if os.path.isfile(os.path.join(folder, "meta.json")):
+        os.remove(os.path.join(folder, "meta.json"))
+    nodes_count = len(labels)
+    sources = np.asarray(sources)
+
+    # Stable sort, so that the edges of a node keep their original order.
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(nodes_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=nodes_count), out=indptr[1:])
+    np.save(os.path.join(folder, "indptr.npy"), indptr)
+    np.save(os.path.join(folder, "indices.npy"), np.asarray(targets, dtype=np.int32)[order])
+    np.save(os.path.join(folder, "weights.npy"), np.asarray(weights, dtype=np.int32)[order])
+    np.save(os.path.join(folder, "types.npy"), np.asarray(types, dtype=np.int8))
+
+    encoded_labels = [b"" if label is None else label.encode("utf-8") for label in labels]
+    label_offsets = np.zeros(nodes_count + 1, dtype=np.int64)
+    np.cumsum([len(label) for label in encoded_labels], out=label_offsets[1:])
+    np.save(os.path.join(folder, "label_offsets.npy"), label_offsets)
+    np.save(os.path.join(folder, "label_data.npy"), np.frombuffer(b"".join(encoded_labels), dtype=np.uint8))
+
+    # Written last : a folder without meta.json is not a complete graph.
+    with open(os.path.join(folder, "meta.json"), "w") as meta_file:
+        json.dump({"version": _FORMAT_VERSION, "nodes": nodes_count, "edges": len(sources)}, meta_file)
+
+
+def gephi2binary(nodes_file, edges_file, folder):
+    """
+    Converts Gephi nodes.csv and edges.csv files, as written by rest_api.raw2gephi() or clean_data.clean(), to a binary
+    graph folder.
+
+    :param nodes_file: Path of the nodes.csv file.
+    :param edges_file: Path of the edges.csv file.
+    :param folder: Path of the destination folder.
+    """
+    node_labels = {}
+    node_types = {}
+    with open(nodes_file, "r") as nodes_data:
+        nodes = csv.reader(nodes_data, delimiter=",")
+        next(nodes)
+        for node in nodes:
+            node_labels[int(node[0])] = node[1]
+            node_types[int(node[0])] = NODE_TYPES.index(node[2])
+
+    with warnings.catch_warnings():
+        # An empty edges file is not an error.
+        warnings.simplefilter("ignore", UserWarning)
+        edges = np.loadtxt(edges_file, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2).reshape(-1, 3)
+
+    nodes_count = max(max(node_labels, default=-1), int(edges[:, :2].max(initial=-1))) + 1
+    labels = [node_labels.get(node) for node in range(nodes_count)]
+    types = np.full(nodes_count, -1, dtype=np.int8)
+    types[list(node_types.keys())] = list(node_types.values())
+    write_graph(folder, edges[:, 0], edges[:, 1], edges[:, 2], labels, types)
+
+
+def binary2gephi(folder, destination_folder):
+    """
+    Exports a binary graph folder to Gephi compatible nodes.csv and edges.csv files. Edges are written sorted by source.
+
+    :param folder: Path of the binary graph folder.
+    :param destination_folder: Path of the folder in which you want to store results.
+    """
+    graph = load_graph(folder)
+    with open(os.path.join(destination_folder, "nodes.csv"), "w", newline="") as node_file:
+        node_file.write("id,label,type\n")
+        csv.writer(node_file, lineterminator="\n").writerows(graph.nodes())
+
+    with open(os.path.join(destination_folder, "edges.csv"), "w") as edge_file:
+        edge_file.write("Source,Target,Weight\n")
+        sources, targets, weights = graph.edges()
+        np.savetxt(edge_file, np.column_stack((sources, targets, weights)), fmt="%d", delimiter=",")
+
+
+def _load(folder, name):
+    return np.load(os.path.join(folder, name + ".npy"), mmap_mode="r")
@@ -1,129 +1,389 @@
+import contextlib
 import csv
+import itertools
+import logging
+import warnings
 import matplotlib.pyplot as plt
+import numpy as np
 import os
+from graphGitHub.binary_graph import is_binary_graph, load_graph
+from graphGitHub.columnar import NODES_COLUMNS, EDGES_COLUMNS, TableWriter, columnar_path, csv2columnar, is_columnar, \
+    read_columns, read_rows
+from graphGitHub.metrics import record_file, stage
+from graphGitHub.parallel import map_chunks, read_lines, concatenate_parts
 
+logger = logging.getLogger(__name__)
 
-def compute_distributions(edges_file, plot=True):
+# Number of edges parsed at once when an edges.csv file is read by chunks.
+_CHUNK_EDGES = 1 << 20
+
+
+def load_edges(edges_file, workers=1):
+    """
+    Loads a Gephi edges.csv file, as written by rest_api.raw2gephi(), in three integer arrays. edges_file can also be
+    a binary graph folder (see binary_graph.py), whose arrays are memory mapped without any parsing, or an edges
+    Parquet or Arrow file (see columnar.py), whose typed columns are read without any parsing either.
+
+    :param edges_file: a edges.csv file, a binary graph folder, or an edges Parquet or Arrow file
+    :param workers: Number of processes used to parse the file.
+    :return: A size 3 tuple containing the Source, Target and Weight columns.
+    :rtype: tuple of numpy.ndarray
+    """
+    if is_binary_graph(edges_file):
+        return load_graph(edges_file).edges()
+    if is_columnar(edges_file):
+        return read_columns(edges_file, [name for name, _ in EDGES_COLUMNS])
+    if workers > 1:
+        edges = np.concatenate([np.zeros((0, 3), dtype=np.int64)]
+                               + map_chunks(_load_edges_chunk, edges_file, workers, skip_header=True))
+    else:
+        edges = _parse_edges(edges_file, skiprows=1)
+    return edges[:, 0], edges[:, 1], edges[:, 2]
+
+
+def _parse_edges(lines, skiprows=0):
+    # Parses edges lines, or an edges file, as a (E, 3) array.
+    with warnings.catch_warnings():
+        # An empty edges file is not an error.
+        warnings.simplefilter("ignore", UserWarning)
+        edges = np.loadtxt(lines, delimiter=",", skiprows=skiprows, dtype=np.int64, ndmin=2)
+    if edges.shape[0] == 0:
+        edges = np.zeros((0, 3), dtype=np.int64)
+    return edges
+
+
+def _load_edges_chunk(edges_file, start, end, chunk_index):
+    return _parse_edges(read_lines(edges_file, start, end))
+
+
+def _edge_chunks(edges_file):
+    # Yields the Source, Target and Weight columns of the edges by chunks of _CHUNK_EDGES edges, so that an edges.csv
+    # file is never loaded at once. Binary graphs and columnar files are already loaded at no cost : a single chunk.
+    if is_binary_graph(edges_file) or is_columnar(edges_file):
+        yield load_edges(edges_file)
+        return
+    with open(edges_file, "r") as edges_lines:
+        next(edges_lines, None)
+        while True:
+            lines = list(itertools.islice(edges_lines, _CHUNK_EDGES))
+            if len(lines) == 0:
+                return
+            edges = _parse_edges(lines)
+            yield edges[:, 0], edges[:, 1], edges[:, 2]
+
+
+def _count_edges(sources, targets):
+    # Counts the edges of each node, indexed by node id : ids must be the dense ids of the nodes, from 0, such as the
+    # ones written by rest_api.raw2gephi(). Sparse ids only cost memory, but negative ids can't be counted.
+    if sources.min(initial=0) < 0 or targets.min(initial=0) < 0:
+        raise ValueError("Negative node id : node ids must be the dense ids of nodes.csv, starting at 0.")
+    return np.bincount(sources), np.bincount(targets)
+
+
+def _count_edges_chunk(edges_file, start, end, chunk_index):
+    edges = _parse_edges(read_lines(edges_file, start, end))
+    return _count_edges(edges[:, 0], edges[:, 1])
+
+
+def _edge_counts(edges_file, workers=1):
+    # Returns the number of edges of each node as source, and as target, indexed by node id. Only these counts are
+    # kept in memory : edges are read by chunks, in parallel with several workers.
+    if is_binary_graph(edges_file):
+        graph = load_graph(edges_file)
+        return np.diff(graph.indptr), np.bincount(graph.indices)
+    if workers > 1 and not is_columnar(edges_file):
+        chunk_counts = map_chunks(_count_edges_chunk, edges_file, workers, skip_header=True)
+    else:
+        chunk_counts = (_count_edges(sources, targets) for sources, targets, _ in _edge_chunks(edges_file))
+    source_counts = np.zeros(0, dtype=np.int64)
+    target_counts = np.zeros(0, dtype=np.int64)
+    for chunk_source_counts, chunk_target_counts in chunk_counts:
+        source_counts = _add_counts(source_counts, chunk_source_counts)
+        target_counts = _add_counts(target_counts, chunk_target_counts)
+    return source_counts, target_counts
+
+
+def _add_counts(counts, other_counts):
+    if len(counts) < len(other_counts):
+        counts, other_counts = other_counts, counts
+    counts = counts.copy()
+    counts[:len(other_counts)] += other_counts
+    return counts
+
+
+def _degrees(counts):
+    # Returns the nodes that have a non zero count, and their count.
+    ids = np.flatnonzero(counts)
+    return ids, counts[ids]
+
+
+def _distribution(counts):
+    # Maps each count to the number of nodes that have this count.
+    distribution = np.bincount(counts)
+    values = np.flatnonzero(distribution)
+    return dict(zip(values.tolist(), distribution[values].tolist()))
+
+
+@stage("compute_distributions")
+def compute_distributions(edges_file, plot=True, workers=1):
     """
     Computes number of repositories by users and numbers of contributors by repositories distributions.
     You can plot them if plot is true, what could help to determine thresholds to clean data.
+    Degrees are counted in arrays indexed by node id : ids must be the dense ids of nodes.csv, starting at 0, such as
+    the ones written by rest_api.raw2gephi(). A negative id raises a ValueError.
 
-    :param edges_file: a edges.csv file
+    :param edges_file: a edges.csv file, a binary graph folder, or an edges Parquet or Arrow file
     :param plot: Plot results if true.
+    :param workers: Number of processes used to count the edges of chunks of edges_file in parallel.
     :return:    A size 2 tuple containing dictionaries that map users to their repositories count, and repositories to
                 their contributors count.
     """
-    with open(edges_file, "r") as edges:
-        contributions = csv.DictReader(edges, delimiter=",")
-        rep_by_users_counts = {}
-        users_by_rep_counts = {}
-
-        print("Compute users and repositories counts...")
-        for contribution in contributions:
-            user = contribution["Source"]
-            if user not in list(rep_by_users_counts.keys()):
-                rep_by_users_counts[user] = 1
-            else:
-                rep_by_users_counts[user] = rep_by_users_counts[user] + 1
-
-            repository = contribution["Target"]
-            if repository not in list(users_by_rep_counts.keys()):
-                users_by_rep_counts[repository] = 1
-            else:
-                users_by_rep_counts[repository] = users_by_rep_counts[repository] + 1
-
-        print("Compute distributions...")
-        rep_by_users_distrib = {}
-        for user in list(rep_by_users_counts.keys()):
-            count = rep_by_users_counts[user]
-            if count not in list(rep_by_users_distrib.keys()):
-                rep_by_users_distrib[count] = 1
-            else:
-                rep_by_users_distrib[count] = rep_by_users_distrib[count] + 1
-
-        users_by_rep_distrib = {}
-        for rep in list(users_by_rep_counts.keys()):
-            count = users_by_rep_counts[rep]
-            if count not in list(users_by_rep_distrib.keys()):
-                users_by_rep_distrib[count] = 1
-            else:
-                users_by_rep_distrib[count] = users_by_rep_distrib[count] + 1
-
-        print("Results : ")
-        print("Max repository count by user : " + str(max(list(rep_by_users_distrib.keys()))))
-        print("Max contributors by repository : " + str(max(list(users_by_rep_distrib.keys()))))
-        if plot:
-            plt.plot(list(rep_by_users_distrib.keys()), list(rep_by_users_distrib.values()),
-                     linestyle='None', marker=".", label="repositories by users")
-            plt.plot(list(users_by_rep_distrib.keys()), list(users_by_rep_distrib.values()),
-                     linestyle='None', marker=".", label="contributors by repositories")
-            plt.legend()
-            plt.show()
-        return users_by_rep_counts, rep_by_users_counts
-
-
-def clean(nodes_file, edges_file, destination_folder, users_by_rep_treshold=10, rep_by_user_treshold=10):
+    logger.info("Compute users and repositories counts...")
+    source_counts, target_counts = _edge_counts(edges_file, workers)
+    users, rep_by_users = _degrees(source_counts)
+    repositories, users_by_rep = _degrees(target_counts)
+    rep_by_users_counts = dict(zip([str(user) for user in users.tolist()], rep_by_users.tolist()))
+    users_by_rep_counts = dict(zip([str(rep) for rep in repositories.tolist()], users_by_rep.tolist()))
+
+    logger.info("Compute distributions...")
+    rep_by_users_distrib = _distribution(rep_by_users)
+    users_by_rep_distrib = _distribution(users_by_rep)
+
+    logger.info("Max repository count by user : %d", max(rep_by_users_distrib.keys()))
+    logger.info("Max contributors by repository : %d", max(users_by_rep_distrib.keys()))
+    if plot:
+        plt.plot(list(rep_by_users_distrib.keys()), list(rep_by_users_distrib.values()),
+                 linestyle='None', marker=".", label="repositories by users")
+        plt.plot(list(users_by_rep_distrib.keys()), list(users_by_rep_distrib.values()),
+                 linestyle='None', marker=".", label="contributors by repositories")
+        plt.legend()
+        plt.show()
+    return users_by_rep_counts, rep_by_users_counts
+
+
+def bipartite_core(sources, targets, users_by_rep_treshold, rep_by_user_treshold):
+    """
+    Computes the (rep_by_user_treshold, users_by_rep_treshold)-core of the bipartite users/repositories graph : the
+    largest sub-graph in which each user contributes to at least rep_by_user_treshold repositories and each repository
+    has at least users_by_rep_treshold contributors.
+
+    Nodes under their threshold are removed round by round : removing the nodes of a round decrements the degrees of
+    their neighbors, and the neighbors that fall under their threshold are removed in the next round, until a fixed
+    point is reached. Each edge is removed at most once, so the whole computation is O(E).
+
+    :param sources: Users of each edge.
+    :type sources: numpy.ndarray
+    :param targets: Repositories of each edge.
+    :type targets: numpy.ndarray
+    :param users_by_rep_treshold: Minimum contributors by repository required.
+    :param rep_by_user_treshold: Minimum repositories by user required.
+    :return:    A size 2 tuple containing the boolean mask of the edges of the core, and the list of the number of nodes
+                removed at each round.
+    """
+    edges_count = len(sources)
+    nodes_count = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+    degrees = np.bincount(sources, minlength=nodes_count) + np.bincount(targets, minlength=nodes_count)
+    tresholds = np.zeros(nodes_count, dtype=np.int64)
+    tresholds[sources] = rep_by_user_treshold
+    tresholds[targets] = users_by_rep_treshold
+
+    # Incident edges of each node, in CSR format.
+    endpoints = np.concatenate((sources, targets))
+    incident_edges = np.argsort(endpoints, kind="stable") % max(edges_count, 1)
+    indptr = np.zeros(nodes_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(endpoints, minlength=nodes_count), out=indptr[1:])
+
+    alive_nodes = degrees > 0
+    alive_edges = np.ones(edges_count, dtype=bool)
+    removed_by_round = []
+    frontier = np.flatnonzero(alive_nodes & (degrees < tresholds))
+    while len(frontier) > 0:
+        removed_by_round.append(len(frontier))
+        alive_nodes[frontier] = False
+
+        # Gathers the edges incident to the frontier that are still alive, and removes them.
+        lengths = indptr[frontier + 1] - indptr[frontier]
+        offsets = np.repeat(indptr[frontier] - np.cumsum(lengths) + lengths, lengths)
+        edges = incident_edges[offsets + np.arange(lengths.sum())]
+        edges = np.unique(edges[alive_edges[edges]])
+        alive_edges[edges] = False
+
+        # Decrements the degrees of the neighbors, and finds the ones that fall under their threshold.
+        neighbors = np.concatenate((sources[edges], targets[edges]))
+        np.subtract.at(degrees, neighbors, 1)
+        neighbors = np.unique(neighbors)
+        frontier = neighbors[alive_nodes[neighbors] & (degrees[neighbors] < tresholds[neighbors])]
+
+    return alive_edges, removed_by_round
+
+
+@stage("clean")
+def clean(nodes_file, edges_file, destination_folder, users_by_rep_treshold=10, rep_by_user_treshold=10,
+          iterative=False, workers=1, columnar=None):
     """
     Clean data removing all the users that have contributed to less than rep_by_user_treshold, and repositories with
     less than users_by_rep_treshold. Also removes nodes that remain without connections after those steps.
 
+    By default, thresholds are checked once against the degrees of the original graph, so some kept nodes may end up
+    under their threshold once their neighbors are removed. If iterative is true, removals are cascaded until all the
+    remaining nodes satisfy their threshold (see bipartite_core()).
+
     Results are written as 2 .csv files in the specified destination_folder with the same format as the original format,
     ready to be imported in Gephi!
 
-    :param nodes_file: Path of the origin nodes.csv file.
-    :param edges_file: Path of the origin edges.csv file.
+    With several workers, edges_file is split in chunks that are parsed, counted and filtered in parallel processes, and
+    the filtered chunks are concatenated in order : results are the same as with a single worker. With a single
+    worker, edges_file is read twice by chunks, to count and to filter its edges : only the degrees of the nodes are
+    kept in memory, unless iterative is true, since the core is computed from all the edges.
+
+    Node sets are stored as arrays indexed by node id : ids must be the dense ids of nodes.csv, starting at 0, such as
+    the ones written by rest_api.raw2gephi(). A negative id raises a ValueError.
+
+    nodes_file and edges_file can also both be a binary graph folder (see binary_graph.py), which is memory mapped
+    instead of being parsed. Edges are then written sorted by source. They can also be nodes and edges Parquet or
+    Arrow files (see columnar.gephi2columnar()), whose typed columns are read without parsing.
+
+    :param nodes_file: Path of the origin nodes.csv file, a binary graph folder, or a nodes Parquet or Arrow file.
+    :param edges_file: Path of the origin edges.csv file, a binary graph folder, or an edges Parquet or Arrow file.
     :param destination_folder: Path of the destination folder.
     :param users_by_rep_treshold: Minimum contributors by repository required.
     :param rep_by_user_treshold: Minimum repositories by user required.
+    :param iterative: Cascades removals until all the remaining nodes satisfy their threshold.
+    :param workers: Number of processes used to process edges_file.
+    :param columnar: "parquet" or "arrow" to also write the results as clean_nodes and clean_edges Parquet or Arrow
+                     files (see columnar.py), or None.
     """
-    nodes_to_delete = []
-
-    users_by_rep_counts, rep_by_user_counts = compute_distributions(edges_file, plot=False)
-    # Check repositories
-    print("Cleaning repositories...")
-    for rep in list(users_by_rep_counts.keys()):
-        if users_by_rep_counts[rep] < users_by_rep_treshold:
-            nodes_to_delete.append(rep)
-
-    # Check users
-    print("Cleaning users...")
-    for user in list(rep_by_user_counts.keys()):
-        if rep_by_user_counts[user] < rep_by_user_treshold:
-            nodes_to_delete.append(user)
-    print("Nodes to delete : " + str(len(nodes_to_delete)))
+    if columnar is not None:
+        # Checks the format before any processing.
+        columnar_path(destination_folder, "clean_nodes", columnar)
+    if is_binary_graph(edges_file) or is_columnar(edges_file):
+        # Memory mapped arrays are already loaded at no cost.
+        workers = 1
+    if iterative:
+        sources, targets, weights = load_edges(edges_file, workers)
+        source_counts, target_counts = _count_edges(sources, targets)
+    else:
+        # Edges are read again by chunks, or by the workers, to be filtered : only their counts are kept in memory.
+        source_counts, target_counts = _edge_counts(edges_file, workers)
+    users, rep_by_user = _degrees(source_counts)
+    repositories, users_by_rep = _degrees(target_counts)
+    # Nodes are identified by dense integer ids : node sets are stored as boolean masks indexed by id.
+    nodes_count = max(len(source_counts), len(target_counts))
+
+    if iterative:
+        logger.info("Computing core...")
+        kept_edges, removed_by_round = bipartite_core(sources, targets, users_by_rep_treshold, rep_by_user_treshold)
+        for i, removed_nodes in enumerate(removed_by_round):
+            logger.debug("Round %d : %d nodes removed.", i + 1, removed_nodes)
+        logger.info("Nodes to delete : %d", sum(removed_by_round))
+        # Edges of the core are exactly the edges between two nodes of the core.
+        deleted_nodes = np.ones(nodes_count, dtype=bool)
+        deleted_nodes[sources[kept_edges]] = False
+        deleted_nodes[targets[kept_edges]] = False
+    else:
+        deleted_nodes = np.zeros(nodes_count, dtype=bool)
+        # Check repositories
+        logger.info("Cleaning repositories...")
+        deleted_repositories = repositories[users_by_rep < users_by_rep_treshold]
+        deleted_nodes[deleted_repositories] = True
+
+        # Check users
+        logger.info("Cleaning users...")
+        deleted_users = users[rep_by_user < rep_by_user_treshold]
+        deleted_nodes[deleted_users] = True
+        logger.info("Nodes to delete : %d", len(deleted_repositories) + len(deleted_users))
 
     # Writes clean edges
-    linked_nodes = []
-    with open(edges_file, "r") as original_edges_file:
-        with open(os.path.join(destination_folder, "clean_edges.csv"), "w") as clean_edges:
-            print("Writing new edges to " + str(os.path.join(destination_folder, "clean_edges.csv")) + "...")
+    clean_edges_path = os.path.join(destination_folder, "clean_edges.csv")
+    logger.info("Writing new edges to %s...", clean_edges_path)
+    linked_nodes = np.zeros(nodes_count, dtype=bool)
+    if workers == 1:
+        edge_chunks = [(sources, targets, weights)] if iterative else _edge_chunks(edges_file)
+        edges_writer = contextlib.nullcontext() if columnar is None \
+            else TableWriter(columnar_path(destination_folder, "clean_edges", columnar), EDGES_COLUMNS)
+        new_edges_count = 0
+        with open(clean_edges_path, "w", newline="") as clean_edges, edges_writer:
             clean_edges.write("Source,Target,Weight\n")
-            original_edges = csv.DictReader(original_edges_file, delimiter=",")
-            new_edges_count = 0
-            for original_edge in original_edges:
+            for chunk_sources, chunk_targets, chunk_weights in edge_chunks:
                 # We keep only the edges that link two living nodes
-                if (original_edge["Source"] not in nodes_to_delete) and (original_edge["Target"] not in nodes_to_delete):
-                    clean_edges.write(original_edge["Source"] + ","
-                                      + original_edge["Target"] + ","
-                                      + original_edge["Weight"] + "\n")
-                    new_edges_count += 1
-                    linked_nodes.append(original_edge["Source"])
-                    linked_nodes.append(original_edge["Target"])
-            print("New edges count : " + str(new_edges_count))
+                kept_edges = ~deleted_nodes[chunk_sources] & ~deleted_nodes[chunk_targets]
+                _write_edges(clean_edges, chunk_sources[kept_edges], chunk_targets[kept_edges],
+                             chunk_weights[kept_edges])
+                if columnar is not None:
+                    edges_writer.write_columns(chunk_sources[kept_edges], chunk_targets[kept_edges],
+                                               chunk_weights[kept_edges])
+                linked_nodes[chunk_sources[kept_edges]] = True
+                linked_nodes[chunk_targets[kept_edges]] = True
+                new_edges_count += np.count_nonzero(kept_edges)
+    else:
+        chunks = map_chunks(_clean_edges_chunk, edges_file, workers, skip_header=True, args=(clean_edges_path,),
+                            initializer=_set_deleted_nodes, initargs=(deleted_nodes,))
+        with open(clean_edges_path, "wb") as clean_edges:
+            clean_edges.write(b"Source,Target,Weight\n")
+            concatenate_parts([part for part, _, _ in chunks], clean_edges)
+        new_edges_count = 0
+        for _, chunk_edges_count, chunk_linked_nodes in chunks:
+            new_edges_count += chunk_edges_count
+            linked_nodes[chunk_linked_nodes] = True
+    logger.info("New edges count : %d", new_edges_count)
+    record_file(clean_edges_path, int(new_edges_count))
+    if columnar is not None and workers > 1:
+        logger.info("Writing new edges to %s...", columnar_path(destination_folder, "clean_edges", columnar))
+        csv2columnar(clean_edges_path, columnar_path(destination_folder, "clean_edges", columnar), EDGES_COLUMNS)
 
     # Writes clean nodes
+    clean_nodes_path = os.path.join(destination_folder, "clean_nodes.csv")
+    nodes_writer = contextlib.nullcontext() if columnar is None \
+        else TableWriter(columnar_path(destination_folder, "clean_nodes", columnar), NODES_COLUMNS)
+    with open(clean_nodes_path, "w", newline="") as clean_nodes, nodes_writer:
+        logger.info("Writing new nodes to %s...", clean_nodes_path)
+        clean_nodes_csv = csv.writer(clean_nodes, lineterminator="\n")
+        clean_nodes_csv.writerow(("id", "label", "type"))
+        new_nodes_count = 0
+        for original_node in _read_nodes(nodes_file):
+            # Also removes nodes that left without any connection after edges cleaning.
+            node_id = int(original_node[0])
+            if node_id < nodes_count and linked_nodes[node_id]:
+                clean_nodes_csv.writerow(original_node)
+                if columnar is not None:
+                    nodes_writer.write_rows(((node_id, original_node[1], original_node[2]),))
+                new_nodes_count += 1
+        logger.info("New nodes count : %d", new_nodes_count)
+    record_file(clean_nodes_path, new_nodes_count)
+
+
+def _read_nodes(nodes_file):
+    # Yields the (id, label, type) rows of a nodes.csv file, of a binary graph folder or of a nodes columnar file.
+    if is_binary_graph(nodes_file):
+        yield from load_graph(nodes_file).nodes()
+        return
+    if is_columnar(nodes_file):
+        yield from read_rows(nodes_file)
+        return
     with open(nodes_file, "r") as original_nodes_file:
-        with open(os.path.join(destination_folder, "clean_nodes.csv"), "w") as clean_nodes:
-            print("Writing new nodes to " + str(os.path.join(destination_folder, "clean_nodes.csv")) + "...")
-            clean_nodes.write("id,label,type\n")
-            original_nodes = csv.DictReader(original_nodes_file, delimiter=",")
-            new_nodes_count = 0
-            for original_node in original_nodes:
-                # Also removes nodes that left without any connection after edges cleaning.
-                if original_node["id"] in linked_nodes and original_node["id"] not in nodes_to_delete:
-                    clean_nodes.write(original_node["id"] + ","
-                                      + original_node["label"] + ","
-                                      + original_node["type"] + "\n")
-                    new_nodes_count += 1
-            print("New nodes count : " + str(new_nodes_count))
+        original_nodes = csv.reader(original_nodes_file, delimiter=",")
+        next(original_nodes)
+        yield from original_nodes
+
+
+def _write_edges(edges_file, sources, targets, weights):
+    csv.writer(edges_file, lineterminator="\n").writerows(zip(sources.tolist(), targets.tolist(), weights.tolist()))
+
+
+# Nodes deleted by clean(), shared with its worker processes.
+_deleted_nodes = None
+
+
+def _set_deleted_nodes(deleted_nodes):
+    global _deleted_nodes
+    _deleted_nodes = deleted_nodes
+
 
+def _clean_edges_chunk(edges_file, start, end, chunk_index, clean_edges_path):
+    # Writes the kept edges of the chunk to a part file. Returns the part path, its edges count and its nodes.
+    edges = _parse_edges(read_lines(edges_file, start, end))
+    kept_edges = edges[~_deleted_nodes[edges[:, 0]] & ~_deleted_nodes[edges[:, 1]]]
+    part = clean_edges_path + ".part" + str(chunk_index)
+    with open(part, "w", newline="") as part_file:
+        _write_edges(part_file, kept_edges[:, 0], kept_edges[:, 1], kept_edges[:, 2])
+    return part, len(kept_edges), np.unique(kept_edges[:, :2])
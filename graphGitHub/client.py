@@ -0,0 +1,193 @@
+import logging
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from graphGitHub.metrics import metrics
+from graphGitHub.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Status codes that GitHub may return for transient failures.
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class GitHubClient:
+    """
+    HTTP client used by both the REST and GraphQL modules to call the GitHub APIs.
+
+    All the requests go through a single pooled requests.Session, so that TLS connections are kept alive and reused,
+    and ask for compressed responses. Each request is charged to the rate_limiter. Transient failures (connection
+    errors, 5xx, 429, and 403 responses of the primary or secondary/abuse rate limits) are retried, honouring the
+    Retry-After and X-RateLimit-Reset headers when they are present and using an exponential backoff with jitter
+    otherwise.
+
+    If an http_cache is provided, GET requests are sent with the If-None-Match / If-Modified-Since validators of the
+    cached response, and 304 Not Modified answers, that are not charged by GitHub, are served from the cache.
+
+    :param github_user_name: Your GitHub login.
+    :type github_user_name: String
+    :param oauth_password: Your GitHub oauth token.
+    :type oauth_password: String
+    :param rate_limiter: Rate limiter charged with each request. A new one is created if None.
+    :type rate_limiter: RateLimiter
+    :param pool_size: Maximum number of connections kept alive, should be at least the number of threads using the
+                      client.
+    :type pool_size: int
+    :param max_retries: Maximum number of retries of a failed request.
+    :type max_retries: int
+    :param backoff: Base delay of the exponential backoff, in seconds.
+    :type backoff: float
+    :param max_backoff: Maximum delay between two retries, in seconds.
+    :type max_backoff: float
+    :param timeout: Timeout of each request, in seconds.
+    :type timeout: float
+    :param http_cache: Cache used for conditional GET requests, or None to disable them.
+    :type http_cache: HttpCache
+    """
+
+    def __init__(self,
+                 github_user_name,
+                 oauth_password,
+                 rate_limiter=None,
+                 pool_size=10,
+                 max_retries=5,
+                 backoff=1.0,
+                 max_backoff=60.0,
+                 timeout=60.0,
+                 http_cache=None):
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.http_cache = http_cache
+        # GraphQL entry points that don't support persisted queries. See queries.post_query().
+        self.unpersisted_urls = set()
+
+        self.session = requests.Session()
+        self.session.auth = (github_user_name, oauth_password)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None, **kwargs):
+        """
+        Performs a GET request, conditional if the client has an http_cache. See request().
+        """
+        if self.http_cache is None:
+            return self.request("GET", url, params=params, **kwargs)
+
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        cached = self.http_cache.get(full_url)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached["etag"] is not None:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"] is not None:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.request("GET", full_url, headers=headers, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            # Not charged by GitHub
+            self.rate_limiter.release()
+            metrics.increment("github_http_cache_hits_total")
+            return self._cached_response(full_url, response, cached)
+        if response.status_code == 200 and ("ETag" in response.headers or "Last-Modified" in response.headers):
+            self.http_cache.put(full_url,
+                                response.headers.get("ETag"),
+                                response.headers.get("Last-Modified"),
+                                response.headers.get("Link"),
+                                response.content)
+        return response
+
+    def post(self, url, cost=1, **kwargs):
+        """
+        Performs a POST request. See request().
+        """
+        return self.request("POST", url, cost=cost, **kwargs)
+
+    def request(self, method, url, cost=1, **kwargs):
+        """
+        Performs a request, retrying it on transient failures.
+
+        :param method: HTTP method.
+        :param url: Requested URL.
+        :param cost: Expected rate limit cost of the request.
+        :param kwargs: Other arguments passed to requests.Session.request().
+        :return: The last response received. Its status code should still be checked, since non transient errors
+                 (such as 401 or 404) are not retried, and the last response is returned once max_retries is reached.
+        :rtype: requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(cost)
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.increment("github_requests_total", labels={"method": method, "status": "error"})
+                if attempt >= self.max_retries:
+                    logger.error("Request to %s failed (%s).", url, e)
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("Request to %s failed (%s). Retrying in %.1fs...", url, e, delay)
+            else:
+                metrics.observe("github_request_duration_seconds", time.monotonic() - start, {"method": method})
+                metrics.increment("github_requests_total", labels={"method": method,
+                                                                   "status": str(response.status_code)})
+                metrics.increment("github_response_bytes_total", len(response.content))
+                self.rate_limiter.update_from_headers(response.headers)
+                if attempt >= self.max_retries or not self._should_retry(response):
+                    return response
+                delay = self._retry_delay(response, attempt)
+                logger.warning("Request to %s failed. error : %d. Retrying in %.1fs...", url, response.status_code,
+                               delay)
+            metrics.increment("github_request_retries_total")
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _cached_response(url, not_modified, cached):
+        # Builds a 200 response from a 304 Not Modified answer and the cached entry.
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(not_modified.headers)
+        if cached["link"] is not None:
+            response.headers["Link"] = cached["link"]
+        response._content = bytes(cached["body"])
+        response.encoding = "utf-8"
+        response.request = not_modified.request
+        return response
+
+    @staticmethod
+    def _should_retry(response):
+        if response.status_code in _RETRY_STATUS_CODES:
+            return True
+        # 403 is also used by the primary and secondary (abuse detection) rate limits.
+        return response.status_code == 403 and (
+                "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0")
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        if response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in response.headers:
+            return max(int(response.headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+        return self.backoff_delay(attempt)
+
+    def backoff_delay(self, attempt):
+        """
+        Returns the delay before retrying a request that failed attempt + 1 times, in seconds : an exponential backoff
+        with "full jitter", so that concurrent workers don't retry all together.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
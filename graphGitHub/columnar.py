@@ -0,0 +1,244 @@
+import os
+import numpy as np
+
+# Number of rows of each row group (Parquet) or record batch (Arrow).
+DEFAULT_ROW_GROUP_SIZE = 1000000
+
+# Columns of the tables, as (name, kind) pairs. Kinds are "int64", "string", or "dictionary" for dictionary encoded
+# strings, such as labels that repeat.
+NODES_COLUMNS = (("id", "int64"), ("label", "dictionary"), ("type", "dictionary"))
+EDGES_COLUMNS = (("Source", "int64"), ("Target", "int64"), ("Weight", "int64"))
+GRAPHQL_COLUMNS = {"users": (("id", "string"), ("name", "dictionary")),
+                   "repositories": (("id", "string"), ("name", "dictionary"), ("stars", "int64"),
+                                    ("language", "dictionary")),
+                   "contributions": (("user_id", "dictionary"), ("repository_id", "dictionary"))}
+
+_EXTENSIONS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Columnar files require pyarrow : pip install graphGitHub[parquet]") from None
+    return pyarrow
+
+
+def columnar_format(path):
+    """
+    Returns the columnar format of path from its extension : "parquet" for .parquet files, "arrow" for .arrow and
+    .feather (Arrow IPC) files, or None.
+    """
+    return _EXTENSIONS.get(os.path.splitext(str(path))[1])
+
+
+def columnar_path(folder, name, file_format):
+    """
+    Returns the path of the name table in folder, with the extension of file_format ("parquet" or "arrow").
+    """
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError("Unknown columnar format : " + str(file_format))
+    return os.path.join(folder, name + "." + file_format)
+
+
+def is_columnar(path):
+    """
+    Returns True if path is a Parquet or Arrow file.
+    """
+    return columnar_format(path) is not None and os.path.isfile(path)
+
+
+class TableWriter:
+    """
+    Streams rows to a Parquet or Arrow IPC file, chosen from the extension of path, by row groups of row_group_size
+    rows, so that only a row group is kept in memory.
+
+    Ids and counts are written as int64 columns, and labels as dictionary encoded strings. Parquet files are
+    dictionary encoded by row group. Arrow files can only hold a single dictionary by column, that grows as new values
+    are written : its values are kept in memory.
+
+    :param path: Path of the written file, ending with .parquet, .arrow or .feather.
+    :type path: path-like object
+    :param columns: Columns of the table, such as NODES_COLUMNS or EDGES_COLUMNS.
+    :type columns: tuple of (String, String)
+    :param row_group_size: Number of rows by row group.
+    :type row_group_size: int
+    """
+
+    def __init__(self, path, columns, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        pyarrow = _import_pyarrow()
+        self.path = path
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.rows_count = 0
+        self._format = columnar_format(path)
+        if self._format is None:
+            raise ValueError("Unknown columnar file extension : " + str(path))
+        self._schema = pyarrow.schema([(name, _arrow_type(pyarrow, kind)) for name, kind in columns])
+        self._rows = []
+        self._dictionaries = {name: {} for name, kind in columns if kind == "dictionary"}
+        if self._format == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pyarrow.ipc.new_file(path, self._schema,
+                                                options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def write_rows(self, rows):
+        """
+        Buffers rows, given as tuples of values in the columns order, and writes the complete row groups.
+        """
+        self._rows.extend(rows)
+        while len(self._rows) >= self.row_group_size:
+            self._write(list(zip(*self._rows[:self.row_group_size])))
+            del self._rows[:self.row_group_size]
+
+    def write_columns(self, *columns):
+        """
+        Writes whole columns, given as numpy arrays, lists or pyarrow arrays of the same length, by row groups.
+        Numeric numpy columns are converted without any copy.
+        """
+        self._flush_rows()
+        for start in range(0, len(columns[0]), self.row_group_size):
+            self._write([column[start:start + self.row_group_size] for column in columns])
+
+    def _flush_rows(self):
+        if len(self._rows) > 0:
+            self._write(list(zip(*self._rows)))
+            self._rows = []
+
+    def _write(self, columns):
+        pyarrow = _import_pyarrow()
+        arrays = [self._array(pyarrow, name, kind, values) for (name, kind), values in zip(self.columns, columns)]
+        batch = pyarrow.record_batch(arrays, schema=self._schema)
+        if self._format == "parquet":
+            self._writer.write_batch(batch, row_group_size=self.row_group_size)
+        else:
+            self._writer.write_batch(batch)
+        self.rows_count += batch.num_rows
+
+    def _array(self, pyarrow, name, kind, values):
+        if kind == "int64":
+            if isinstance(values, pyarrow.Array):
+                return values.cast(pyarrow.int64())
+            return pyarrow.array(np.asarray(values, dtype=np.int64))
+        if not isinstance(values, pyarrow.Array):
+            values = pyarrow.array(values, pyarrow.string())
+        if kind == "string":
+            return values.cast(pyarrow.string())
+        if self._format == "parquet":
+            return values.cast(pyarrow.string()).dictionary_encode()
+        # The dictionary of previous batches is extended, and written as a delta.
+        dictionary = self._dictionaries[name]
+        indices = [dictionary.setdefault(value, len(dictionary)) for value in values.to_pylist()]
+        return pyarrow.DictionaryArray.from_arrays(pyarrow.array(indices, pyarrow.int32()),
+                                                   pyarrow.array(list(dictionary), pyarrow.string()))
+
+    def close(self):
+        self._flush_rows()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _arrow_type(pyarrow, kind):
+    if kind == "int64":
+        return pyarrow.int64()
+    if kind == "string":
+        return pyarrow.string()
+    return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+
+def read_table(path, columns=None):
+    """
+    Reads a Parquet or Arrow file as a pyarrow.Table. Files are memory mapped : Arrow files are loaded without any
+    copy, Parquet files are decoded column by column.
+
+    :param path: Path of the file.
+    :type path: path-like object
+    :param columns: Names of the columns to read, or None to read them all.
+    :type columns: list of String
+    :rtype: pyarrow.Table
+    """
+    pyarrow = _import_pyarrow()
+    if columnar_format(path) == "parquet":
+        return pyarrow.parquet.read_table(path, columns=columns, memory_map=True)
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(str(path), "r")).read_all()
+    return table if columns is None else table.select(columns)
+
+
+def read_columns(path, columns):
+    """
+    Returns numeric columns of a Parquet or Arrow file as numpy arrays. Columns of an Arrow file made of a single
+    record batch are returned without any copy.
+
+    :rtype: tuple of numpy.ndarray
+    """
+    table = read_table(path, columns)
+    return tuple(table.column(name).to_numpy() for name in columns)
+
+
+def read_rows(path):
+    """
+    Yields the rows of a Parquet or Arrow file as tuples, a record batch at a time.
+    """
+    for batch in read_table(path).to_batches():
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def csv2columnar(csv_path, path, columns, header=True, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Converts a csv file to a Parquet or Arrow file, streaming it by blocks with the multithreaded csv reader of pyarrow.
+
+    :param csv_path: Path of the csv file.
+    :type csv_path: path-like object
+    :param path: Path of the written file, ending with .parquet, .arrow or .feather.
+    :type path: path-like object
+    :param columns: Columns of the csv file, such as NODES_COLUMNS or EDGES_COLUMNS.
+    :type columns: tuple of (String, String)
+    :param header: Whether the first line of the csv file is a header, that is then skipped.
+    :type header: bool
+    :param row_group_size: Number of rows by row group.
+    :type row_group_size: int
+    :return: Number of converted rows.
+    :rtype: int
+    """
+    pyarrow = _import_pyarrow()
+    names = [name for name, _ in columns]
+    reader = pyarrow.csv.open_csv(
+        csv_path,
+        read_options=pyarrow.csv.ReadOptions(column_names=names, skip_rows=1 if header else 0,
+                                             block_size=16 * 1024 * 1024),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={name: pyarrow.int64() if kind == "int64" else pyarrow.string() for name, kind in columns},
+            strings_can_be_null=False))
+    with TableWriter(path, columns, row_group_size) as writer:
+        for batch in reader:
+            writer.write_columns(*batch.columns)
+    return writer.rows_count
+
+
+def gephi2columnar(nodes_file, edges_file, folder, file_format="parquet", row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Converts the nodes.csv and edges.csv Gephi files of rest_api.raw2gephi() to nodes and edges Parquet or Arrow files
+    in folder, such as folder/nodes.parquet and folder/edges.parquet, that clean_data functions read instead of parsing
+    csv files.
+
+    :param nodes_file: Path of the nodes.csv file.
+    :param edges_file: Path of the edges.csv file.
+    :param folder: Destination folder.
+    :param file_format: "parquet" or "arrow".
+    :param row_group_size: Number of rows by row group.
+    :return: Paths of the nodes and edges files.
+    :rtype: tuple of String
+    """
+    nodes_path = columnar_path(folder, "nodes", file_format)
+    edges_path = columnar_path(folder, "edges", file_format)
+    csv2columnar(nodes_file, nodes_path, NODES_COLUMNS, row_group_size=row_group_size)
+    csv2columnar(edges_file, edges_path, EDGES_COLUMNS, row_group_size=row_group_size)
+    return nodes_path, edges_path
@@ -0,0 +1,389 @@
+import csv
+import json
+import logging
+import os
+import sqlite3
+from graphGitHub.files import read_last_line, read_first_column, find_first_line_after, read_committed_size, \
+    truncate_partial_line, truncate_uncommitted, write_committed_size
+from graphGitHub.metrics import metrics
+
+# Prefix of the checkpoints that hold the status of the search slices of a partitioned GraphQL crawl.
+_SLICE_CHECKPOINT = "graphql_slice:"
+_CONTRIBUTIONS = ("rest", "contributions.csv")
+_GRAPHQL_DATA = ("graphql", "graphql_data.txt")
+
+logger = logging.getLogger(__name__)
+
+
+class CsvCrawlState:
+    """
+    Default crawl state, that directly appends the fetched data to the csv files of the results_folder :
+        - rest/repositories.csv
+        - rest/users.csv
+        - rest/contributions.csv
+        - graphql/graphql_data.txt
+        - graphql/page_cursors.txt
+        - graphql/slice_cursors.txt
+
+    Each batch (a page of repositories, the contributors of a repository or a page of GraphQL users) is written at once
+    and flushed. A partially written line left by a previous interrupted run is removed when a file is opened again.
+    The size of contributions.csv after the contributors of each repository is also recorded in
+    rest/contributions.csv.committed, so that the contributions of a repository interrupted in the middle are removed
+    too, and that it is fetched again. These repairs are done when the files are opened for writing : the getters
+    only read the committed part of the files.
+
+    A page of GraphQL users is written to graphql_data.txt, flushed and synchronized to disk before its cursor is
+    recorded, then the size of graphql_data.txt is recorded in graphql/graphql_data.txt.committed. The users written
+    after this size by an interrupted run are kept, but skipped if their page is fetched again.
+
+    :param results_folder: Path of the folder in which you store your results.
+    :type results_folder: path-like object
+    """
+
+    def __init__(self, results_folder):
+        self.results_folder = results_folder
+        self._files = {}
+        self._committed_files = {}
+        self._registered_users = None
+        # Ids of the users written after the last recorded page of an interrupted run.
+        self._uncommitted_nodes = set()
+
+    def _path(self, *path):
+        return os.path.join(self.results_folder, *path)
+
+    def _file(self, *path):
+        # Lazily opens the files in append mode.
+        if path not in self._files:
+            os.makedirs(self._path(path[0]), exist_ok=True)
+            if path == _CONTRIBUTIONS:
+                truncate_uncommitted(self._path(*path))
+            if os.path.isfile(self._path(*path)):
+                truncate_partial_line(self._path(*path))
+                if path == _GRAPHQL_DATA:
+                    self._uncommitted_nodes = _read_uncommitted_nodes(self._path(*path))
+            self._files[path] = open(self._path(*path), "a")
+        return self._files[path]
+
+    def _commit(self, path):
+        # Records the size of a file after a complete batch.
+        if path not in self._committed_files:
+            self._committed_files[path] = open(self._path(*path) + ".committed", "w")
+        write_committed_size(self._file(*path), self._committed_files[path])
+
+    def _write(self, path, lines):
+        file = self._file(*path)
+        data = "".join(lines)
+        file.write(data)
+        file.flush()
+        output = "/".join(path)
+        metrics.increment("rows_written_total", len(lines), {"output": output})
+        metrics.increment("bytes_written_total", len(data), {"output": output})
+
+    def add_repositories(self, repositories):
+        """
+        Adds a page of repositories, as returned by the /repositories endpoint.
+        """
+        self._write(("rest", "repositories.csv"),
+                    [str(repo["id"]) + "," + repo["full_name"] + "\n" for repo in repositories])
+
+    def repositories(self, after_id=0):
+        """
+        Yields the fetched repositories with an id greater than after_id, as dicts with an id and a full_name.
+        """
+        path = self._path("rest", "repositories.csv")
+        with open(path, "r") as csv_repositories:
+            # Repositories are sorted by id : directly seek the first one to process.
+            csv_repositories.seek(find_first_line_after(path, int(after_id)))
+            for repo in csv.DictReader(csv_repositories, fieldnames=("id", "full_name"), delimiter=","):
+                if int(repo["id"]) > int(after_id):
+                    yield repo
+
+    def add_contributions(self, repository_id, contributors):
+        """
+        Adds the contributors of a repository, registering the new users. Returns the number of added contributions.
+        """
+        if self._registered_users is None:
+            self._registered_users = _read_csv_users(self._path("rest", "users.csv"))
+
+        new_users = []
+        contributions = []
+        for contributor in contributors:
+            user_id = str(contributor["id"])
+            if user_id not in self._registered_users:
+                logger.debug("Add new user : id = %s, login = %s", user_id, contributor["login"])
+                new_users.append(user_id + ", " + contributor["login"] + "\n")
+                self._registered_users.add(user_id)
+            contributions.append(str(repository_id) + "," + user_id + "," + str(contributor["contributions"]) + "\n")
+
+        # Users are written first, so that an interrupted run never leaves contributions of unknown users.
+        self._write(("rest", "users.csv"), new_users)
+        self._write(_CONTRIBUTIONS, contributions)
+        self._commit(_CONTRIBUTIONS)
+        return len(contributions)
+
+    def add_graphql_nodes(self, edges, search_slice=None):
+        """
+        Adds a page of GraphQL search edges, each one containing a user node and its cursor. If the page belongs to a
+        search_slice of a partitioned crawl, the last cursor is recorded as the status of the slice instead.
+        """
+        # Opened first, to read the users of an interrupted page.
+        data_file = self._file(*_GRAPHQL_DATA)
+        self._write(_GRAPHQL_DATA, [json.dumps(edge["node"]) + "\n" for edge in edges
+                                    if edge["node"]["id"] not in self._uncommitted_nodes])
+        # The cursor is only recorded once the page is on disk.
+        os.fsync(data_file.fileno())
+        if search_slice is None:
+            self._write(("graphql", "page_cursors.txt"), [edge["cursor"] + "\n" for edge in edges])
+        elif len(edges) > 0:
+            self.set_graphql_slice_status(search_slice, edges[-1]["cursor"])
+        self._commit(_GRAPHQL_DATA)
+
+    def set_graphql_slice_status(self, search_slice, status):
+        """
+        Records the status of a search slice : the cursor of its last fetched page, "split" or "done".
+        """
+        self._write(("graphql", "slice_cursors.txt"), [search_slice + " " + status + "\n"])
+
+    def graphql_slices(self):
+        """
+        Returns the last recorded status of each search slice.
+
+        :rtype: dict
+        """
+        try:
+            with open(self._path("graphql", "slice_cursors.txt"), "r") as slices_file:
+                return dict(line.split() for line in slices_file if len(line.split()) == 2)
+        except FileNotFoundError:
+            return {}
+
+    def last_repository(self):
+        return _first_column(_read_last_line(self._path("rest", "repositories.csv")))
+
+    def last_repository_data_fetched(self):
+        path = self._path(*_CONTRIBUTIONS)
+        return _first_column(_read_last_line(path, read_committed_size(path)))
+
+    def last_page_cursor(self):
+        return _read_last_line(self._path("graphql", "page_cursors.txt"))
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        for file in self._committed_files.values():
+            file.close()
+        self._committed_files = {}
+
+
+class SqliteCrawlState:
+    """
+    Transactional crawl state, stored in a SQLite database in WAL mode.
+
+    Each batch is committed together with its checkpoint (last fetched repository, last repository whose contributors
+    have been fetched, or last GraphQL cursor), so that an interrupted crawl can always be resumed without duplicated
+    or missing rows. Commits are grouped by commit_interval batches to limit disk synchronizations : at most the last
+    uncommitted batches are fetched again after a crash.
+
+    The usual csv files can be exported at any moment using export_csv().
+
+    :param path: Path of the SQLite database file.
+    :type path: path-like object
+    :param commit_interval: Number of batches grouped in a single transaction.
+    :type commit_interval: int
+    """
+
+    def __init__(self, path, commit_interval=100):
+        self.commit_interval = commit_interval
+        self._uncommitted_batches = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("CREATE TABLE IF NOT EXISTS repositories ("
+                               "  id INTEGER PRIMARY KEY, full_name TEXT NOT NULL);"
+                               "CREATE TABLE IF NOT EXISTS users ("
+                               "  seq INTEGER PRIMARY KEY, id INTEGER UNIQUE NOT NULL, login TEXT NOT NULL);"
+                               "CREATE TABLE IF NOT EXISTS contributions ("
+                               "  seq INTEGER PRIMARY KEY, repository_id INTEGER NOT NULL, user_id INTEGER NOT NULL,"
+                               "  contributions INTEGER NOT NULL);"
+                               "CREATE TABLE IF NOT EXISTS graphql_nodes ("
+                               "  seq INTEGER PRIMARY KEY, node TEXT NOT NULL, cursor TEXT NOT NULL);"
+                               "CREATE TABLE IF NOT EXISTS checkpoints ("
+                               "  name TEXT PRIMARY KEY, value TEXT NOT NULL);")
+        self._registered_users = {str(row[0]) for row in self._db.execute("SELECT id FROM users")}
+
+    def _checkpoint(self, name, value):
+        # Saves the checkpoint in the current transaction, and commits every commit_interval batches.
+        self._db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (name, str(value)))
+        self._uncommitted_batches += 1
+        if self._uncommitted_batches >= self.commit_interval:
+            self.commit()
+
+    def _get_checkpoint(self, name):
+        row = self._db.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def commit(self):
+        self._db.commit()
+        self._uncommitted_batches = 0
+
+    def add_repositories(self, repositories):
+        """
+        Adds a page of repositories, as returned by the /repositories endpoint.
+        """
+        self._db.executemany("INSERT OR IGNORE INTO repositories VALUES (?, ?)",
+                             [(repo["id"], repo["full_name"]) for repo in repositories])
+        metrics.increment("rows_written_total", len(repositories), {"output": "repositories"})
+        if len(repositories) > 0:
+            self._checkpoint("last_repository", repositories[-1]["id"])
+
+    def repositories(self, after_id=0, page_size=1000):
+        """
+        Yields the fetched repositories with an id greater than after_id, as dicts with an id and a full_name.
+        """
+        last_id = int(after_id)
+        while True:
+            page = self._db.execute("SELECT id, full_name FROM repositories WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, page_size)).fetchall()
+            if len(page) == 0:
+                return
+            for repository_id, full_name in page:
+                yield {"id": str(repository_id), "full_name": full_name}
+            last_id = page[-1][0]
+
+    def add_contributions(self, repository_id, contributors):
+        """
+        Adds the contributors of a repository, registering the new users. Returns the number of added contributions.
+        """
+        for contributor in contributors:
+            user_id = str(contributor["id"])
+            if user_id not in self._registered_users:
+                logger.debug("Add new user : id = %s, login = %s", user_id, contributor["login"])
+                self._db.execute("INSERT INTO users (id, login) VALUES (?, ?)",
+                                 (contributor["id"], contributor["login"]))
+                self._registered_users.add(user_id)
+                metrics.increment("rows_written_total", labels={"output": "users"})
+        self._db.executemany("INSERT INTO contributions (repository_id, user_id, contributions) VALUES (?, ?, ?)",
+                             [(int(repository_id), contributor["id"], contributor["contributions"])
+                              for contributor in contributors])
+        metrics.increment("rows_written_total", len(contributors), {"output": "contributions"})
+        self._checkpoint("last_repository_data_fetched", repository_id)
+        return len(contributors)
+
+    def add_graphql_nodes(self, edges, search_slice=None):
+        """
+        Adds a page of GraphQL search edges, each one containing a user node and its cursor. If the page belongs to a
+        search_slice of a partitioned crawl, the last cursor is recorded as the status of the slice instead.
+        """
+        self._db.executemany("INSERT INTO graphql_nodes (node, cursor) VALUES (?, ?)",
+                             [(json.dumps(edge["node"]), edge["cursor"]) for edge in edges])
+        metrics.increment("rows_written_total", len(edges), {"output": "graphql_nodes"})
+        if len(edges) > 0:
+            if search_slice is None:
+                self._checkpoint("last_page_cursor", edges[-1]["cursor"])
+            else:
+                self.set_graphql_slice_status(search_slice, edges[-1]["cursor"])
+
+    def set_graphql_slice_status(self, search_slice, status):
+        """
+        Records the status of a search slice : the cursor of its last fetched page, "split" or "done".
+        """
+        self._checkpoint(_SLICE_CHECKPOINT + search_slice, status)
+
+    def graphql_slices(self):
+        """
+        Returns the last recorded status of each search slice.
+
+        :rtype: dict
+        """
+        return {name[len(_SLICE_CHECKPOINT):]: value for name, value in
+                self._db.execute("SELECT name, value FROM checkpoints WHERE substr(name, 1, ?) = ?",
+                                 (len(_SLICE_CHECKPOINT), _SLICE_CHECKPOINT))}
+
+    def last_repository(self):
+        return self._get_checkpoint("last_repository")
+
+    def last_repository_data_fetched(self):
+        return self._get_checkpoint("last_repository_data_fetched")
+
+    def last_page_cursor(self):
+        return self._get_checkpoint("last_page_cursor")
+
+    def export_csv(self, results_folder):
+        """
+        Exports the committed state to the usual csv layout in results_folder, overwriting existing files :
+            - rest/repositories.csv
+            - rest/users.csv
+            - rest/contributions.csv
+            - graphql/graphql_data.txt
+            - graphql/page_cursors.txt
+            - graphql/slice_cursors.txt
+            - graphql/data.json
+
+        :param results_folder: Path of the folder in which you want to store results.
+        :type results_folder: path-like object
+        """
+        self.commit()
+        for folder in ("rest", "graphql"):
+            os.makedirs(os.path.join(results_folder, folder), exist_ok=True)
+
+        with open(os.path.join(results_folder, "rest", "repositories.csv"), "w") as repositories_file:
+            for repository_id, full_name in self._db.execute("SELECT id, full_name FROM repositories ORDER BY id"):
+                repositories_file.write(str(repository_id) + "," + full_name + "\n")
+        with open(os.path.join(results_folder, "rest", "users.csv"), "w") as users_file:
+            for user_id, login in self._db.execute("SELECT id, login FROM users ORDER BY seq"):
+                users_file.write(str(user_id) + ", " + login + "\n")
+        with open(os.path.join(results_folder, "rest", "contributions.csv"), "w") as contributions_file:
+            for contribution in self._db.execute("SELECT repository_id, user_id, contributions "
+                                                 "FROM contributions ORDER BY seq"):
+                contributions_file.write(",".join(str(value) for value in contribution) + "\n")
+        # The recorded sizes of a previous CsvCrawlState don't apply to the exported files.
+        for path in (_CONTRIBUTIONS, _GRAPHQL_DATA):
+            if os.path.isfile(os.path.join(results_folder, *path) + ".committed"):
+                os.remove(os.path.join(results_folder, *path) + ".committed")
+
+        with open(os.path.join(results_folder, "graphql", "graphql_data.txt"), "w") as raw_data, \
+                open(os.path.join(results_folder, "graphql", "page_cursors.txt"), "w") as cursors_file, \
+                open(os.path.join(results_folder, "graphql", "data.json"), "w") as json_file:
+            json_file.write("[")
+            separator = ""
+            for node, cursor in self._db.execute("SELECT node, cursor FROM graphql_nodes ORDER BY seq"):
+                raw_data.write(node + "\n")
+                cursors_file.write(cursor + "\n")
+                json_file.write(separator + node)
+                separator = ", "
+            json_file.write("]")
+        with open(os.path.join(results_folder, "graphql", "slice_cursors.txt"), "w") as slices_file:
+            for search_slice, status in self.graphql_slices().items():
+                slices_file.write(search_slice + " " + status + "\n")
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def _read_csv_users(path):
+    try:
+        return read_first_column(path)
+    except FileNotFoundError:
+        return set()
+
+
+def _read_last_line(path, end=None):
+    try:
+        return read_last_line(path, end)
+    except FileNotFoundError:
+        return None
+
+
+def _read_uncommitted_nodes(path):
+    # Ids of the nodes written after the size recorded by the last complete page.
+    committed_size = read_committed_size(path)
+    if committed_size is None:
+        return set()
+    with open(path, "rb") as file:
+        file.seek(committed_size)
+        return {json.loads(line)["id"] for line in file if len(line.strip()) > 0}
+
+
+def _first_column(line):
+    return None if line is None else line.split(",", 1)[0]
@@ -0,0 +1,181 @@
+import csv
+import io
+import os
+
+_BLOCK_SIZE = 64 * 1024
+
+
+def read_last_line(path, end=None):
+    """
+    Returns the last non empty line of the specified file, without its end of line character, reading the file
+    backwards from its end so that only its tail is read whatever its size.
+
+    :param path: Path of the file to read.
+    :type path: path-like object
+    :param end: Size of the beginning of the file to consider, such as the size recorded by write_committed_size(), or
+                None for the whole file.
+    :type end: int
+    :return: The last line of the file, or None if the file is empty.
+    :rtype: String
+    """
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        if end is not None:
+            position = min(position, end)
+        tail = b""
+        while position > 0:
+            read_size = min(_BLOCK_SIZE, position)
+            position -= read_size
+            file.seek(position)
+            tail = file.read(read_size) + tail
+            stripped_tail = tail.rstrip(b"\r\n")
+            # The last line is complete once a new line character has been found before it.
+            if b"\n" in stripped_tail:
+                return stripped_tail.rsplit(b"\n", 1)[1].decode("utf-8")
+        if len(tail.strip(b"\r\n")) == 0:
+            return None
+        return tail.rstrip(b"\r\n").decode("utf-8")
+
+
+def truncate_partial_line(path):
+    """
+    Removes the last line of the specified file if it is not terminated by a new line character, as left by a process
+    interrupted while writing it.
+
+    :param path: Path of the file to repair.
+    :type path: path-like object
+    """
+    with open(path, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            read_size = min(_BLOCK_SIZE, position)
+            position -= read_size
+            file.seek(position)
+            block = file.read(read_size)
+            last_new_line = block.rfind(b"\n")
+            if last_new_line >= 0:
+                if position + last_new_line + 1 < size:
+                    file.truncate(position + last_new_line + 1)
+                return
+        file.truncate(0)
+
+
+def write_committed_size(file, committed_file):
+    """
+    Records the current size of a file opened in append mode, after a complete batch of lines has been written and
+    flushed to it, in committed_file (opened in "w" mode), so that truncate_uncommitted() can remove a batch
+    interrupted in the middle. The size is written with a fixed width at the beginning of committed_file, and only
+    replaces the previous one once written.
+
+    :param file: File to which a batch has been written.
+    :param committed_file: File in which its size is recorded, usually named after it with a .committed suffix.
+    """
+    committed_file.seek(0)
+    committed_file.write("{:020d}\n".format(file.tell()))
+    committed_file.flush()
+
+
+def read_committed_size(path):
+    """
+    Returns the size of the specified file recorded in path.committed by write_committed_size(), or None if no size
+    has been recorded.
+
+    :param path: Path of the file.
+    :type path: path-like object
+    :rtype: int
+    """
+    try:
+        with open(str(path) + ".committed", "r") as committed_file:
+            committed_size = committed_file.read().strip()
+    except FileNotFoundError:
+        return None
+    # An empty record, left by an interruption before the first size was written, is ignored.
+    return int(committed_size) if len(committed_size) > 0 else None
+
+
+def truncate_uncommitted(path):
+    """
+    Truncates the specified file to the size recorded in path.committed by write_committed_size(), removing the lines
+    of a batch interrupted in the middle. Does nothing if no size has been recorded.
+
+    :param path: Path of the file to repair.
+    :type path: path-like object
+    """
+    committed_size = read_committed_size(path)
+    if committed_size is not None and os.path.isfile(path) and os.path.getsize(path) > committed_size:
+        with open(path, "rb+") as file:
+            file.truncate(committed_size)
+
+
+def format_csv(rows):
+    """
+    Formats rows as csv lines, as csv.writer writes them to a file : fields containing a comma, a quote or a new line,
+    such as some labels, are quoted.
+
+    :param rows: Rows to format.
+    :type rows: iterable of tuple
+    :rtype: String
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def read_first_column(path):
+    """
+    Returns the set of the values of the first column of a csv file, such as the ids of rest/users.csv.
+
+    :param path: Path of the csv file.
+    :type path: path-like object
+    :rtype: set of String
+    """
+    with open(path, "r") as csv_file:
+        return {row[0] for row in csv.reader(csv_file, delimiter=",") if len(row) > 0}
+
+
+def find_first_line_after(path, key):
+    """
+    Returns the byte offset of the first line of path whose first integer column is strictly greater than key. Lines
+    of the file must be sorted by increasing first column, as the rest/repositories.csv file written by
+    rest_api.fetch_repositories(). The file is binary searched, so that only a few blocks are read whatever its size.
+
+    :param path: Path of the csv file.
+    :type path: path-like object
+    :param key: Searched value.
+    :type key: int
+    :return: Offset of the first line with a greater key, or the file size if there isn't any.
+    :rtype: int
+    """
+    with open(path, "rb") as file:
+        # Invariants : lines starting before low have a key <= key, the line starting at high (if any) has a key > key.
+        low = 0
+        high = file.seek(0, os.SEEK_END)
+        while low < high:
+            middle = (low + high) // 2
+            line_start = _line_start_from(file, middle) if middle > low else low
+            if line_start >= high:
+                # No line starts in [middle, high[ : check the line starting at low.
+                line_start = low
+            file.seek(line_start)
+            line = file.readline()
+            if _line_key(line) <= key:
+                low = line_start + len(line)
+            else:
+                high = line_start
+        return low
+
+
+def _line_start_from(file, position):
+    # Offset of the first line starting at or after position.
+    file.seek(position - 1)
+    file.readline()
+    return file.tell()
+
+
+def _line_key(line):
+    # Key of a csv line. Empty or partially written lines are considered as already processed.
+    try:
+        return int(line.split(b",", 1)[0])
+    except ValueError:
+        return float("-inf")
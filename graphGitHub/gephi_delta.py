@@ -0,0 +1,332 @@
+import csv
+import itertools
+import json
+import logging
+import os
+import numpy as np
+from graphGitHub.files import format_csv
+from graphGitHub.metrics import metrics, record_file
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+# Edges are indexed by the key source * _KEY_FACTOR + target.
+_KEY_FACTOR = 2 ** 32
+# Edges rows of the edges table, as (source, target, weight) int64 triples.
+_EDGE_ROW_SIZE = 3 * 8
+
+
+def update_gephi(user_file, repositories_file, contributions_file, destination_folder, chunk_size=1000000):
+    """
+    Updates the nodes.csv and edges.csv Gephi files of destination_folder with the users, repositories and
+    contributions appended to the raw files since the last update, instead of converting them again from scratch as
+    rest_api.raw2gephi() does :
+        - new nodes are appended to nodes.csv, existing nodes keep their Gephi id, so that Gephi layouts stay valid,
+        - new edges are appended to edges.csv,
+        - edges whose weight changed, when the contributions of a repository are fetched again, are updated. edges.csv
+          is then rewritten from the first changed edge : since the rows of a csv file don't have a fixed width, a
+          changed weight costs the rewriting of all the following rows, up to O(E) for a change in the first edges.
+
+    The new nodes and the new or changed edges of the last update are also written to delta_nodes.csv and
+    delta_edges.csv, that can be imported in an existing Gephi workspace ("Append to existing workspace", with the
+    "Last" edges merge strategy).
+
+    The state of the conversion is kept in the delta folder of destination_folder :
+        - watermark.json : offsets of the raw files up to which they have been converted, the sizes of the Gephi
+          files and the number of rows of the other files, written last,
+        - user_ids.bin and repository_ids.bin : (original id, Gephi id) of each node, in the order of their creation,
+        - edge_keys.bin : key of the (source, target) of each row of edges.csv,
+        - edges.bin and edge_offsets.bin : (source, target, weight) and byte offset of each row of edges.csv.
+
+    Raw files must only be appended to, as the crawlers do. Partially written last lines are left for the next update.
+    Parsing and formatting only concern the new lines, and the files of the delta folder are only appended to, except
+    for the weights of edges.bin that changed : an update writes O(new nodes + new edges) to them. They are loaded
+    and sorted in memory by each update, in O(N log N + E log E). An interrupted update is rolled back and performed
+    again by the next one.
+
+    The first update (without any delta folder) converts the whole raw files, and gives the same ids as raw2gephi(),
+    except that a contribution fetched several times is a single edge, with its last weight.
+
+    :param user_file: Path of the users.csv file.
+    :param repositories_file: Path of the repositories.csv file.
+    :param contributions_file: Path of the contributions.csv file.
+    :param destination_folder: Path of the folder in which the Gephi files are updated.
+    :param chunk_size: Number of contributions parsed at once.
+    """
+    state = _DeltaState(os.path.join(destination_folder, "delta"))
+    nodes_path = os.path.join(destination_folder, "nodes.csv")
+    edges_path = os.path.join(destination_folder, "edges.csv")
+    if state.watermark is None:
+        logger.info("No previous update : converting all the raw files...")
+        state.initialize(nodes_path, edges_path)
+    state.rollback(nodes_path, edges_path)
+    # Updated watermark, only recorded once the update is complete.
+    watermark = dict(state.watermark)
+    for name, path in (("users", user_file), ("repositories", repositories_file),
+                       ("contributions", contributions_file)):
+        if os.path.getsize(path) < watermark[name]:
+            raise ValueError(str(path) + " is smaller than at the last update : it has been rewritten, and must be "
+                                         "converted again from scratch.")
+
+    # New nodes, users first as with raw2gephi().
+    delta_nodes = []
+    next_id = watermark["nodes_count"]
+    previous_nodes_size = watermark["nodes_size"]
+    with open(nodes_path, "ab") as node_file:
+        for node_type, path in (("user", user_file), ("repository", repositories_file)):
+            name = "users" if node_type == "user" else "repositories"
+            lines, watermark[name] = _read_new_lines(path, watermark[name])
+            new_nodes = _new_nodes(lines, state.ids[node_type])
+            node_rows = [(next_id + i, label, node_type) for i, (_, label) in enumerate(new_nodes)]
+            node_file.write(format_csv(node_rows).encode("utf-8"))
+            delta_nodes.extend(node_rows)
+            state.add_nodes(node_type, [original_id for original_id, _ in new_nodes], next_id)
+            next_id += len(new_nodes)
+        watermark["nodes_size"] = node_file.tell()
+    watermark["nodes_count"] = next_id
+    logger.info("%d new nodes.", len(delta_nodes))
+
+    sources, targets, weights = _new_edges(contributions_file, watermark, state, chunk_size)
+    keys = sources * _KEY_FACTOR + targets
+    # The last weight of each edge wins, and new edges are ordered by their first contribution.
+    unique_keys, first = np.unique(keys, return_index=True)
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last
+    rows, existing = state.edge_rows(unique_keys)
+
+    edges_count = watermark["edges_count"]
+    table = state.edges_table(edges_count)
+    changed = np.zeros(len(unique_keys), dtype=bool)
+    changed[existing] = table[rows[existing], 2] != weights[last[existing]]
+    rewrite_from = watermark.get("rewrite_from")
+    if np.any(changed):
+        changed_first_row = int(rows[changed].min())
+        rewrite_from = changed_first_row if rewrite_from is None else min(rewrite_from, changed_first_row)
+        # Recorded before edges.csv is modified in place, so that an interrupted update rewrites it again.
+        state.watermark["rewrite_from"] = rewrite_from
+        state.save_watermark()
+        table[rows[changed], 2] = weights[last[changed]]
+        table.flush()
+
+    new = np.flatnonzero(~existing)
+    new = new[np.argsort(first[new], kind="stable")]
+    new_rows = np.column_stack((sources[first[new]], targets[first[new]], weights[last[new]]))
+    with open(edges_path, "rb+") as edge_file:
+        offsets = state.edge_offsets(edges_count)
+        if rewrite_from is not None and rewrite_from < edges_count:
+            logger.info("Rewriting edges.csv from edge %d...", rewrite_from)
+            edge_file.seek(offsets[rewrite_from])
+            edge_file.truncate()
+            for start in range(rewrite_from, edges_count, chunk_size):
+                end = min(start + chunk_size, edges_count)
+                offsets[start:end] = _write_edge_rows(edge_file, table[start:end])
+            offsets.flush()
+        edge_file.seek(0, os.SEEK_END)
+        new_offsets = _write_edge_rows(edge_file, new_rows)
+        watermark["edges_size"] = edge_file.tell()
+    state.append_edges(new_rows, new_offsets, unique_keys[new], edges_count)
+    watermark["edges_count"] = edges_count + len(new_rows)
+    watermark.pop("rewrite_from", None)
+    logger.info("%d new edges, %d changed edges.", len(new_rows), np.count_nonzero(changed))
+
+    state.commit(watermark)
+    record_file(nodes_path, len(delta_nodes), previous_nodes_size)
+    metrics.increment("rows_written_total", len(new_rows), {"output": "edges.csv"})
+
+    _write_delta(destination_folder, delta_nodes,
+                 np.concatenate((new_rows, np.column_stack((sources[first[changed]], targets[first[changed]],
+                                                            weights[last[changed]])))))
+
+
+class _DeltaState:
+    # Id maps, edge index and watermark of update_gephi(), stored in folder. The maps and the index are kept sorted in
+    # memory, and their rows are appended to files in the order of their creation.
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.watermark = None
+        self.ids = {}
+        self._edge_index = None
+        if os.path.isfile(self._path("watermark.json")):
+            with open(self._path("watermark.json"), "r") as watermark_file:
+                self.watermark = json.load(watermark_file)
+            if self.watermark["version"] != _FORMAT_VERSION:
+                raise ValueError("Unsupported delta state version : " + str(self.watermark["version"]))
+            # Rows appended after the watermark by an interrupted update are ignored, and removed by rollback().
+            for node_type in ("user", "repository"):
+                ids = np.fromfile(self._path(node_type + "_ids.bin"), dtype=np.int64,
+                                  count=2 * self.watermark[node_type + "_ids_count"]).reshape(-1, 2).T
+                self.ids[node_type] = ids[:, np.argsort(ids[0], kind="stable")]
+            keys = np.fromfile(self._path("edge_keys.bin"), dtype=np.int64, count=self.watermark["edges_count"])
+            order = np.argsort(keys, kind="stable")
+            self._edge_index = np.vstack((keys[order], order))
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def initialize(self, nodes_path, edges_path):
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        with open(nodes_path, "w") as node_file:
+            node_file.write("id,label,type\n")
+        with open(edges_path, "w") as edge_file:
+            edge_file.write("Source,Target,Weight\n")
+        for name in ("user_ids.bin", "repository_ids.bin", "edge_keys.bin", "edges.bin", "edge_offsets.bin"):
+            open(self._path(name), "wb").close()
+        self.watermark = {"version": _FORMAT_VERSION,
+                          "user_ids_count": 0,
+                          "repository_ids_count": 0,
+                          "users": 0,
+                          "repositories": 0,
+                          "contributions": 0,
+                          "nodes_count": 0,
+                          "nodes_size": os.path.getsize(nodes_path),
+                          "edges_count": 0,
+                          "edges_size": os.path.getsize(edges_path)}
+        self.ids = {node_type: np.zeros((2, 0), dtype=np.int64) for node_type in ("user", "repository")}
+        self._edge_index = np.zeros((2, 0), dtype=np.int64)
+        self.commit(self.watermark)
+
+    def rollback(self, nodes_path, edges_path):
+        # Removes what an interrupted update appended after the watermark. An interrupted rewrite of edges.csv may
+        # have left it shorter : it is rewritten again anyway.
+        for path, size in ((nodes_path, self.watermark["nodes_size"]),
+                           (edges_path, self.watermark["edges_size"]),
+                           (self._path("user_ids.bin"), self.watermark["user_ids_count"] * 16),
+                           (self._path("repository_ids.bin"), self.watermark["repository_ids_count"] * 16),
+                           (self._path("edge_keys.bin"), self.watermark["edges_count"] * 8),
+                           (self._path("edges.bin"), self.watermark["edges_count"] * _EDGE_ROW_SIZE),
+                           (self._path("edge_offsets.bin"), self.watermark["edges_count"] * 8)):
+            if os.path.getsize(path) < size and not (path == edges_path and "rewrite_from" in self.watermark):
+                raise ValueError(str(path) + " is smaller than at the last update : remove the delta folder to "
+                                             "convert the raw files again from scratch.")
+            with open(path, "rb+") as file:
+                file.truncate(size)
+
+    def lookup(self, node_type, original_ids):
+        # Gephi ids of original_ids, raising a KeyError for unknown ids.
+        ids = self.ids[node_type]
+        positions = np.minimum(np.searchsorted(ids[0], original_ids), max(ids.shape[1] - 1, 0))
+        unknown = ids[0][positions] != original_ids if ids.shape[1] > 0 else np.ones(len(original_ids), dtype=bool)
+        if np.any(unknown):
+            raise KeyError(str(original_ids[np.argmax(unknown)]))
+        return ids[1][positions]
+
+    def add_nodes(self, node_type, original_ids, first_id):
+        original_ids = np.array(original_ids, dtype=np.int64)
+        order = np.argsort(original_ids, kind="stable")
+        new_ids = np.vstack((original_ids[order], order + first_id))
+        with open(self._path(node_type + "_ids.bin"), "ab") as ids_file:
+            ids_file.write(np.ascontiguousarray(new_ids[:, np.argsort(order)].T).tobytes())
+        ids = self.ids[node_type]
+        self.ids[node_type] = np.insert(ids, np.searchsorted(ids[0], new_ids[0]), new_ids, axis=1)
+
+    def edge_rows(self, keys):
+        # Rows of the edges with the given sorted keys, and whether they exist.
+        positions = np.minimum(np.searchsorted(self._edge_index[0], keys), max(self._edge_index.shape[1] - 1, 0))
+        if self._edge_index.shape[1] == 0:
+            return positions, np.zeros(len(keys), dtype=bool)
+        return self._edge_index[1][positions], self._edge_index[0][positions] == keys
+
+    def edges_table(self, edges_count):
+        if edges_count == 0:
+            return np.zeros((0, 3), dtype=np.int64)
+        return np.memmap(self._path("edges.bin"), dtype=np.int64, mode="r+", shape=(edges_count, 3))
+
+    def edge_offsets(self, edges_count):
+        if edges_count == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.memmap(self._path("edge_offsets.bin"), dtype=np.int64, mode="r+", shape=(edges_count,))
+
+    def append_edges(self, rows, offsets, keys, first_row):
+        with open(self._path("edges.bin"), "ab") as table_file:
+            table_file.write(np.ascontiguousarray(rows, dtype=np.int64).tobytes())
+        with open(self._path("edge_offsets.bin"), "ab") as offsets_file:
+            offsets_file.write(np.asarray(offsets, dtype=np.int64).tobytes())
+        with open(self._path("edge_keys.bin"), "ab") as keys_file:
+            keys_file.write(np.asarray(keys, dtype=np.int64).tobytes())
+        new_index = np.vstack((keys, np.arange(first_row, first_row + len(keys), dtype=np.int64)))
+        order = np.argsort(new_index[0], kind="stable")
+        new_index = new_index[:, order]
+        self._edge_index = np.insert(self._edge_index, np.searchsorted(self._edge_index[0], new_index[0]), new_index,
+                                     axis=1)
+
+    def save_watermark(self):
+        with open(self._path("watermark.json.tmp"), "w") as watermark_file:
+            json.dump(self.watermark, watermark_file)
+        os.replace(self._path("watermark.json.tmp"), self._path("watermark.json"))
+
+    def commit(self, watermark):
+        # Records the watermark, that includes the rows appended to the maps and to the index.
+        self.watermark = dict(watermark, user_ids_count=self.ids["user"].shape[1],
+                              repository_ids_count=self.ids["repository"].shape[1])
+        self.save_watermark()
+
+
+def _read_new_lines(path, offset):
+    # Returns the complete lines of path after offset, and the offset following the last one.
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read()
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode("utf-8").splitlines(), offset + end
+
+
+def _new_nodes(lines, ids):
+    # Returns the (original id, label) of the nodes of lines that are not in the ids map yet.
+    rows = [row for row in csv.reader(lines, delimiter=",") if len(row) > 0]
+    original_ids = np.array([int(row[0]) for row in rows], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(ids[0], original_ids), max(ids.shape[1] - 1, 0))
+    known = ids[0][positions] == original_ids if ids.shape[1] > 0 else np.zeros(len(rows), dtype=bool)
+    new_nodes = []
+    added = set()
+    for row, original_id, is_known in zip(rows, original_ids.tolist(), known.tolist()):
+        if not is_known and original_id not in added:
+            added.add(original_id)
+            new_nodes.append((original_id, row[1]))
+    return new_nodes
+
+
+def _new_edges(contributions_file, watermark, state, chunk_size):
+    # Returns the sources, targets and weights of the new contributions, and moves the contributions watermark.
+    sources = [np.zeros(0, dtype=np.int64)]
+    targets = [np.zeros(0, dtype=np.int64)]
+    weights = [np.zeros(0, dtype=np.int64)]
+    with open(contributions_file, "rb") as contributions_data:
+        contributions_data.seek(watermark["contributions"])
+        while True:
+            chunk = list(itertools.islice(contributions_data, chunk_size))
+            if len(chunk) > 0 and not chunk[-1].endswith(b"\n"):
+                # Partially written last line.
+                chunk.pop()
+            if len(chunk) == 0:
+                break
+            watermark["contributions"] += sum(len(line) for line in chunk)
+            # Contributions are written as repository_id,user_id,contributions
+            contributions = np.loadtxt([line.decode("utf-8") for line in chunk], delimiter=",", dtype=np.int64,
+                                       ndmin=2)
+            sources.append(state.lookup("user", contributions[:, 1]))
+            targets.append(state.lookup("repository", contributions[:, 0]))
+            weights.append(contributions[:, 2])
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
+
+
+def _write_edge_rows(edge_file, rows):
+    # Writes (source, target, weight) rows to edge_file, and returns the byte offset of each row.
+    lines = [str(source) + "," + str(target) + "," + str(weight) + "\n" for source, target, weight in rows.tolist()]
+    offsets = np.zeros(len(lines), dtype=np.int64)
+    if len(lines) > 0:
+        np.cumsum([len(line) for line in lines[:-1]], out=offsets[1:])
+        offsets += edge_file.tell()
+        edge_file.write("".join(lines).encode("ascii"))
+    return offsets
+
+
+def _write_delta(destination_folder, delta_nodes, delta_edges):
+    # Writes the new nodes, and the new or changed edges, of the last update.
+    with open(os.path.join(destination_folder, "delta_nodes.csv"), "w") as node_file:
+        node_file.write("id,label,type\n")
+        node_file.write(format_csv(delta_nodes))
+    with open(os.path.join(destination_folder, "delta_edges.csv"), "wb") as edge_file:
+        edge_file.write(b"Source,Target,Weight\n")
+        _write_edge_rows(edge_file, delta_edges)
@@ -1,25 +1,55 @@
-import requests
+import collections
+import csv
+import itertools
 import json
-import time
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+from graphGitHub.client import GitHubClient
+from graphGitHub.columnar import GRAPHQL_COLUMNS, TableWriter, columnar_path, csv2columnar
+from graphGitHub.crawl_state import CsvCrawlState
+from graphGitHub.files import read_last_line, read_first_column, truncate_partial_line
+from graphGitHub.metrics import metrics, record_file, stage
+from graphGitHub.queries import SEARCH_USERS, post_query, user_repositories
 
 entry_point = "https://api.github.com/graphql"
 
+logger = logging.getLogger(__name__)
+
+_WRITE_BUFFER_SIZE = 1024 * 1024
 
+# GitHub never returns more results than this for a search, whatever the pagination.
+_SEARCH_RESULTS_LIMIT = 1000
+_SEARCH_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+_MAX_PAGE_ATTEMPTS = 3
+# Status of the slices of a partitioned crawl that are not in progress.
+_SPLIT = "split"
+_DONE = "done"
+
+
+@stage("graphql_fetch_data")
 def fetch_data(github_user_name,
                oauth_password,
                first_page_cursor=None,
                total_node=1000,
                users_by_query=20,
                repositories_by_users=20,
-               results_folder="results"):
+               results_folder="results",
+               state=None,
+               write_json=True,
+               batch_size=None,
+               persisted_queries=False):
     """
 
-    Fetch data using the GitHub GraphQL API and store them in the file results_folder/graphql/data.json. The parameter
-    first_page_cursor allows you to append results to this file, that will be re-converted as a valid json file at the
-    end.
+    Fetch data using the GitHub GraphQL API and store them in the file results_folder/graphql/graphql_data.txt, one
+    json user node by line. The parameter first_page_cursor allows you to append results to this file, that can be
+    converted to a single valid json file, results_folder/graphql/data.json, at the end.
     a page cursor history is kept in the file results_file/graphql/page_cursors.txt to allow you to start from the last
     fetched page. You can also use get_last_fetched_page() to do so.
+    A failed query is retried with an exponential backoff, and the crawl stops after 3 failures in a row, or at once
+    if the token is rejected (401).
 
     :param github_user_name: Your GitHub login.
     :type github_user_name: String
@@ -27,7 +57,7 @@ def fetch_data(github_user_name,
     :type oauth_password: String
     :param first_page_cursor: Cursor of the last fetched page.
     :type first_page_cursor: String
-    :param total_node: Number of node that you want to fetch. (can't be > 1000)
+    :param total_node: Number of node that you want to fetch. (can't be > 1000, see fetch_partitioned_data())
     :type total_node: int
     :param users_by_query: Number of users by GraphQL queries.
     :type users_by_query: int
@@ -35,181 +65,594 @@ def fetch_data(github_user_name,
     :type repositories_by_users: int
     :param results_folder: Folder in which you want to store the resulting JSON.
     :type results_folder: path-like object
+    :param state:   Crawl state in which results are stored, such as a SqliteCrawlState, in which case data.json is
+                    only written by its export_csv() method. By default, results are directly appended to the files of
+                    results_folder.
+    :type state: CsvCrawlState or SqliteCrawlState
+    :param write_json: Also converts graphql_data.txt to data.json at the end. graphql2csv() doesn't need it.
+    :type write_json: bool
+    :param batch_size:  Controller that tunes users_by_query and repositories_by_users from the observed cost, latency
+                        and errors of the queries. The initial sizes are then the ones of the controller.
+    :type batch_size: BatchSizeController
+    :param persisted_queries: Sends the queries as persisted queries. See queries.post_query().
+    :type persisted_queries: bool
     """
 
     fetched_users = 0
 
-    remaining = 5000
+    client = GitHubClient(github_user_name, oauth_password)
+    query_cost = 1
+    failures = 0
     lastCursor = first_page_cursor
     if lastCursor is not None:
-        print("Starting from " + lastCursor)
-
-    if not os.path.isdir(os.path.join(results_folder, "graphql")):
-        os.mkdir(os.path.join(results_folder, "graphql"))
-
-    with open(os.path.join(results_folder, "graphql", "graphql_data.txt"), "a+") as raw_data:
-        with open(os.path.join(results_folder, "graphql", "page_cursors.txt"), "a+") as cursors_file:
-            while fetched_users < total_node:
-                print("Remaining : " + str(remaining))
-
-                if remaining > 100:
-                    if lastCursor is not None:
-                        users = requests.post(entry_point,
-                                             data="{\"query\":"
-                                                  "\"query listContributions ($after: String!) {"
-                                                    "rateLimit{cost remaining resetAt} "
-                                                    "search(query:\\\"type:user\\\", type:USER, first:"
-                                                        + str(users_by_query) + ", after:$after){"
-                                                        "userCount pageInfo {endCursor} "
-                                                        "edges{node{... on User{"
-                                                            "id name repositoriesContributedTo(includeUserRepositories:true  first:"
-                                                                + str(repositories_by_users) +" orderBy:{direction:DESC field:STARGAZERS}){"
-                                                                "totalCount nodes{"
-                                                                    "stargazers{totalCount}"
-                                                                    "primaryLanguage{name}"
-                                                                    "id name}}}}cursor}}}\","
-                                                    "\"variables\":{\"after\":\"" + lastCursor + "\"}}",
-                                             auth=(github_user_name, oauth_password))
-                        print("{\"query\":"
-                                                  "\"query listContributions ($after: String!) {"
-                                                    "rateLimit{cost remaining resetAt} "
-                                                    "search(query:\\\"type:user\\\", type:USER, first:"
-                                                        + str(users_by_query) + ", after:$after){"
-                                                        "userCount pageInfo {endCursor} "
-                                                        "edges{node{... on User{"
-                                                            "id name repositoriesContributedTo(includeUserRepositories:true  first:"
-                                                                + str(repositories_by_users) +" orderBy:{direction:DESC field:STARGAZERS}){"
-                                                                "totalCount nodes{"
-                                                                    "stargazers{totalCount}"
-                                                                    "primaryLanguage{name}"
-                                                                    "id name}}}}cursor}}}\","
-                                                    "\"variables\":\\\"" + lastCursor + "\\\"}")
-                    else:
-                        users = requests.post(entry_point,
-                                              data="{\"query\":"
-                                                   "\"query listContributions {"
-                                                   "rateLimit{cost remaining resetAt} "
-                                                   "search(query:\\\"type:user\\\", type:USER, first:"
-                                                        + str(users_by_query) + "){"
-                                                      "userCount pageInfo {endCursor} "
-                                                      "edges{node{... on User{"
-                                                      "id name repositoriesContributedTo(includeUserRepositories:true first:"
-                                                        + str(repositories_by_users) + " orderBy:{direction:DESC field:STARGAZERS}){"
-                                                      "totalCount nodes{"
-                                                      "stargazers{totalCount}"
-                                                      "primaryLanguage{name}"
-                                                      "id name}}}}cursor}}}\"}",
-                                              auth=(github_user_name, oauth_password))
-                    if users.status_code == 200:
-                        repos_json = users.json()
-                        remaining = repos_json["data"]["rateLimit"]["remaining"]
-                        # lastCursor = repos_json["data"]["search"]["pageInfo"]["endCursor"]
-                        # if lastCursor is not None:
-                        #     cursors_file.write(lastCursor + "\n")
-                        # else:
-                        #     raise ValueError("None cursor!")
-
-                        if len(repos_json["data"]["search"]["edges"]) == 0:
-                            raise ValueError("No more users!")
-
-                        for entry in repos_json["data"]["search"]["edges"]:
-                            raw_data.write(json.dumps(entry["node"]) + "\n")
-                            lastCursor = entry["cursor"]
-                            if lastCursor is not None:
-                                cursors_file.write(lastCursor + "\n")
-                            else:
-                                print("None cursor, end of pages.")
-                                raise ValueError("None cursor!")
-                        fetched_users += len(repos_json["data"]["search"]["edges"])
-
-                        print(str(fetched_users) + " users fetched.")
+        logger.info("Starting from %s", lastCursor)
+
+    own_state = state is None
+    if own_state:
+        state = CsvCrawlState(results_folder)
+
+    try:
+        while fetched_users < total_node:
+            if batch_size is not None:
+                users_by_query, repositories_by_users = batch_size.sizes()
+            request_start = time.monotonic()
+            users = post_query(client, entry_point, SEARCH_USERS,
+                               {"query": "type:user",
+                                "first": users_by_query,
+                                "after": lastCursor,
+                                "repositories": repositories_by_users},
+                               cost=query_cost,
+                               persisted=persisted_queries)
+            latency = time.monotonic() - request_start
+            if users.status_code == 200 and users.json().get("data") is not None:
+                failures = 0
+                repos_json = users.json()
+                client.rate_limiter.update_from_graphql(repos_json["data"]["rateLimit"])
+                query_cost = repos_json["data"]["rateLimit"]["cost"]
+                if batch_size is not None:
+                    batch_size.record(users_by_query, repositories_by_users, query_cost, latency,
+                                      [edge["node"] for edge in repos_json["data"]["search"]["edges"]])
+                # lastCursor = repos_json["data"]["search"]["pageInfo"]["endCursor"]
+                # if lastCursor is not None:
+                #     cursors_file.write(lastCursor + "\n")
+                # else:
+                #     raise ValueError("None cursor!")
+
+                if len(repos_json["data"]["search"]["edges"]) == 0:
+                    raise ValueError("No more users!")
+
+                for i, entry in enumerate(repos_json["data"]["search"]["edges"]):
+                    if entry["cursor"] is None:
+                        state.add_graphql_nodes(repos_json["data"]["search"]["edges"][:i])
+                        logger.warning("None cursor, end of pages.")
+                        raise ValueError("None cursor!")
+                state.add_graphql_nodes(repos_json["data"]["search"]["edges"])
+                lastCursor = repos_json["data"]["search"]["edges"][-1]["cursor"]
+                fetched_users += len(repos_json["data"]["search"]["edges"])
+                metrics.increment("graphql_users_fetched_total", len(repos_json["data"]["search"]["edges"]))
+
+                logger.info("%d users fetched.", fetched_users)
+            else:
+                error = users.json().get("errors") if users.status_code == 200 else users.status_code
+                logger.warning("Request failed. error : %s", error)
+                metrics.increment("graphql_query_errors_total")
+                if batch_size is not None:
+                    batch_size.record(users_by_query, repositories_by_users, None, latency, error=error)
+                if users.status_code == 401:
+                    logger.error("You should check your GitHub oauth token.")
+                    break
+                failures += 1
+                if failures >= _MAX_PAGE_ATTEMPTS:
+                    logger.error("Request failed %d times in a row, giving up.", failures)
+                    break
+                time.sleep(client.backoff_delay(failures - 1))
+    finally:
+        if own_state:
+            state.close()
+
+    if own_state and write_json:
+        logger.info("Convert raw file to json...")
+        _raw2json(os.path.join(results_folder, "graphql", "graphql_data.txt"),
+                  os.path.join(results_folder, "graphql", "data.json"))
+    logger.info("All done!")
+
+
+@stage("graphql_fetch_partitioned_data")
+def fetch_partitioned_data(github_user_name,
+                           oauth_password,
+                           created_from="2008-01-01",
+                           created_to=None,
+                           total_node=10000,
+                           users_by_query=20,
+                           repositories_by_users=20,
+                           results_folder="results",
+                           workers=4,
+                           state=None,
+                           write_json=True,
+                           batch_size=None,
+                           persisted_queries=False):
+    """
+    Fetch users as fetch_data() does, but without the 1000 results limit of the GitHub search : the users space is
+    split in disjoint slices of creation dates (created:from..to search qualifiers), and each slice whose userCount
+    exceeds 1000 is bisected, until all the slices can be fully paged.
+
+    The pages of different slices are fetched concurrently by workers threads, sharing the same rate limit budget,
+    and all the nodes are appended to results_folder/graphql/graphql_data.txt. The status of each slice (cursor of its
+    last fetched page, "split" or "done") is kept in results_folder/graphql/slice_cursors.txt, so that calling this
+    function again with the same dates resumes the crawl.
+
+    :param github_user_name: Your GitHub login.
+    :type github_user_name: String
+    :param oauth_password: Your GitHub oauth token.
+    :type oauth_password: String
+    :param created_from: First creation date of the fetched users, as YYYY-MM-DD.
+    :type created_from: String
+    :param created_to: Last creation date of the fetched users, as YYYY-MM-DD. If None, the time of the first call,
+                       that is recorded with the slices and used again when the crawl is resumed.
+    :type created_to: String
+    :param total_node: Number of node that you want to fetch.
+    :type total_node: int
+    :param users_by_query: Number of users by GraphQL queries.
+    :type users_by_query: int
+    :param repositories_by_users: Number of repositories that will be fetched by users.
+    :type repositories_by_users: int
+    :param results_folder: Folder in which you want to store the resulting JSON.
+    :type results_folder: path-like object
+    :param workers: Number of pages fetched concurrently.
+    :type workers: int
+    :param state: Crawl state in which results are stored. See fetch_data().
+    :type state: CsvCrawlState or SqliteCrawlState
+    :param write_json: Also converts graphql_data.txt to data.json at the end.
+    :type write_json: bool
+    :param batch_size: Controller that tunes users_by_query and repositories_by_users. See fetch_data().
+    :type batch_size: BatchSizeController
+    :param persisted_queries: Sends the queries as persisted queries. See queries.post_query().
+    :type persisted_queries: bool
+    """
+    first_second = datetime.strptime(created_from, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    if created_to is not None:
+        last_second = datetime.strptime(created_to, "%Y-%m-%d").replace(tzinfo=timezone.utc) \
+                      + timedelta(days=1, seconds=-1)
+
+    client = GitHubClient(github_user_name, oauth_password, pool_size=max(10, workers))
+    own_state = state is None
+    if own_state:
+        state = CsvCrawlState(results_folder)
+
+    fetched_users = 0
+    query_cost = 1
+    try:
+        slices_status = state.graphql_slices()
+        if created_to is None:
+            # The end of the range is recorded on the first call, so that the slices of a resumed crawl are the same.
+            open_range = first_second.strftime(_SEARCH_DATE_FORMAT) + ".."
+            if open_range in slices_status:
+                last_second = datetime.strptime(slices_status[open_range], _SEARCH_DATE_FORMAT) \
+                    .replace(tzinfo=timezone.utc)
+            else:
+                last_second = datetime.now(timezone.utc).replace(microsecond=0)
+                state.set_graphql_slice_status(open_range, last_second.strftime(_SEARCH_DATE_FORMAT))
+        # Pages to fetch, as (slice, cursor, attempts), starting from the recorded status of the slices.
+        pending = collections.deque(_slice_pages(slices_status, first_second, last_second))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            while len(futures) > 0 or (len(pending) > 0 and fetched_users < total_node):
+                while len(pending) > 0 and len(futures) < workers and fetched_users < total_node:
+                    search_slice, cursor, attempts = pending.popleft()
+                    if batch_size is not None:
+                        users_by_query, repositories_by_users = batch_size.sizes()
+                    future = executor.submit(_search_users, client, query_cost, search_slice, cursor, users_by_query,
+                                             repositories_by_users, persisted_queries)
+                    futures[future] = (search_slice, cursor, attempts, users_by_query, repositories_by_users)
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    search_slice, cursor, attempts, page_users, page_repositories = futures.pop(future)
+                    response, latency = future.result()
+                    data = response.json().get("data") if response.status_code == 200 else None
+                    if data is None:
+                        error = response.json().get("errors") if response.status_code == 200 else response.status_code
+                        logger.warning("Request failed on slice %s. error : %s", _slice_key(search_slice), error)
+                        metrics.increment("graphql_query_errors_total")
+                        if batch_size is not None:
+                            batch_size.record(page_users, page_repositories, None, latency, error=error)
+                        if response.status_code == 401:
+                            logger.error("You should check your GitHub oauth token.")
+                            pending.clear()
+                        elif attempts + 1 < _MAX_PAGE_ATTEMPTS:
+                            pending.append((search_slice, cursor, attempts + 1))
+                        continue
+
+                    client.rate_limiter.update_from_graphql(data["rateLimit"])
+                    query_cost = data["rateLimit"]["cost"]
+                    search = data["search"]
+                    if batch_size is not None:
+                        batch_size.record(page_users, page_repositories, query_cost, latency,
+                                          [edge["node"] for edge in search["edges"]])
+                    if cursor is None and search["userCount"] > _SEARCH_RESULTS_LIMIT:
+                        if search_slice[0] < search_slice[1]:
+                            # Too many users to be paged : the slice is bisected, and this first page discarded.
+                            state.set_graphql_slice_status(_slice_key(search_slice), _SPLIT)
+                            metrics.increment("graphql_slice_splits_total")
+                            pending.extend((half, None, 0) for half in _bisect_slice(search_slice))
+                            continue
+                        logger.warning("More than %d users created at %s : only the first ones will be fetched.",
+                                       _SEARCH_RESULTS_LIMIT, _slice_key(search_slice))
+
+                    edges = [edge for edge in search["edges"] if edge["cursor"] is not None]
+                    state.add_graphql_nodes(edges, _slice_key(search_slice))
+                    fetched_users += len(edges)
+                    metrics.increment("graphql_users_fetched_total", len(edges))
+                    if search["pageInfo"]["hasNextPage"] and len(edges) > 0:
+                        pending.append((search_slice, edges[-1]["cursor"], 0))
                     else:
-                        print("Request failed. error : " + str(users.status_code))
-                        if users.status_code == 401:
-                            print("You should check yout GitHub oauth token.")
+                        state.set_graphql_slice_status(_slice_key(search_slice), _DONE)
+                logger.info("%d users fetched.", fetched_users)
+    finally:
+        if own_state:
+            state.close()
+
+    if own_state and write_json:
+        logger.info("Convert raw file to json...")
+        _raw2json(os.path.join(results_folder, "graphql", "graphql_data.txt"),
+                  os.path.join(results_folder, "graphql", "data.json"))
+    logger.info("All done!")
+
+
+def _search_users(client, cost, search_slice, cursor, users_by_query, repositories_by_users, persisted_queries):
+    # Fetches a page of the users of a slice. Returns the response and its latency.
+    request_start = time.monotonic()
+    response = post_query(client, entry_point, SEARCH_USERS,
+                          {"query": "type:user created:" + _slice_key(search_slice),
+                           "first": users_by_query,
+                           "after": cursor,
+                           "repositories": repositories_by_users},
+                          cost=cost,
+                          persisted=persisted_queries)
+    return response, time.monotonic() - request_start
+
+
+def _slice_key(search_slice):
+    # Slices are inclusive ranges of creation dates, written as a created: search qualifier.
+    return search_slice[0].strftime(_SEARCH_DATE_FORMAT) + ".." + search_slice[1].strftime(_SEARCH_DATE_FORMAT)
+
+
+def _bisect_slice(search_slice):
+    first, last = search_slice
+    middle = first + timedelta(seconds=int((last - first).total_seconds()) // 2)
+    return (first, middle), (middle + timedelta(seconds=1), last)
+
+
+def _slice_pages(slices_status, first, last):
+    # Yields the first page to fetch of each slice that is not done, following the recorded splits.
+    slices = [(first, last)]
+    while len(slices) > 0:
+        search_slice = slices.pop()
+        status = slices_status.get(_slice_key(search_slice))
+        if status == _SPLIT:
+            slices.extend(reversed(_bisect_slice(search_slice)))
+        elif status != _DONE:
+            yield search_slice, status, 0
+
+
+@stage("graphql_fetch_missing_repositories")
+def fetch_missing_repositories(github_user_name,
+                               oauth_password,
+                               results_folder="results",
+                               users_by_query=20,
+                               repositories_by_page=100,
+                               persisted_queries=False):
+    """
+    Completes the repositoriesContributedTo of the users of results_folder/graphql/graphql_data.txt, of which the
+    crawlers only fetch the first repositories_by_users.
+
+    Users whose repositories have a next page (or, for nodes fetched without pageInfo, whose totalCount exceeds the
+    number of fetched repositories) are batched in aliased queries of users_by_query node(id:) lookups, each one
+    fetching the next page of a user. Pages are appended to results_folder/graphql/repository_pages.txt as they are
+    fetched, so that an interrupted run can be resumed. graphql_data.txt is left untouched : read_graphql_nodes() and
+    graphql2csv() add the repositories of this file to the nodes, so that it is kept when graphql_data.txt is written
+    again, for instance by the export_csv() method of a SqliteCrawlState.
+    A failed query is retried with an exponential backoff, and the run stops after 3 failures in a row, or at once if
+    the token is rejected (401).
+
+    With a SqliteCrawlState, call its export_csv() method first to write graphql_data.txt.
+
+    :param github_user_name: Your GitHub login.
+    :type github_user_name: String
+    :param oauth_password: Your GitHub oauth token.
+    :type oauth_password: String
+    :param results_folder: The folder where you store your results.
+    :type results_folder: path-like object
+    :param users_by_query: Number of users by GraphQL queries.
+    :type users_by_query: int
+    :param repositories_by_page: Number of repositories fetched by user and by query.
+    :type repositories_by_page: int
+    :param persisted_queries: Sends the queries as persisted queries. See queries.post_query().
+    :type persisted_queries: bool
+    """
+    pages_path = os.path.join(results_folder, "graphql", "repository_pages.txt")
+    if os.path.isfile(pages_path):
+        truncate_partial_line(pages_path)
+
+    # Cursor of the next page of each incomplete user, None to start from the first page. Nodes already have the
+    # pageInfo of the last page fetched by a previous run.
+    next_pages = collections.OrderedDict()
+    for node in read_graphql_nodes(results_folder):
+        repositories = node["repositoriesContributedTo"]
+        page_info = repositories.get("pageInfo")
+        if page_info is None:
+            if repositories["totalCount"] > len(repositories["nodes"]):
+                next_pages[node["id"]] = None
+        elif page_info["hasNextPage"]:
+            next_pages[node["id"]] = page_info["endCursor"]
+    logger.info("%d users with missing repositories.", len(next_pages))
+
+    client = GitHubClient(github_user_name, oauth_password)
+    query_cost = 1
+    failures = 0
+    with open(pages_path, "a") as pages_file:
+        while len(next_pages) > 0:
+            batch = list(itertools.islice(next_pages.items(), users_by_query))
+            variables = {"repositories": repositories_by_page}
+            for i, (user_id, cursor) in enumerate(batch):
+                variables["user" + str(i)] = user_id
+                variables["after" + str(i)] = cursor
+            response = post_query(client, entry_point, user_repositories(len(batch)), variables,
+                                  cost=query_cost,
+                                  persisted=persisted_queries)
+            data = response.json().get("data") if response.status_code == 200 else None
+            if data is None:
+                error = response.json().get("errors") if response.status_code == 200 else response.status_code
+                logger.warning("Request failed. error : %s", error)
+                metrics.increment("graphql_query_errors_total")
+                if response.status_code == 401:
+                    logger.error("You should check your GitHub oauth token.")
+                    break
+                failures += 1
+                if failures >= _MAX_PAGE_ATTEMPTS:
+                    logger.error("Request failed %d times in a row, giving up.", failures)
+                    break
+                time.sleep(client.backoff_delay(failures - 1))
+                continue
+            failures = 0
+            client.rate_limiter.update_from_graphql(data["rateLimit"])
+            query_cost = data["rateLimit"]["cost"]
+
+            for i, (user_id, _) in enumerate(batch):
+                user = data.get("user" + str(i))
+                if user is None:
+                    # Deleted user, or partial error : the user is not fetched again.
+                    del next_pages[user_id]
+                    continue
+                page = user["repositoriesContributedTo"]
+                pages_file.write(json.dumps({"id": user_id, "repositoriesContributedTo": page}) + "\n")
+                if page["pageInfo"]["hasNextPage"]:
+                    # Moves the user at the end of the queue, so that batches keep mixing users.
+                    del next_pages[user_id]
+                    next_pages[user_id] = page["pageInfo"]["endCursor"]
                 else:
-                    print("Waiting...")
-                    time.sleep(60)
+                    del next_pages[user_id]
+            pages_file.flush()
+            logger.info("%d users with missing repositories.", len(next_pages))
+    logger.info("All done!")
 
-    print("Convert raw file to json...")
-    _raw2json(os.path.join(results_folder, "graphql", "graphql_data.txt"), os.path.join(results_folder, "graphql", "data.json"))
-    print("All done!")
+
+def _read_repository_pages(pages_path, start=0, end=None):
+    # Returns the pages of repositories fetched for each user, reading the complete lines of the pages file between
+    # the offsets start and end (by default, the end of the file), and the offset at which the reading stopped.
+    pages = {}
+    try:
+        with open(pages_path, "rb") as pages_file:
+            pages_file.seek(start)
+            for line in pages_file:
+                if not line.endswith(b"\n") or (end is not None and start + len(line) > end):
+                    break
+                page = json.loads(line)
+                pages.setdefault(page["id"], []).append(page["repositoriesContributedTo"])
+                start += len(line)
+    except FileNotFoundError:
+        pass
+    return pages, start
+
+
+def _merge_repository_pages(node, pages):
+    # Appends the repositories of the fetched pages to the ones of the node, and returns the repositories added.
+    if len(pages) == 0:
+        return []
+    repositories = node["repositoriesContributedTo"]
+    repository_ids = {repository["id"] for repository in repositories["nodes"]}
+    added_repositories = []
+    for page in pages:
+        for repository in page["nodes"]:
+            if repository["id"] not in repository_ids:
+                added_repositories.append(repository)
+                repository_ids.add(repository["id"])
+    repositories["nodes"].extend(added_repositories)
+    repositories["totalCount"] = pages[-1]["totalCount"]
+    repositories["pageInfo"] = pages[-1]["pageInfo"]
+    return added_repositories
 
 
 def _raw2json(source_file_path, destination_file_path):
-    # Converts the raw data file to a valid json file.
+    # Converts the raw data file to a valid json file. Each line already is a json node : lines are streamed to the
+    # json array without being decoded.
     with open(source_file_path, "r") as raw_data:
         with open(destination_file_path, "w+") as json_file:
-            json_data = []
-            for line in raw_data.readlines():
-                json_data.append(json.loads(line))
-            json_file.write(json.dumps(json_data))
+            json_file.write("[")
+            separator = ""
+            for line in raw_data:
+                line = line.strip()
+                if len(line) > 0:
+                    json_file.write(separator + line)
+                    separator = ", "
+            json_file.write("]")
 
 
-def graphql2csv(results_folder):
+def read_graphql_nodes(results_folder):
     """
-    Converts the graphql/data.json file contained in the specified results_folder to 3 .csv files contained in the same
-    folder :
+    Yields the user nodes fetched by fetch_data(), decoding results_folder/graphql/graphql_data.txt line by line, so
+    that only one node is in memory at once. Falls back to results_folder/graphql/data.json if there is no
+    graphql_data.txt file. The repositories fetched by fetch_missing_repositories() are added to the nodes.
+
+    :param results_folder: The folder where you store your results.
+    :return: Generator of user nodes.
+    :rtype: generator of dict
+    """
+    pages, _ = _read_repository_pages(os.path.join(results_folder, "graphql", "repository_pages.txt"))
+    for node in _read_raw_nodes(results_folder):
+        _merge_repository_pages(node, pages.get(node["id"], []))
+        yield node
+
+
+def _read_raw_nodes(results_folder):
+    # Yields the user nodes as fetched by the crawlers, without their missing repositories.
+    raw_data_path = os.path.join(results_folder, "graphql", "graphql_data.txt")
+    if not os.path.isfile(raw_data_path):
+        with open(os.path.join(results_folder, "graphql", "data.json"), "r") as data_file:
+            yield from json.load(data_file)
+        return
+    with open(raw_data_path, "r") as raw_data:
+        for line in raw_data:
+            if len(line.strip()) > 0:
+                yield json.loads(line)
+
+
+@stage("graphql2csv")
+def graphql2csv(results_folder, incremental=False, log_level=logging.DEBUG, columnar=None):
+    """
+    Converts the graphql/graphql_data.txt file (or graphql/data.json, if there isn't any) contained in the specified
+    results_folder to 3 .csv files contained in the same folder. Nodes are streamed, so memory usage doesn't depend on
+    the number of users :
         - users.csv
         - repositories.csv
         -contributions.csv
 
+    If incremental is true, existing csv files are completed instead of being rewritten : the nodes already converted
+    (one by row of users.csv) are skipped, and the repositories of repositories.csv are not added again. Only the
+    repositories fetched by fetch_missing_repositories() since the last conversion are added for the skipped nodes :
+    the size of graphql/repository_pages.txt already converted is recorded in graphql/repository_pages.txt.converted.
+
     :param results_folder: The folder where you store your results.
+    :param incremental: Only converts the nodes fetched since the last conversion.
+    :type incremental: bool
+    :param log_level: Level at which each new repository is logged, by the graphGitHub.graphql_api logger.
+    :type log_level: int
+    :param columnar: "parquet" or "arrow" to also write the 3 tables as Parquet or Arrow files, such as
+                     users.parquet, with typed and dictionary encoded columns (see columnar.GRAPHQL_COLUMNS). They are
+                     streamed with the csv files, or converted from the completed csv files in incremental mode, since
+                     columnar files can't be appended to. Requires pyarrow.
+    :type columnar: String
     """
 
-    registered_repositories = []
-
-    try:
-        with open(os.path.join(results_folder, "graphql", "data.json"), "r") as data_file:
-            graphql_data = json.loads(data_file.read())
-    except FileNotFoundError as e:
-        print(e)
-        print("graphql/data.json doesn't seem to exist in the specified results_folder."
-              " Maybe you forgot to call fetch_data before this function.")
+    if not os.path.isfile(os.path.join(results_folder, "graphql", "graphql_data.txt")) \
+            and not os.path.isfile(os.path.join(results_folder, "graphql", "data.json")):
+        logger.error("graphql/graphql_data.txt doesn't seem to exist in the specified results_folder."
+                     " Maybe you forgot to call fetch_data before this function.")
         return
+    graphql_data = _read_raw_nodes(results_folder)
+    pages_path = os.path.join(results_folder, "graphql", "repository_pages.txt")
+    converted_pages_size = 0
+    converted_users = 0
+
+    paths = {name: os.path.join(results_folder, "graphql", name + ".csv")
+             for name in ("repositories", "contributions", "users")}
+    registered_repositories = set()
+    mode = "w"
+    initial_sizes = dict.fromkeys(paths, 0)
+    if incremental and all(os.path.isfile(path) for path in paths.values()):
+        for path in paths.values():
+            truncate_partial_line(path)
+        registered_repositories = read_first_column(paths["repositories"])
+        with open(paths["users"], "r", newline="") as users_file:
+            converted_users = sum(1 for _ in csv.reader(users_file))
+        logger.info("Skipping %d already converted nodes...", converted_users)
+        try:
+            with open(pages_path + ".converted", "r") as converted_pages_file:
+                converted_pages_size = int(converted_pages_file.read().strip() or 0)
+        except FileNotFoundError:
+            pass
+        mode = "a"
+        initial_sizes = {name: os.path.getsize(path) for name, path in paths.items()}
+    # Pages already converted, which are only added to the nodes, and pages to convert.
+    converted_pages, _ = _read_repository_pages(pages_path, end=converted_pages_size)
+    new_pages, pages_size = _read_repository_pages(pages_path, start=converted_pages_size)
+    new_repositories_count = 0
+    writers = {}
+    if columnar is not None and mode == "w":
+        writers = {name: TableWriter(columnar_path(os.path.join(results_folder, "graphql"), name, columnar),
+                                     GRAPHQL_COLUMNS[name])
+                   for name in paths}
+
+    with open(paths["repositories"], mode, newline="", buffering=_WRITE_BUFFER_SIZE) as repositories_file, \
+            open(paths["contributions"], mode, newline="", buffering=_WRITE_BUFFER_SIZE) as contributions_file, \
+            open(paths["users"], mode, newline="", buffering=_WRITE_BUFFER_SIZE) as users_file:
+        repositories_csv = csv.writer(repositories_file, lineterminator="\n")
+        contributions_csv = csv.writer(contributions_file, lineterminator="\n")
+        users_csv = csv.writer(users_file, lineterminator="\n")
+        processed_users = 0
+        completed_users = 0
+        contributions_count = 0
+        logger.info("Processing nodes...")
+        for i, data in enumerate(graphql_data):
+            user_id = data["id"]
+            _merge_repository_pages(data, converted_pages.get(user_id, []))
+            if i < converted_users:
+                # Already converted node : only the repositories of the new pages are added.
+                repositories = _merge_repository_pages(data, new_pages.get(user_id, []))
+                completed_users += len(repositories) > 0
+            else:
+                # User data
+                _merge_repository_pages(data, new_pages.get(user_id, []))
+                repositories = data["repositoriesContributedTo"]["nodes"]
+                users_csv.writerow((user_id, str(data["name"])))
+                if writers:
+                    writers["users"].write_rows(((user_id, str(data["name"])),))
+                processed_users += 1
+            for repository in repositories:
+                rep_id = repository["id"]
+                if rep_id not in registered_repositories:
+
+                    rep_name = repository["name"]
+                    rep_stars = repository["stargazers"]
+                    rep_language = repository["primaryLanguage"]
+
+                    # Handling null entries
+                    if rep_stars is None:
+                        rep_stars = {"totalCount": 0}
+                    if rep_language is None:
+                        rep_language = {"name": "None"}
+
+                    logger.log(log_level, "Add new repository : id = %s, name = %s, stars = %d, language = %s",
+                               rep_id, rep_name, rep_stars["totalCount"], rep_language["name"])
+                    repositories_csv.writerow((rep_id, rep_name, rep_stars["totalCount"], rep_language["name"]))
+                    if writers:
+                        writers["repositories"].write_rows(
+                            ((rep_id, rep_name, rep_stars["totalCount"], rep_language["name"]),))
+                    registered_repositories.add(rep_id)
+                    new_repositories_count += 1
+                contributions_csv.writerow((user_id, rep_id))
+                if writers:
+                    writers["contributions"].write_rows(((user_id, rep_id),))
+                contributions_count += 1
+
+        logger.info("%d nodes processed, %d nodes completed.", processed_users, completed_users)
+        logger.info("%d users, %d repositories and %d contributions found.",
+                    processed_users, new_repositories_count, contributions_count)
+
+    for name, rows in (("users", processed_users),
+                       ("repositories", new_repositories_count),
+                       ("contributions", contributions_count)):
+        record_file(paths[name], rows, initial_sizes[name])
+
+    with open(pages_path + ".converted", "w") as converted_pages_file:
+        converted_pages_file.write(str(pages_size) + "\n")
 
-    with open(os.path.join(results_folder, "graphql", "repositories.csv"), "w+") as repositories_file:
-        with open(os.path.join(results_folder, "graphql", "contributions.csv"), "w+") as contributions_file:
-            with open(os.path.join(results_folder, "graphql", "users.csv"), "w+") as users_file:
-                processed_users = 0
-                contributions_count = 0
-                print("Processing " + str(len(graphql_data)) + " nodes...")
-                print(graphql_data)
-                for data in graphql_data:
-                    # User data
-                    user_id = data["id"]
-                    users_file.write(str(user_id) + "," + str(data["name"]) + "\n")
-                    for repository in data["repositoriesContributedTo"]["nodes"]:
-                        rep_id = repository["id"]
-                        if rep_id not in registered_repositories:
-
-                            rep_name = repository["name"]
-                            rep_stars = repository["stargazers"]
-                            rep_language = repository["primaryLanguage"]
-
-                            # Handling null entries
-                            if rep_stars is None:
-                                rep_stars = {"totalCount": 0}
-                            if rep_language is None:
-                                rep_language = {"name": "None"}
-
-                            print("Add new repository : id = " + rep_id
-                                  + ", name = " + rep_name
-                                  + ", stars = " + str(rep_stars["totalCount"])
-                                  + ", language = " + rep_language["name"])
-                            repositories_file.write(rep_id + ","
-                                                    + rep_name + ","
-                                                    + str(rep_stars["totalCount"]) + ","
-                                                    + rep_language["name"] + "\n")
-                            registered_repositories.append(rep_id)
-                        contributions_file.write(user_id + "," + rep_id + "\n")
-                        contributions_count += 1
-                    processed_users += 1
-
-                print(str(len(graphql_data)) + " nodes processed.")
-                print(str(processed_users) + " users, "
-                      + str(len(registered_repositories)) + " repositories and "
-                      + str(contributions_count) + " contributions found.")
+    for writer in writers.values():
+        writer.close()
+    if columnar is not None and mode == "a":
+        for name, path in paths.items():
+            csv2columnar(path, columnar_path(os.path.join(results_folder, "graphql"), name, columnar),
+                         GRAPHQL_COLUMNS[name], header=False)
 
 
 def get_last_fetched_page(results_folder):
@@ -221,15 +664,8 @@ def get_last_fetched_page(results_folder):
     """
 
     try:
-        with open(os.path.join(results_folder, "graphql", "page_cursors.txt")) as page_file:
-            pages = page_file.readlines()
-            # Removes \n end character
-            try:
-                page_cursor = pages[-1][0:-1]
-                return page_cursor
-            except IndexError:
-                return None
+        return read_last_line(os.path.join(results_folder, "graphql", "page_cursors.txt"))
     except FileNotFoundError as e:
-        print(e)
-        print("graphql/page_cursor.txt doesn't seem to exist in the specified results_folder.")
+        logger.error("%s", e)
+        logger.error("graphql/page_cursors.txt doesn't seem to exist in the specified results_folder.")
         raise
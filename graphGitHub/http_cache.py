@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import time
+
+
+class HttpCache:
+    """
+    On disk cache of GitHub API responses, used to perform conditional requests.
+
+    For each cached URL, the ETag and Last-Modified validators of the last response are stored with its body and its
+    Link header (so that pagination still works on cached pages). GitHub answers 304 Not Modified to conditional
+    requests on unchanged resources, and those responses don't count against the rate limit : re-crawling mostly
+    static data is then nearly free.
+
+    The cache is bounded to max_size bytes of bodies, least recently used entries being evicted first.
+
+    :param path: Path of the SQLite database file used to store the cache.
+    :type path: path-like object
+    :param max_size: Maximum total size of the cached bodies, in bytes.
+    :type max_size: int
+    """
+
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "url TEXT PRIMARY KEY, "
+                         "etag TEXT, "
+                         "last_modified TEXT, "
+                         "link TEXT, "
+                         "body BLOB NOT NULL, "
+                         "size INTEGER NOT NULL, "
+                         "last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url):
+        """
+        Returns the cached entry of url, or None if url is not cached.
+
+        :param url: Full URL of the request, including its query parameters.
+        :return: A dict with the etag, last_modified, link and body of the cached response.
+        :rtype: dict
+        """
+        with self._lock:
+            row = self._db.execute("SELECT etag, last_modified, link, body FROM responses WHERE url = ?",
+                                   (url,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        return {"etag": row[0], "last_modified": row[1], "link": row[2], "body": row[3]}
+
+    def put(self, url, etag, last_modified, link, body):
+        """
+        Stores a response in the cache, evicting the least recently used entries if the cache is full.
+
+        :param url: Full URL of the request, including its query parameters.
+        :param etag: ETag header of the response.
+        :param last_modified: Last-Modified header of the response.
+        :param link: Link header of the response.
+        :param body: Raw (decoded) body of the response.
+        :type body: bytes
+        """
+        if len(body) > self.max_size:
+            return
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if previous is not None:
+                self._size -= previous[0]
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (url, etag, last_modified, link, sqlite3.Binary(body), len(body), time.time()))
+            self._size += len(body)
+            if self._size > self.max_size:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Removes least recently used entries until the cache fits in max_size.
+        evicted = []
+        for url, size in self._db.execute("SELECT url, size FROM responses ORDER BY last_used"):
+            if self._size <= self.max_size:
+                break
+            evicted.append((url,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE url = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
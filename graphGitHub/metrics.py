@@ -0,0 +1,265 @@
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the default histogram buckets, suited to request latencies and stage durations in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values, as exposed by Prometheus.
+
+    :param buckets: Increasing upper bounds of the buckets, the last one being infinity.
+    :type buckets: tuple of float
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """
+    Registry of the counters, gauges and histograms of a crawl or a conversion, such as the number of requests, their
+    latency, the remaining rate limit, and the rows and bytes written. Each metric is identified by its name and an
+    optional dict of labels.
+
+    Listeners added with add_listener() are called as listener(kind, name, labels, value) on each update, and the
+    metrics can be written in the Prometheus text format with write_prometheus() or export_prometheus().
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, kind, name, labels, value):
+        for listener in self._listeners:
+            listener(kind, name, labels, value)
+
+    def increment(self, name, value=1, labels=None):
+        """
+        Adds value to a counter.
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._notify("counter", name, labels, value)
+
+    def set_gauge(self, name, value, labels=None):
+        """
+        Sets the current value of a gauge.
+        """
+        with self._lock:
+            self.gauges[(name, _labels_key(labels))] = value
+        self._notify("gauge", name, labels, value)
+
+    def observe(self, name, value, labels=None):
+        """
+        Adds a value to a histogram.
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+        self._notify("histogram", name, labels, value)
+
+    def prometheus_text(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        :rtype: String
+        """
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append("# TYPE " + name + " " + kind)
+                    for (metric_name, labels), value in sorted(values.items()):
+                        if metric_name == name:
+                            lines.append(name + _format_labels(labels) + " " + repr(float(value)))
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append("# TYPE " + name + " histogram")
+                for (metric_name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric_name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        bucket_labels = labels + (("le", "+Inf" if bound == float("inf") else repr(bound)),)
+                        lines.append(name + "_bucket" + _format_labels(bucket_labels) + " " + str(count))
+                    lines.append(name + "_sum" + _format_labels(labels) + " " + repr(histogram.sum))
+                    lines.append(name + "_count" + _format_labels(labels) + " " + str(histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics to a Prometheus text file, such as the ones collected by the node exporter. The file is
+        replaced atomically, so that it is never read partially written.
+
+        :param path: Path of the text file.
+        :type path: path-like object
+        """
+        with open(str(path) + ".tmp", "w") as prometheus_file:
+            prometheus_file.write(self.prometheus_text())
+        os.replace(str(path) + ".tmp", path)
+
+    def export_prometheus(self, path, interval=15.0):
+        """
+        Writes the metrics to a Prometheus text file every interval seconds, from a background thread.
+
+        :param path: Path of the text file.
+        :type path: path-like object
+        :param interval: Delay between two writes, in seconds.
+        :type interval: float
+        :return: Event stopping the export when set. The file is written a last time then.
+        :rtype: threading.Event
+        """
+        stop = threading.Event()
+
+        def export():
+            while not stop.wait(interval):
+                self.write_prometheus(path)
+            self.write_prometheus(path)
+
+        threading.Thread(target=export, daemon=True).start()
+        return stop
+
+
+# Metrics updated by all the modules of the package.
+metrics = Metrics()
+
+
+def record_file(path, rows, initial_size=0):
+    """
+    Adds the rows and the size of a file written by a conversion to the rows_written_total and bytes_written_total
+    counters, labelled with the name of the file.
+
+    :param path: Path of the written file.
+    :type path: path-like object
+    :param rows: Number of rows written.
+    :type rows: int
+    :param initial_size: Size of the file before the conversion, if it appended rows to an existing file.
+    :type initial_size: int
+    """
+    labels = {"output": os.path.basename(path)}
+    metrics.increment("rows_written_total", rows, labels)
+    metrics.increment("bytes_written_total", os.path.getsize(path) - initial_size, labels)
+
+
+_profiling = {"folder": None, "cpu": False, "memory": False, "active": False}
+
+
+def enable_profiling(folder, cpu=True, memory=False):
+    """
+    Profiles the next stages (crawls and conversions). For each stage :
+        - cpu : the cProfile statistics are written to folder/<stage>.prof, readable with the pstats module or
+          snakeviz,
+        - memory : memory allocations are traced with tracemalloc, the top allocations are written to
+          folder/<stage>.tracemalloc.txt and the peak traced memory is set as the stage_peak_traced_memory_bytes gauge.
+
+    Profiling slows the stages down, and is disabled by default. It can also be enabled by setting the
+    GRAPHGITHUB_PROFILE environment variable to cpu, memory or cpu,memory, with statistics written to the folder of
+    the GRAPHGITHUB_PROFILE_FOLDER variable (the working directory by default).
+
+    :param folder: Folder in which statistics are written.
+    :type folder: path-like object
+    :param cpu: Profiles the execution time of the functions.
+    :type cpu: bool
+    :param memory: Traces memory allocations.
+    :type memory: bool
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    _profiling.update(folder=folder, cpu=cpu, memory=memory)
+
+
+def disable_profiling():
+    _profiling.update(folder=None, cpu=False, memory=False)
+
+
+if "GRAPHGITHUB_PROFILE" in os.environ:
+    _profiled = os.environ["GRAPHGITHUB_PROFILE"].split(",")
+    enable_profiling(os.environ.get("GRAPHGITHUB_PROFILE_FOLDER", "."), "cpu" in _profiled, "memory" in _profiled)
+
+
+def stage(name):
+    """
+    Decorator of the functions running a stage of a crawl or a conversion : their duration is observed in the
+    stage_duration_seconds histogram, and they are profiled if profiling is enabled (see enable_profiling()).
+
+    :param name: Name of the stage.
+    :type name: String
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Stages called by another stage are profiled with it.
+            profiler = cProfile.Profile() if _profiling["cpu"] and not _profiling["active"] else None
+            trace_memory = _profiling["memory"] and not tracemalloc.is_tracing()
+            if trace_memory:
+                tracemalloc.start()
+            if profiler is not None:
+                _profiling["active"] = True
+                profiler.enable()
+            start = time.monotonic()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe("stage_duration_seconds", time.monotonic() - start, {"stage": name})
+                if profiler is not None:
+                    profiler.disable()
+                    _profiling["active"] = False
+                    profiler.dump_stats(os.path.join(_profiling["folder"], name + ".prof"))
+                if trace_memory:
+                    _write_memory_statistics(name)
+                    tracemalloc.stop()
+
+        return wrapper
+
+    return decorator
+
+
+def _write_memory_statistics(name):
+    _, peak = tracemalloc.get_traced_memory()
+    metrics.set_gauge("stage_peak_traced_memory_bytes", peak, {"stage": name})
+    with open(os.path.join(_profiling["folder"], name + ".tracemalloc.txt"), "w") as statistics_file:
+        statistics_file.write("Peak traced memory : " + str(peak) + " bytes\n")
+        for statistic in tracemalloc.take_snapshot().statistics("lineno")[:50]:
+            statistics_file.write(str(statistic) + "\n")
+    logger.info("Memory statistics of %s written to %s.", name, _profiling["folder"])
+
+
+def _labels_key(labels):
+    return () if labels is None else tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(name + "=\"" + str(value).replace("\\", "\\\\").replace("\"", "\\\"") + "\""
+                          for name, value in labels) + "}"
@@ -0,0 +1,92 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+# Maximum size of a chunk, that each worker loads in memory at once.
+_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def line_aligned_chunks(path, chunks_count, skip_header=False):
+    """
+    Splits a text file in at most chunks_count byte ranges of similar sizes, aligned to line boundaries.
+
+    :param path: Path of the file to split.
+    :type path: path-like object
+    :param chunks_count: Number of chunks wanted.
+    :type chunks_count: int
+    :param skip_header: Excludes the first line of the file from the chunks.
+    :type skip_header: bool
+    :return: List of (start, end) byte offsets.
+    :rtype: list of tuple
+    """
+    with open(path, "rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        if skip_header:
+            file.readline()
+        bounds = [file.tell()]
+        for i in range(1, chunks_count):
+            position = bounds[0] + (size - bounds[0]) * i // chunks_count
+            if position <= bounds[-1]:
+                continue
+            # Moves to the beginning of the next line.
+            file.seek(position - 1)
+            file.readline()
+            if bounds[-1] < file.tell() < size:
+                bounds.append(file.tell())
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def read_lines(path, start, end):
+    """
+    Returns the lines of the [start, end[ byte range of a text file.
+
+    :rtype: list of String
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        return file.read(end - start).decode("utf-8").splitlines()
+
+
+def map_chunks(function, path, workers, skip_header=False, args=(), initializer=None, initargs=()):
+    """
+    Applies function to line aligned chunks of a file, in a pool of workers processes.
+
+    function is called as function(path, start, end, chunk_index, *args) and must be defined at the top level of a
+    module, so that it can be sent to the workers. Results are returned in the order of the chunks in the file.
+
+    :param function: Function applied to each chunk.
+    :param path: Path of the processed file.
+    :type path: path-like object
+    :param workers: Number of worker processes.
+    :type workers: int
+    :param skip_header: Excludes the first line of the file from the chunks.
+    :type skip_header: bool
+    :param args: Other arguments passed to function.
+    :type args: tuple
+    :param initializer: Called at the start of each worker process, to share large read-only data.
+    :param initargs: Arguments of the initializer.
+    :return: List of the results of each chunk.
+    :rtype: list
+    """
+    # Several chunks by worker balances their loads.
+    chunks_count = max(4 * workers, -(-os.path.getsize(path) // _MAX_CHUNK_SIZE))
+    chunks = line_aligned_chunks(path, chunks_count, skip_header)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        futures = [executor.submit(function, path, start, end, i, *args) for i, (start, end) in enumerate(chunks)]
+        return [future.result() for future in futures]
+
+
+def concatenate_parts(parts, destination):
+    """
+    Appends the content of each part file to the destination file object, and removes the parts.
+
+    :param parts: Paths of the part files, in order.
+    :type parts: list of path-like object
+    :param destination: File object opened in binary mode.
+    """
+    for part in parts:
+        with open(part, "rb") as part_file:
+            shutil.copyfileobj(part_file, destination)
+        os.remove(part)
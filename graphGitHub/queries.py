@@ -0,0 +1,169 @@
+import functools
+import hashlib
+import re
+
+# Punctuators of the GraphQL syntax, around which whitespaces are not significant.
+_PUNCTUATORS = re.compile(r"\s*([{}()\[\]:,!=$@|])\s*")
+_WHITESPACES = re.compile(r"\s+")
+
+
+def minify(document):
+    """
+    Removes the insignificant whitespaces of a GraphQL document, that must not contain string literals : values should
+    be passed as variables.
+
+    :param document: GraphQL document.
+    :type document: String
+    :rtype: String
+    """
+    return _PUNCTUATORS.sub(r"\1", _WHITESPACES.sub(" ", document)).strip()
+
+
+class Query:
+    """
+    Precompiled GraphQL query : its document is minified and hashed once, and each request only serializes its
+    variables, in a body sent with the json= argument of GitHubClient.post().
+
+    The body can also reference the query as a persisted query (the persistedQuery extension of Apollo), sending only
+    the sha256 hash of the document, for servers that support them. See post_query().
+
+    :param document: GraphQL document of the query.
+    :type document: String
+    """
+
+    def __init__(self, document):
+        self.document = minify(document)
+        self.sha256 = hashlib.sha256(self.document.encode("utf-8")).hexdigest()
+
+    def body(self, variables=None, persisted=False):
+        """
+        Returns the body of a request of this query.
+
+        :param variables: Values of the variables of the query.
+        :type variables: dict
+        :param persisted: Sends the hash of the document instead of the document.
+        :type persisted: bool
+        :rtype: dict
+        """
+        body = {"variables": variables or {}}
+        if persisted:
+            body["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": self.sha256}}
+        else:
+            body["query"] = self.document
+        return body
+
+
+def post_query(client, url, query, variables=None, cost=1, persisted=False):
+    """
+    Posts a query with the client. A persisted query is first sent as its hash only : if the server answers with any
+    error, such as PersistedQueryNotFound, it is sent again with its document, what registers it on servers that
+    support them. The GitHub API doesn't support persisted queries : once a server answered a hash with GraphQL errors
+    other than PersistedQueryNotFound, and the document with data, url is added to the unpersisted_urls of the client,
+    and the next queries of the client to url are sent with their document only. Failures of the hash request, such
+    as a 502 or a rate limit error, don't mark url.
+
+    :param client: Client used to send the request.
+    :type client: GitHubClient
+    :param url: GraphQL entry point.
+    :param query: Sent query.
+    :type query: Query
+    :param variables: Values of the variables of the query.
+    :type variables: dict
+    :param cost: Expected cost of the query.
+    :type cost: int
+    :param persisted: Only sends the hash of the document at first.
+    :type persisted: bool
+    :return: The response of the server.
+    :rtype: requests.Response
+    """
+    if persisted and url not in client.unpersisted_urls:
+        response = client.post(url, cost=cost, json=query.body(variables, persisted=True))
+        errors = response.json().get("errors") if response.status_code == 200 else None
+        if response.status_code == 200 and response.json().get("data") is not None:
+            return response
+        unsupported = bool(errors) and all(error.get("message") != "PersistedQueryNotFound" for error in errors)
+        body = query.body(variables)
+        body["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": query.sha256}}
+        response = client.post(url, cost=cost, json=body)
+        if unsupported and response.status_code == 200 and response.json().get("data") is not None:
+            client.unpersisted_urls.add(url)
+        return response
+    return client.post(url, cost=cost, json=query.body(variables))
+
+
+# Fields fetched for each repository.
+_REPOSITORY_FIELDS = """
+    stargazers {
+        totalCount
+    }
+    primaryLanguage {
+        name
+    }
+    id
+    name
+"""
+
+SEARCH_USERS = Query("""
+query searchUsers($query: String!, $first: Int!, $after: String, $repositories: Int!) {
+    rateLimit {
+        cost
+        remaining
+        resetAt
+    }
+    search(query: $query, type: USER, first: $first, after: $after) {
+        userCount
+        pageInfo {
+            endCursor
+            hasNextPage
+        }
+        edges {
+            node {
+                ... on User {
+                    id
+                    name
+                    repositoriesContributedTo(includeUserRepositories: true, first: $repositories,
+                                              orderBy: {direction: DESC, field: STARGAZERS}) {
+                        totalCount
+                        pageInfo {
+                            endCursor
+                            hasNextPage
+                        }
+                        nodes {""" + _REPOSITORY_FIELDS + """}
+                    }
+                }
+            }
+            cursor
+        }
+    }
+}
+""")
+
+
+@functools.lru_cache(maxsize=None)
+def user_repositories(users_count):
+    """
+    Returns the query fetching a page of the repositories of users_count users, each one looked up with node(id:) under
+    a userN alias, N in [0, users_count[. Its variables are repositories, the size of the pages, and userN and afterN,
+    the id of each user and the cursor of its page.
+
+    :param users_count: Number of users by query.
+    :type users_count: int
+    :rtype: Query
+    """
+    parameters = "".join(", $user{0}: ID!, $after{0}: String".format(i) for i in range(users_count))
+    lookups = "".join("""
+    user{0}: node(id: $user{0}) {{
+        ... on User {{
+            repositoriesContributedTo(includeUserRepositories: true, first: $repositories, after: $after{0},
+                                      orderBy: {{direction: DESC, field: STARGAZERS}}) {{
+                totalCount
+                pageInfo {{
+                    endCursor
+                    hasNextPage
+                }}
+                nodes {{{1}}}
+            }}
+        }}
+    }}""".format(i, _REPOSITORY_FIELDS) for i in range(users_count))
+    return Query("query userRepositories($repositories: Int!" + parameters + ") {"
+                 "rateLimit { cost remaining resetAt }" + lookups + "}")
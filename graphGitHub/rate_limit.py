@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from graphGitHub.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket holding the remaining GitHub API budget, shared by all the requests (and threads) of a crawl.
+
+    The bucket is never polled : it is refilled from what GitHub returns with each response, either the
+    X-RateLimit-Remaining / X-RateLimit-Reset headers of the REST API or the rateLimit{remaining resetAt} fields of a
+    GraphQL query. When the bucket is empty, acquire() sleeps exactly until the reset time of the current window.
+
+    :param reserve: Number of requests (or GraphQL points) that are never consumed, kept for other usages of your token.
+    :type reserve: int
+    """
+
+    def __init__(self, reserve=100):
+        self.reserve = reserve
+        self.remaining = None
+        self.reset = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, cost=1):
+        """
+        Blocks until cost tokens are available, and consumes them.
+
+        :param cost: Expected cost of the request, 1 for a REST call, the query cost for GraphQL.
+        :type cost: int
+        """
+        with self._condition:
+            while self.remaining is not None and self.remaining - cost < self.reserve:
+                wait = self.reset - time.time()
+                if wait <= 0:
+                    # A new window has begun : the next response will tell us the actual budget.
+                    self.remaining = None
+                    break
+                logger.info("Remaining : %d. Waiting %ds until reset...", self.remaining, int(wait) + 1)
+                metrics.increment("github_rate_limit_waits_total")
+                self._condition.wait(wait + 1)
+            if self.remaining is not None:
+                self.remaining -= cost
+
+    def release(self, cost=1):
+        """
+        Gives back tokens consumed by acquire() for a request that was finally not charged, such as a conditional
+        request answered with 304 Not Modified.
+
+        :param cost: Number of tokens to give back.
+        :type cost: int
+        """
+        with self._condition:
+            if self.remaining is not None:
+                self.remaining += cost
+                self._condition.notify_all()
+
+    def update(self, remaining, reset):
+        """
+        Updates the bucket with the budget returned by GitHub.
+
+        :param remaining: Remaining requests (or points) in the current window.
+        :type remaining: int
+        :param reset: Reset time of the current window, as a UTC epoch timestamp in seconds.
+        :type reset: float
+        """
+        with self._condition:
+            # Responses of concurrent requests may come back out of order : keep the lowest remaining of the current
+            # window, and start over when a new window begins.
+            if self.remaining is None or reset > self.reset:
+                self.remaining = remaining
+            else:
+                self.remaining = min(self.remaining, remaining)
+            self.reset = max(self.reset, reset)
+            metrics.set_gauge("github_rate_limit_remaining", self.remaining)
+            metrics.set_gauge("github_rate_limit_reset_timestamp_seconds", self.reset)
+            self._condition.notify_all()
+
+    def update_from_headers(self, headers):
+        """
+        Updates the bucket from the X-RateLimit-Remaining and X-RateLimit-Reset headers of a response, if present.
+
+        :param headers: Headers of a GitHub API response.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            self.update(int(remaining), int(reset))
+
+    def update_from_graphql(self, rate_limit):
+        """
+        Updates the bucket from the rateLimit{remaining resetAt} fields of a GraphQL response.
+
+        :param rate_limit: The rateLimit object of the response data.
+        :type rate_limit: dict
+        """
+        if rate_limit is None:
+            return
+        reset = datetime.strptime(rate_limit["resetAt"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        self.update(int(rate_limit["remaining"]), reset.timestamp())
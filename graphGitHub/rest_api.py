@@ -1,16 +1,39 @@
-import requests
-import time
+import array
 import os
 import csv
+import collections
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from graphGitHub.binary_graph import gephi2binary
+from graphGitHub.client import GitHubClient
+from graphGitHub.columnar import gephi2columnar
+from graphGitHub.crawl_state import CsvCrawlState
+from graphGitHub.files import format_csv, read_committed_size, read_last_line, read_first_column, \
+    truncate_partial_line
+from graphGitHub.gephi_delta import update_gephi
+from graphGitHub.metrics import metrics, record_file, stage
+from graphGitHub.parallel import map_chunks, read_lines, concatenate_parts
 
 entry_point = "https://api.github.com/"
 
+logger = logging.getLogger(__name__)
+
+# Number of processed repositories between two progress messages logged at the INFO level.
+_PROGRESS_INTERVAL = 100
 
+
+@stage("fetch_repositories")
 def fetch_repositories(github_user_name,
                        oauth_password,
                        begin_to_repo=0,
                        total_repositories=100,
-                       results_folder="results"):
+                       results_folder="results",
+                       state=None):
     """
     Fetch a total_repositories number of repositories, starting from begin_to_repo. Results are stored in a
     rest/repositories.csv file in the specified results_folder.
@@ -28,49 +51,38 @@ def fetch_repositories(github_user_name,
     :type total_repositories: int
     :param results_folder: Path of the folder in which you want to store results.
     :type results_folder: path-like object
+    :param state:   Crawl state in which results are stored, such as a SqliteCrawlState. By default, results are
+                    directly appended to the csv files of results_folder.
+    :type state: CsvCrawlState or SqliteCrawlState
     """
 
     last_id = begin_to_repo
     fetched_repositories = 0
 
-    if not os.path.isdir(os.path.join(results_folder, "rest")):
-        os.mkdir(os.path.join(results_folder, "rest"))
-    repositories_file = open(os.path.join(results_folder, "rest", "repositories.csv"), "a+")
-
-    while fetched_repositories < total_repositories:
-        rate_limit = requests.get(entry_point + "rate_limit",
-                             auth=(github_user_name, oauth_password))
-        if rate_limit.status_code == 200:
-            remaining = int(rate_limit.json()["rate"]["remaining"])
-            print("Remaining : " + str(remaining))
-        else:
-            print("Rate limit request failed. error : " + str(rate_limit.status_code))
-            if rate_limit.status_code == 401:
-                print("You should check yout GitHub oauth token.")
-                return
-            print("Let's assume remaining is ok.")
-            remaining = 5000
+    own_state = state is None
+    if own_state:
+        state = CsvCrawlState(results_folder)
 
-        if remaining > 100:
-            repos = requests.get(entry_point + "repositories",
-                                 {"since": str(last_id)},
-                                 auth=(github_user_name, oauth_password))
+    client = GitHubClient(github_user_name, oauth_password)
+    try:
+        while fetched_repositories < total_repositories:
+            repos = client.get(entry_point + "repositories", {"since": str(last_id)})
 
             if repos.status_code == 200:
                 repos_json = repos.json()
                 if len(repos_json) > 0:
-                    for repo in repos_json:
-                        repositories_file.write(str(repo["id"]) + "," + repo["full_name"] + "\n")
+                    state.add_repositories(repos_json)
                     last_id = repos_json[-1]["id"]
                     fetched_repositories += len(repos_json)
-                print(str(fetched_repositories) + " repositories fetched.")
+                logger.info("%d repositories fetched.", fetched_repositories)
             else:
-                print("Request failed. error : " + str(repos.status_code))
+                logger.warning("Request failed. error : %d", repos.status_code)
                 if repos.status_code == 401:
-                    print("You should check yout GitHub oauth token.")
-        else:
-            print("Waiting...")
-            time.sleep(60)
+                    logger.error("You should check your GitHub oauth token.")
+                    return
+    finally:
+        if own_state:
+            state.close()
 
 
 def get_last_fetched_repository(results_folder):
@@ -80,27 +92,25 @@ def get_last_fetched_repository(results_folder):
     """
 
     try:
-        with open(os.path.join(results_folder, "rest", "repositories.csv")) as page_file:
-            repositories = csv.DictReader(page_file, fieldnames=("id", "full_name"))
-
-            # Removes \n end character
-            try:
-                last_id = None
-                for rep in repositories:
-                    last_id = rep["id"]
-                return last_id
-            except IndexError:
-                return None
+        last_line = read_last_line(os.path.join(results_folder, "rest", "repositories.csv"))
+        if last_line is None:
+            return None
+        return last_line.split(",", 1)[0]
 
     except FileNotFoundError as e:
-        print("rest/repositories.csv doesn't seem to exist in the specified results_folder.")
+        logger.error("rest/repositories.csv doesn't seem to exist in the specified results_folder.")
         raise
 
 
+@stage("rest_fetch_data")
 def fetch_data(github_user_name,
                oauth_password,
                begin_to_repo=0,
-               results_folder="results"):
+               results_folder="results",
+               workers=1,
+               max_contributors_by_repository=None,
+               http_cache=None,
+               state=None):
     """
     Fetch all data from the begin_to_repo repository contained in the rest/repositories.csv in the specified
     results_folder, until the last repository of this file.
@@ -109,177 +119,564 @@ def fetch_data(github_user_name,
         - rest/contributions.csv
         - rest/users.csv
 
+    Contributors of up to workers repositories are fetched concurrently, sharing the same rate limit budget. Results
+    are still written in the repositories.csv order, so that get_last_repository_data_fetched() can be used to resume
+    an interrupted crawl. If a page of contributors fails after the first one, the crawl stops with a
+    requests.HTTPError before the repository is written, so that it is fetched again by the resumed crawl.
+
     :param github_user_name: Your GitHub login.
     :type github_user_name: String
     :param oauth_password: Your GitHub oauth token.
     :type oauth_password: String
     :param begin_to_repo:   Repository from which you want to start. (among those already fetched using
-                            fetch_repositories() )
+                            fetch_repositories() ) Since fetch_repositories() writes repositories by increasing id,
+                            the first repository to process is directly searched in rest/repositories.csv.
     :type begin_to_repo: id
     :param results_folder: Path of the folder in which you store your results.
     :type results_folder: path-like object
+    :param workers: Number of repositories fetched concurrently.
+    :type workers: int
+    :param max_contributors_by_repository: Maximum number of contributors fetched for each repository, or None to fetch
+                                           them all. Contributors are sorted by contributions, so the main ones are
+                                           always kept.
+    :type max_contributors_by_repository: int
+    :param http_cache:  Cache of the contributors responses, kept between crawls. When a crawl is performed again,
+                        unchanged pages are served from the cache and don't count against your rate limit.
+    :type http_cache: HttpCache
+    :param state:   Crawl state from which repositories are read and in which results are stored, such as a
+                    SqliteCrawlState. By default, the csv files of results_folder are used.
+    :type state: CsvCrawlState or SqliteCrawlState
     """
-    try:
-        csv_repositories = open(os.path.join(results_folder, "rest", "repositories.csv"), "r")
-    except FileNotFoundError:
-        print("rest/repositories.csv doesn't seem to exists in the specified results_folder."
-              "Maybe you forgot to call fetch_repositories before this function.")
-        return
+    if begin_to_repo is None:
+        begin_to_repo = 0
 
-    registered_users = read_users(results_folder)
-    contributions_files = open(os.path.join(results_folder, "rest", "contributions.csv"), "a+")
-    users_file = open(os.path.join(results_folder, "rest", "users.csv"), "a+")
+    own_state = state is None
+    if own_state:
+        if not os.path.isfile(os.path.join(results_folder, "rest", "repositories.csv")):
+            logger.error("rest/repositories.csv doesn't seem to exist in the specified results_folder. "
+                         "Maybe you forgot to call fetch_repositories before this function.")
+            return
+        state = CsvCrawlState(results_folder)
 
-    repositories = csv.DictReader(csv_repositories, fieldnames=("id", "full_name"), delimiter=",")
     i = 0
     contributions_count = 0
 
-    for repo in repositories:
-        i += 1
-        if int(repo["id"]) > int(begin_to_repo):
-            rate_limit = requests.get(entry_point + "rate_limit",
-                                      auth=(github_user_name, oauth_password))
-            remaining = int(rate_limit.json()["rate"]["remaining"])
-            print("Remaining : " + str(remaining))
-
-            while remaining < 100:
-                print("Waiting...")
-                time.sleep(60)
-
-                rate_limit = requests.get(entry_point + "rate_limit",
-                                          auth=(github_user_name, oauth_password))
-                remaining = int(rate_limit.json()["rate"]["remaining"])
-                print("Remaining : " + str(remaining))
-
-            print(entry_point + "repos/" + repo["full_name"] + "/contributors")
-            response = requests.get(entry_point + "repos/" + repo["full_name"] + "/contributors",
-                                    auth=(github_user_name, oauth_password))
-            if response.status_code == 200:
-                contributors = response.json()
-                print("Fetched " + str(len(contributors)) + " contributors.")
-                for contributor in contributors:
-                    user_id = str(contributor["id"])
-                    if user_id not in registered_users:
-                        print("Add new user : id = " + user_id + ", login = " + contributor["login"])
-                        users_file.write(user_id + ", " + contributor["login"] + "\n")
-                        registered_users.append(user_id)
-
-                    contributions_files.write(repo["id"] + "," + user_id + "," + str(contributor["contributions"]) + "\n")
-                    contributions_count += 1
+    client = GitHubClient(github_user_name, oauth_password, pool_size=workers, http_cache=http_cache)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Bounded window of pending requests, consumed in the repositories order.
+            pending = collections.deque()
+            # A final None entry drains the remaining requests.
+            for repo in itertools.chain(state.repositories(begin_to_repo), [None]):
+                if repo is not None:
+                    pending.append((repo, executor.submit(_fetch_contributors, client, repo["full_name"],
+                                                          max_contributors_by_repository)))
+                while len(pending) >= 2 * workers or (repo is None and len(pending) > 0):
+                    processed_repo, contributors = pending.popleft()
+                    contributors = contributors.result()
+                    logger.debug("Fetched %d contributors.", len(contributors))
+                    i += 1
+                    contributions_count += state.add_contributions(processed_repo["id"], contributors)
+                    _log_progress(i, contributions_count)
+    finally:
+        if own_state:
+            state.close()
+
+
+@stage("crawl")
+def crawl(github_user_name,
+          oauth_password,
+          begin_to_repo=None,
+          total_repositories=100,
+          results_folder="results",
+          workers=8,
+          max_contributors_by_repository=None,
+          http_cache=None,
+          state=None,
+          gephi_folder=None):
+    """
+    Fetches repositories and their contributors in a single pipeline, instead of calling fetch_repositories(),
+    fetch_data() and raw2gephi() one after the other :
+        - a producer thread fetches the pages of repositories, from the /repositories endpoint,
+        - workers threads fetch the contributors of those repositories,
+        - the calling thread writes the repositories and the contributions to the crawl state, in the repositories
+          order, and appends the nodes and edges of each repository to Gephi files if a gephi_folder is specified.
+
+    Stages run concurrently, and at most 2 * workers repositories are in progress at once : the producer waits for the
+    writer when the contributors workers fall behind.
+
+    The crawl can be resumed : by default, it starts from the last repository whose contributors have been written,
+    and repositories already stored are not added again. As in fetch_data(), it stops with a requests.HTTPError
+    before writing a repository whose contributors are incomplete.
 
+    Gephi ids are given in the order in which nodes are found. They are kept in gephi_folder/id_map.csv, so that nodes
+    keep the same ids when the crawl is resumed, but differ from the ones of raw2gephi(), that can still be used to
+    rebuild the Gephi files from the crawl results.
+
+    :param github_user_name: Your GitHub login.
+    :type github_user_name: String
+    :param oauth_password: Your GitHub oauth token.
+    :type oauth_password: String
+    :param begin_to_repo: Repository from which you want to start. If None, starts after the last repository whose
+                          contributors have been fetched.
+    :type begin_to_repo: id
+    :param total_repositories: Number of repositories that you want to add.
+    :type total_repositories: int
+    :param results_folder: Path of the folder in which you want to store results.
+    :type results_folder: path-like object
+    :param workers: Number of repositories whose contributors are fetched concurrently.
+    :type workers: int
+    :param max_contributors_by_repository: Maximum number of contributors fetched for each repository. See fetch_data().
+    :type max_contributors_by_repository: int
+    :param http_cache: Cache of the responses, kept between crawls. See fetch_data().
+    :type http_cache: HttpCache
+    :param state: Crawl state in which results are stored. By default, the csv files of results_folder are used.
+    :type state: CsvCrawlState or SqliteCrawlState
+    :param gephi_folder: Folder in which nodes.csv and edges.csv are written as the crawl goes, or None.
+    :type gephi_folder: path-like object
+    """
+    own_state = state is None
+    if own_state:
+        state = CsvCrawlState(results_folder)
+    if begin_to_repo is None:
+        begin_to_repo = state.last_repository_data_fetched() or 0
+    last_stored_repository = int(state.last_repository() or 0)
+    gephi_writer = None if gephi_folder is None else _GephiWriter(gephi_folder)
+
+    client = GitHubClient(github_user_name, oauth_password, pool_size=workers + 1, http_cache=http_cache)
+    # Repositories in progress, from their fetch to the writing of their contributors.
+    window = threading.Semaphore(2 * workers)
+    repository_queue = queue.Queue()
+    results = queue.Queue()
+    stop = threading.Event()
+    threads = [threading.Thread(target=_produce_repositories,
+                                args=(client, begin_to_repo, total_repositories, window, repository_queue, results,
+                                      stop, workers),
+                                daemon=True)]
+    threads += [threading.Thread(target=_consume_repositories,
+                                 args=(client, max_contributors_by_repository, repository_queue, results),
+                                 daemon=True)
+                for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    processed_repositories = 0
+    contributions_count = 0
+    # Contributors fetched out of order, waiting for the previous repositories.
+    fetched = {}
+    running_threads = len(threads)
+    try:
+        while running_threads > 0:
+            message = results.get()
+            if message[0] == "done":
+                running_threads -= 1
+            elif message[0] == "error":
+                raise message[1]
+            elif message[0] == "repositories":
+                state.add_repositories([repo for repo in message[1] if repo["id"] > last_stored_repository])
             else:
-                print("Request failed. error : " + str(response.status_code))
+                _, sequence, repo, contributors = message
+                fetched[sequence] = (repo, contributors)
+                while processed_repositories in fetched:
+                    repo, contributors = fetched.pop(processed_repositories)
+                    if gephi_writer is not None:
+                        gephi_writer.add_repository(repo, contributors)
+                    contributions_count += state.add_contributions(repo["id"], contributors)
+                    processed_repositories += 1
+                    window.release()
+                    _log_progress(processed_repositories, contributions_count)
+    finally:
+        stop.set()
+        if gephi_writer is not None:
+            gephi_writer.close()
+        if own_state:
+            state.close()
+    logger.info("All done!")
+
+
+def _log_progress(processed_repositories, contributions_count):
+    # Per repository progress, logged at the INFO level every _PROGRESS_INTERVAL repositories.
+    logger.log(logging.INFO if processed_repositories % _PROGRESS_INTERVAL == 0 else logging.DEBUG,
+               "%d processed repositories. (%d contributions)", processed_repositories, contributions_count)
+
+
+def _produce_repositories(client, since, total_repositories, window, repository_queue, results, stop, workers):
+    # Fetches pages of repositories, sending each page to the writer and each repository to the workers.
+    try:
+        fetched_repositories = 0
+        while fetched_repositories < total_repositories and not stop.is_set():
+            response = client.get(entry_point + "repositories", {"since": str(since)})
+            if response.status_code != 200:
+                logger.warning("Request failed. error : %d", response.status_code)
                 if response.status_code == 401:
-                    print("You should check your GitHub oauth token.")
+                    logger.error("You should check your GitHub oauth token.")
+                    return
+                continue
+            page = response.json()
+            if len(page) == 0:
+                return
+            results.put(("repositories", page))
+            for repo in page:
+                while not window.acquire(timeout=1):
+                    if stop.is_set():
+                        return
+                repository_queue.put((fetched_repositories, repo))
+                fetched_repositories += 1
+            since = page[-1]["id"]
+            logger.info("%d repositories fetched.", fetched_repositories)
+    except Exception as e:
+        results.put(("error", e))
+    finally:
+        for _ in range(workers):
+            repository_queue.put(None)
+        results.put(("done",))
+
+
+def _consume_repositories(client, max_contributors, repository_queue, results):
+    # Fetches the contributors of the queued repositories, until the None end marker.
+    try:
+        while True:
+            item = repository_queue.get()
+            if item is None:
+                return
+            sequence, repo = item
+            results.put(("contributors", sequence, repo, _fetch_contributors(client, repo["full_name"],
+                                                                              max_contributors)))
+    except Exception as e:
+        results.put(("error", e))
+    finally:
+        results.put(("done",))
+
+
+class _GephiWriter:
+    # Appends the nodes and edges of each crawled repository to Gephi files. Gephi ids are given in the order in which
+    # nodes are found, and kept in id_map.csv as "gephi_id,type,original_id" rows.
+
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self._folder = folder
+        self._ids = {}
+        self._files = {}
+        for name in ("nodes.csv", "edges.csv", "id_map.csv"):
+            if os.path.isfile(os.path.join(folder, name)):
+                truncate_partial_line(os.path.join(folder, name))
+        if os.path.isfile(os.path.join(folder, "id_map.csv")):
+            with open(os.path.join(folder, "id_map.csv"), "r") as id_map:
+                for gephi_id, node_type, original_id in csv.reader(id_map, delimiter=","):
+                    self._ids[(node_type, original_id)] = int(gephi_id)
+            self._rollback()
+        for name, header in (("nodes.csv", "id,label,type\n"),
+                             ("edges.csv", "Source,Target,Weight\n"),
+                             ("id_map.csv", "")):
+            self._files[name] = open(os.path.join(folder, name), "a")
+            if self._files[name].tell() == 0:
+                self._files[name].write(header)
+
+    def _rollback(self):
+        # The rows of a repository are written to nodes.csv, edges.csv and finally id_map.csv : nodes missing from
+        # id_map.csv belong to a repository interrupted before its mapping was complete. Its rows are removed from the
+        # 3 files, so that it is written again with the same ids.
+        nodes_path = os.path.join(self._folder, "nodes.csv")
+        last_line = read_last_line(nodes_path) if os.path.isfile(nodes_path) else None
+        if last_line is None or last_line == "id,label,type" or int(last_line.split(",", 1)[0]) < len(self._ids):
+            return
+        # New ids are given to the repository first, then to its new contributors.
+        with open(nodes_path, "r") as nodes:
+            repository_id = max(int(line.split(",", 1)[0]) for line in nodes
+                                if line.rstrip("\n").rsplit(",", 1)[-1] == "repository")
+        logger.warning("Removing the rows of the repository of Gephi id %d, interrupted while being written.",
+                       repository_id)
+        _truncate_from(nodes_path, 1, lambda row: int(row[0]) >= repository_id)
+        _truncate_from(os.path.join(self._folder, "edges.csv"), 1, lambda row: int(row[1]) >= repository_id)
+        _truncate_from(os.path.join(self._folder, "id_map.csv"), 0, lambda row: int(row[0]) >= repository_id)
+        self._ids = {key: gephi_id for key, gephi_id in self._ids.items() if gephi_id < repository_id}
+
+    def _new_id(self, node_type, original_id, label, nodes, mappings):
+        gephi_id = len(self._ids)
+        self._ids[(node_type, original_id)] = gephi_id
+        nodes.append((gephi_id, label, node_type))
+        mappings.append((gephi_id, node_type, original_id))
+        return gephi_id
+
+    def add_repository(self, repo, contributors):
+        if ("repository", str(repo["id"])) in self._ids:
+            # Already written by a previous crawl.
+            return
+        nodes = []
+        edges = []
+        mappings = []
+        repository_id = self._new_id("repository", str(repo["id"]), repo["full_name"], nodes, mappings)
+        for contributor in contributors:
+            user_id = self._ids.get(("user", str(contributor["id"])))
+            if user_id is None:
+                user_id = self._new_id("user", str(contributor["id"]), contributor["login"], nodes, mappings)
+            edges.append((user_id, repository_id, contributor["contributions"]))
+        # The mapping is written last : the rows of a repository interrupted before are removed, and written again by
+        # the next crawl.
+        for name, rows in (("nodes.csv", nodes), ("edges.csv", edges), ("id_map.csv", mappings)):
+            # Labels are quoted if needed.
+            data = format_csv(rows)
+            self._files[name].write(data)
+            self._files[name].flush()
+            metrics.increment("rows_written_total", len(rows), {"output": name})
+            metrics.increment("bytes_written_total", len(data), {"output": name})
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+
+def _truncate_from(path, header_lines, predicate):
+    # Truncates a csv file before its first row, after the header_lines first lines, for which predicate(row) is true.
+    with open(path, "rb+") as file:
+        for _ in range(header_lines):
+            file.readline()
+        position = file.tell()
+        for line in iter(file.readline, b""):
+            if predicate(line.decode("utf-8").split(",")):
+                file.truncate(position)
+                return
+            position += len(line)
 
-            print(str(i) + " processed repositories. (" + str(contributions_count) + " contributions)")
+
+def contributors_pages(client, full_name, max_contributors=None, per_page=100):
+    """
+    Lazily yields the pages of contributors of the full_name repository, following the Link: rel="next" header of each
+    response. Iteration stops if the first request fails, such as for a deleted or blocked repository. A failure on a
+    later page raises a requests.HTTPError instead, since the contributors already yielded are incomplete.
+
+    :param client: Client used to perform the requests.
+    :type client: GitHubClient
+    :param full_name: Full name of the repository, as owner/name.
+    :type full_name: String
+    :param max_contributors: Maximum number of contributors yielded, or None to yield them all.
+    :type max_contributors: int
+    :param per_page: Number of contributors by page (100 max).
+    :type per_page: int
+    :return: Generator of lists of contributors, as returned by the API.
+    """
+    url = entry_point + "repos/" + full_name + "/contributors"
+    if max_contributors is not None:
+        per_page = min(per_page, max_contributors)
+    params = {"per_page": per_page}
+    fetched_contributors = 0
+    while url is not None:
+        response = client.get(url, params)
+        if response.status_code == 204:
+            # Empty repository
+            return
+        if response.status_code != 200:
+            logger.warning("Request to %s failed. error : %d", url, response.status_code)
+            if response.status_code == 401:
+                logger.error("You should check your GitHub oauth token.")
+            if fetched_contributors > 0:
+                raise requests.HTTPError("Contributors of " + full_name + " are incomplete : request to " + url
+                                         + " failed with " + str(response.status_code) + ".", response=response)
+            return
+
+        page = response.json()
+        if max_contributors is not None and fetched_contributors + len(page) >= max_contributors:
+            yield page[:max_contributors - fetched_contributors]
+            return
+        fetched_contributors += len(page)
+        yield page
+
+        # The next url already contains the query parameters.
+        url = response.links.get("next", {}).get("url")
+        params = None
+
+
+def _fetch_contributors(client, full_name, max_contributors):
+    # Fetches the contributors of the full_name repository.
+    contributors = []
+    for page in contributors_pages(client, full_name, max_contributors):
+        contributors.extend(page)
+    return contributors
 
 
 def get_last_repository_data_fetched(results_folder):
     """
     Returns the last repository from which data as already been fetched, based on the content of the
-    rest/contributions.csv contained in the specified results_folder.
+    rest/contributions.csv contained in the specified results_folder. The contributions of a repository interrupted in
+    the middle are ignored : they are removed when the crawl is resumed, and the repository is fetched again.
     :param results_folder: Folder where you store your results.
     :type results_folder: path-like object
     """
 
     try:
-        with open(os.path.join(results_folder, "rest", "contributions.csv")) as page_file:
-            repositories = csv.DictReader(page_file, fieldnames=("id_folder", "id_user", "contributions"))
-            # Removes \n end character
-            last_id = None
-            for rep in repositories:
-                last_id = rep["id_folder"]
-            return last_id
+        contributions_path = os.path.join(results_folder, "rest", "contributions.csv")
+        last_line = read_last_line(contributions_path, read_committed_size(contributions_path))
+        if last_line is None:
+            return None
+        return last_line.split(",", 1)[0]
     except FileNotFoundError as e:
-        print(e)
-        print("rest/contributions.csv doesn't seem to exist in the specified results_folder.")
+        logger.error("%s", e)
+        logger.error("rest/contributions.csv doesn't seem to exist in the specified results_folder.")
 
 
 def read_users(results_folder):
     """
-    Returns the list of ids of the currently fetched users, reading the rest/users.csv file contained in the specified
+    Returns the set of ids of the currently fetched users, reading the rest/users.csv file contained in the specified
     results_folder.
 
     :param results_folder: Folder where you store your results.
     :type results_folder: path-like object
-    :return: list of user ids
-    :rtype: list of int
+    :return: set of user ids
+    :rtype: set of String
     """
 
-    user_ids = []
     try:
-        with open(os.path.join(results_folder, "rest", "users.csv"), "r") as users_file:
-            users_csv = csv.DictReader(users_file, fieldnames=("id", "login"), delimiter=",")
-            for user in users_csv:
-                user_ids.append(user["id"])
-        return user_ids
+        return read_first_column(os.path.join(results_folder, "rest", "users.csv"))
 
     except FileNotFoundError:
-        return []
+        return set()
 
 
-def raw2gephi(user_file, repositories_file, contributions_file, destination_folder):
+@stage("raw2gephi")
+def raw2gephi(user_file, repositories_file, contributions_file, destination_folder, chunk_size=1000000, workers=1,
+              binary=False, incremental=False, columnar=None):
     """
     Convert fetched data into Gephi compatible files.
     Basically, from user_file, repositories_file and contributions_file, you will obtain two csv files, nodes.csv and
     edges.csv that contains all the currently fetched data and that you can import directly in Gephi.
 
+    Nodes are written while users and repositories are read, and contributions are streamed to edges.csv by chunks, so
+    that only the id mapping tables are kept in memory.
+
     :param user_file: Path of the users.csv file.
     :param repositories_file: Path of the repositories.csv file.
     :param contributions_file: Path of the contributions.csv file.
     :param destination_folder: Path of the folder in which you want to store results.
+    :param chunk_size: Number of contributions converted at once.
+    :param workers: Number of processes converting chunks of contributions_file in parallel. The converted chunks are
+                    concatenated in order, so edges.csv is the same as with a single worker.
+    :param binary: Also writes the graph in the binary format of binary_graph.py, in the graph folder of
+                   destination_folder, that clean_data functions memory map instead of parsing csv files.
+    :param incremental: Only converts the users, repositories and contributions appended since the last incremental
+                        conversion, keeping the ids of the existing nodes. See gephi_delta.update_gephi(). workers is
+                        then ignored, and the binary graph is still written from the whole Gephi files.
+    :param columnar: "parquet" or "arrow" to also write the graph as nodes and edges Parquet or Arrow files in
+                     destination_folder, with typed columns that clean_data functions read without parsing. See
+                     columnar.gephi2columnar(). Requires pyarrow.
     """
 
-    new_user_ids = {}
-    new_users = []
-    with open(user_file, "r") as users_data:
-        print("Reading users...")
-        users = csv.DictReader(users_data, fieldnames=("id", "login"), delimiter=",")
-        # Generating new user ids
-        new_id = 0
-        for user in users:
-            new_users.append((new_id, user["login"]))
-            new_user_ids[user["id"]] = new_id
-            new_id += 1
-
-    new_repositories_ids = {}
-    new_repositories = []
-    with open(repositories_file, "r") as repositories_data:
-        print("Reading repositories...")
-        repositories = csv.DictReader(repositories_data, fieldnames=("id", "full_name"), delimiter=",")
-        # Generating new repositories ids
-        for repository in repositories:
-            new_repositories.append((new_id, repository["full_name"]))
-            new_repositories_ids[repository["id"]] = new_id
-            new_id += 1
-
-    new_contributions = []
-    with open(contributions_file, "r") as contributions_data:
-        contributions = csv.DictReader(contributions_data, fieldnames=("user_id", "repository_id", "contributions"), delimiter=",")
-        print("Processing contributions...")
-        # Generating new contributions
-        for contribution in contributions:
-            new_contributions.append((new_user_ids[contribution["repository_id"]],
-                                     new_repositories_ids[contribution["user_id"]],
-                                     contribution["contributions"]))
-
-    # Writting new Gephi compliant files in destination_folder
-    print(os.getcwd())
-    with open(os.path.join(destination_folder, "nodes.csv"), "w") as node_file:
-        print("Writting new nodes...")
-        node_file.write("id,label,type\n")
-        for user in new_users:
-            node_file.write(str(user[0]) + "," + user[1] + ",user\n")
-        for repository in new_repositories:
-            node_file.write(str(repository[0]) + "," + repository[1] + ",repository\n")
-
-    with open(os.path.join(destination_folder, "edges.csv"), "w") as edge_file:
-        print("Writting new edges...")
-        edge_file.write("Source,Target,Weight\n")
-        for contribution in new_contributions:
-            edge_file.write(str(contribution[0]) + "," + str(contribution[1]) + "," + str(contribution[2]) + "\n")
-
-    print("All done!")
-
+    nodes_path = os.path.join(destination_folder, "nodes.csv")
+    if incremental:
+        update_gephi(user_file, repositories_file, contributions_file, destination_folder, chunk_size)
+        if binary:
+            logger.info("Writing binary graph...")
+            gephi2binary(nodes_path, os.path.join(destination_folder, "edges.csv"),
+                         os.path.join(destination_folder, "graph"))
+        if columnar is not None:
+            logger.info("Writing columnar graph...")
+            gephi2columnar(nodes_path, os.path.join(destination_folder, "edges.csv"), destination_folder, columnar)
+        logger.info("All done!")
+        return
 
+    with open(nodes_path, "w", newline="") as node_file:
+        node_file.write("id,label,type\n")
+        with open(user_file, "r") as users_data:
+            logger.info("Writing users...")
+            # Generating new user ids
+            user_ids = _write_nodes(users_data, node_file, "user", 0)
+        with open(repositories_file, "r") as repositories_data:
+            logger.info("Writing repositories...")
+            # Generating new repositories ids
+            repository_ids = _write_nodes(repositories_data, node_file, "repository", len(user_ids))
+    record_file(nodes_path, len(user_ids) + len(repository_ids))
+
+    user_ids = _IdMap(user_ids, 0)
+    repository_ids = _IdMap(repository_ids, len(user_ids))
+
+    edges_path = os.path.join(destination_folder, "edges.csv")
+    logger.info("Writing new edges...")
+    edges_count = 0
+    if workers > 1:
+        parts = map_chunks(_convert_contributions_chunk, contributions_file, workers, args=(edges_path,),
+                           initializer=_set_id_maps, initargs=(user_ids, repository_ids))
+        with open(edges_path, "wb") as edge_file:
+            edge_file.write(b"Source,Target,Weight\n")
+            concatenate_parts([part for part, _ in parts], edge_file)
+        edges_count = sum(part_edges for _, part_edges in parts)
+    else:
+        with open(contributions_file, "r") as contributions_data:
+            with open(edges_path, "w") as edge_file:
+                edge_file.write("Source,Target,Weight\n")
+                while True:
+                    chunk = list(itertools.islice(contributions_data, chunk_size))
+                    if len(chunk) == 0:
+                        break
+                    _convert_contributions(chunk, user_ids, repository_ids, edge_file)
+                    edges_count += len(chunk)
+    record_file(edges_path, edges_count)
+
+    if binary:
+        logger.info("Writing binary graph...")
+        gephi2binary(nodes_path, edges_path, os.path.join(destination_folder, "graph"))
+    if columnar is not None:
+        logger.info("Writing columnar graph...")
+        gephi2columnar(nodes_path, edges_path, destination_folder, columnar)
+
+    logger.info("All done!")
+
+
+def _convert_contributions(lines, user_ids, repository_ids, edge_file):
+    # Contributions are written as repository_id,user_id,contributions
+    contributions = np.loadtxt(lines, delimiter=",", dtype=np.int64, ndmin=2)
+    edges = np.column_stack((user_ids[contributions[:, 1]],
+                             repository_ids[contributions[:, 0]],
+                             contributions[:, 2]))
+    np.savetxt(edge_file, edges, fmt="%d", delimiter=",")
+
+
+# Id maps of raw2gephi(), shared with its worker processes.
+_user_ids = None
+_repository_ids = None
+
+
+def _set_id_maps(user_ids, repository_ids):
+    global _user_ids, _repository_ids
+    _user_ids = user_ids
+    _repository_ids = repository_ids
+
+
+def _convert_contributions_chunk(contributions_file, start, end, chunk_index, edges_path):
+    # Converts a chunk of contributions to a part of the edges file, and returns the part path and its number of edges.
+    part = edges_path + ".part" + str(chunk_index)
+    with open(part, "w") as part_file:
+        lines = read_lines(contributions_file, start, end)
+        if len(lines) > 0:
+            _convert_contributions(lines, _user_ids, _repository_ids, part_file)
+    return part, len(lines)
+
+
+def _write_nodes(csv_data, node_file, node_type, first_id):
+    # Writes the nodes of csv_data with consecutive ids from first_id, and returns their original ids in order.
+    original_ids = array.array("q")
+    node_csv = csv.writer(node_file, lineterminator="\n")
+    for row in csv.reader(csv_data, delimiter=","):
+        node_csv.writerow((first_id + len(original_ids), row[1], node_type))
+        original_ids.append(int(row[0]))
+    return original_ids
+
+
+class _IdMap:
+    # Array backed mapping from original ids to consecutive new ids, that converts whole arrays of ids at once.
+
+    def __init__(self, original_ids, first_id):
+        original_ids = np.frombuffer(original_ids, dtype=np.int64)
+        self._order = np.argsort(original_ids, kind="stable")
+        self._sorted_ids = original_ids[self._order]
+        self._first_id = first_id
+
+    def __len__(self):
+        return len(self._sorted_ids)
+
+    def __getitem__(self, ids):
+        # As with a dict, the last occurrence of a duplicated id wins.
+        positions = np.searchsorted(self._sorted_ids, ids, side="right") - 1
+        unknown = positions < 0
+        unknown[~unknown] = self._sorted_ids[positions[~unknown]] != ids[~unknown]
+        if np.any(unknown):
+            raise KeyError(str(ids[np.argmax(unknown)]))
+        return self._order[positions] + self._first_id
@@ -9,5 +9,6 @@ setup(name='graphGitHub',
       packages=find_packages(exclude=['test']),
       package_data={'graphGitHub': ['graphql_query.txt']},
       long_description=open('README.md').read(),
-      install_requires=['requests', 'matplotlib']
+      install_requires=['requests', 'matplotlib', 'numpy'],
+      extras_require={'parquet': ['pyarrow']}
       )
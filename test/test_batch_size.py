@@ -0,0 +1,41 @@
+from graphGitHub.batch_size import BatchSizeController
+
+
+def test_growth_and_errors():
+    controller = BatchSizeController(users_by_query=20, repositories_by_users=20)
+    assert controller.sizes() == (20, 20)
+    controller.record(20, 20, 1, 0.5)
+    assert controller.sizes() == (25, 20)
+    controller.record(25, 20, None, 0.5, error=502)
+    assert controller.users_by_query == 12
+    controller.record(12, 20, 1, 20.0)
+    assert controller.users_by_query == 6
+
+
+def test_sizes_only_fill_charged_points():
+    controller = BatchSizeController(users_by_query=20, repositories_by_users=20)
+    # Nothing is known of the cost of larger queries : the size isn't rounded.
+    controller.record(20, 20, 1, 0.5)
+    controller.users_by_query = 20
+    assert controller.sizes() == (20, 20)
+
+    # A query of 40 users was charged 1 point, as a query of 20 users : they fit in the same point.
+    controller.record(40, 20, 1, 0.5)
+    controller.users_by_query = 20
+    assert controller.sizes() == (40, 20)
+    # A query of 60 users was charged 2 points : queries of up to 60 users cost at most 2 points.
+    controller.record(60, 20, 2, 0.5)
+    controller.users_by_query = 45
+    assert controller.sizes() == (60, 20)
+    # Nor are they charged less with more repositories by user.
+    controller.repositories_by_users = 30
+    assert controller.sizes() == (45, 30)
+
+
+def test_nodes_by_point():
+    controller = BatchSizeController()
+    controller.record(20, 20, 1, 0.5, [{"repositoriesContributedTo": {"totalCount": 3}}] * 20)
+    controller.record(20, 20, None, 0.5, error=502)
+    controller.record(20, 20, 3, 0.5, [{"repositoriesContributedTo": {"totalCount": 3}}] * 20)
+    assert controller.nodes_by_point() == 10
+    assert controller.repositories_by_users == 3
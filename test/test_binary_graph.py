@@ -0,0 +1,33 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from graphGitHub import binary_graph
+
+
+def test_binary2gephi_quoted_labels(tmp_path):
+    # Labels containing commas or quotes are quoted, and read back as written.
+    labels = ["alice", 'bob "the, builder"', "a/one, two"]
+    binary_graph.write_graph(str(tmp_path / "graph"), [0, 1], [2, 2], [2, 1], labels, np.array([0, 0, 1]))
+    binary_graph.binary2gephi(str(tmp_path / "graph"), str(tmp_path))
+    with open(str(tmp_path / "nodes.csv"), "r", newline="") as nodes_file:
+        assert list(csv.reader(nodes_file))[1:] == [["0", "alice", "user"], ["1", 'bob "the, builder"', "user"],
+                                                    ["2", "a/one, two", "repository"]]
+
+
+def test_interrupted_rewrite(tmp_path, monkeypatch):
+    folder = str(tmp_path / "graph")
+    binary_graph.write_graph(folder, [0], [1], [1], ["alice", "a/one"], np.array([0, 1]))
+    assert binary_graph.is_binary_graph(folder)
+
+    def interrupted_save(path, array):
+        raise KeyboardInterrupt()
+
+    # A graph interrupted while its arrays are written again is not complete any more.
+    monkeypatch.setattr(binary_graph.np, "save", interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        binary_graph.write_graph(folder, [0, 1], [2, 2], [1, 1], ["alice", "bob", "a/one"], np.array([0, 0, 1]))
+    assert not binary_graph.is_binary_graph(folder)
+    assert not os.path.isfile(os.path.join(folder, "meta.json"))
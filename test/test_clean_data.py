@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+from graphGitHub import clean_data
+from graphGitHub.clean_data import bipartite_core
+
+
+def naive_core(sources, targets, users_by_rep_treshold, rep_by_user_treshold):
+    # Removes the nodes under their threshold, one round at a time, recomputing all the degrees at each round.
+    alive_edges = np.ones(len(sources), dtype=bool)
+    while True:
+        degrees = {}
+        for source, target in zip(sources[alive_edges].tolist(), targets[alive_edges].tolist()):
+            degrees[source] = degrees.get(source, 0) + 1
+            degrees[target] = degrees.get(target, 0) + 1
+        users = set(sources[alive_edges].tolist())
+        frontier = {node for node, degree in degrees.items()
+                    if degree < (rep_by_user_treshold if node in users else users_by_rep_treshold)}
+        if len(frontier) == 0:
+            return alive_edges
+        alive_edges &= ~np.isin(sources, list(frontier)) & ~np.isin(targets, list(frontier))
+
+
+def test_bipartite_core_chain():
+    # User 0 contributes to repositories 3 and 4, users 1 and 2 to repository 3 only.
+    sources = np.array([0, 0, 1, 2])
+    targets = np.array([3, 4, 3, 3])
+    alive_edges, removed_by_round = bipartite_core(sources, targets, 2, 2)
+    # Users 1 and 2 and repository 4, then repository 3 and user 0, whose degrees fall to 1 and 0.
+    assert alive_edges.tolist() == [False, False, False, False]
+    assert removed_by_round == [3, 2]
+
+
+def test_bipartite_core_random_graphs():
+    rng = np.random.default_rng(0)
+    for _ in range(30):
+        users_count = int(rng.integers(1, 30))
+        repositories_count = int(rng.integers(1, 30))
+        edges = np.unique(np.column_stack((rng.integers(0, users_count, 150),
+                                           rng.integers(0, repositories_count, 150) + users_count)), axis=0)
+        edges = edges[rng.permutation(len(edges))]
+        for tresholds in ((1, 1), (2, 3), (4, 2), (5, 5)):
+            alive_edges, removed_by_round = bipartite_core(edges[:, 0], edges[:, 1], *tresholds)
+            expected_edges = naive_core(edges[:, 0], edges[:, 1], *tresholds)
+            assert alive_edges.tolist() == expected_edges.tolist()
+            assert sum(removed_by_round) == len(set(edges[~alive_edges].ravel()) - set(edges[alive_edges].ravel()))
+            # All the remaining nodes satisfy their threshold.
+            user_degrees = np.bincount(edges[alive_edges, 0])
+            repository_degrees = np.bincount(edges[alive_edges, 1])
+            assert np.all(user_degrees[user_degrees > 0] >= tresholds[1])
+            assert np.all(repository_degrees[repository_degrees > 0] >= tresholds[0])
+
+
+def test_bipartite_core_empty_graph():
+    alive_edges, removed_by_round = bipartite_core(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 2, 2)
+    assert len(alive_edges) == 0
+    assert removed_by_round == []
+
+
+def write_graph(folder, edges):
+    nodes_count = int(edges[:, :2].max()) + 1
+    with open(os.path.join(folder, "nodes.csv"), "w") as nodes_file:
+        nodes_file.write("id,label,type\n")
+        nodes_file.writelines("{0},node {0},{1}\n".format(node, "user" if node in edges[:, 0] else "repository")
+                              for node in range(nodes_count))
+    with open(os.path.join(folder, "edges.csv"), "w") as edges_file:
+        edges_file.write("Source,Target,Weight\n")
+        edges_file.writelines("{},{},{}\n".format(*edge) for edge in edges.tolist())
+
+
+def read_file(path):
+    with open(path, "r") as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("iterative", [False, True])
+def test_clean_by_chunks(tmp_path, monkeypatch, iterative):
+    # Reading the edges by chunks gives the same files as reading them at once.
+    rng = np.random.default_rng(0)
+    edges = np.unique(np.column_stack((rng.integers(0, 20, 300), rng.integers(20, 50, 300))), axis=0)
+    edges = np.column_stack((edges[rng.permutation(len(edges))], rng.integers(1, 10, len(edges))))
+    write_graph(str(tmp_path), edges)
+    results = {}
+    for chunk_edges in (7, len(edges) + 1):
+        monkeypatch.setattr(clean_data, "_CHUNK_EDGES", chunk_edges)
+        destination_folder = tmp_path / str(chunk_edges)
+        destination_folder.mkdir()
+        clean_data.clean(str(tmp_path / "nodes.csv"), str(tmp_path / "edges.csv"), str(destination_folder), 5, 5,
+                         iterative=iterative)
+        results[chunk_edges] = [read_file(str(destination_folder / name))
+                                for name in ("clean_nodes.csv", "clean_edges.csv")]
+    assert results[7] == results[len(edges) + 1]
+    assert results[7][1].count("\n") > 1
+
+
+def test_negative_node_ids(tmp_path):
+    write_graph(str(tmp_path), np.array([[0, 2, 1], [1, 2, 1]]))
+    with open(str(tmp_path / "edges.csv"), "a") as edges_file:
+        edges_file.write("-1,2,1\n")
+    with pytest.raises(ValueError):
+        clean_data.compute_distributions(str(tmp_path / "edges.csv"), plot=False)
+    with pytest.raises(ValueError):
+        clean_data.clean(str(tmp_path / "nodes.csv"), str(tmp_path / "edges.csv"), str(tmp_path), 1, 1)
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+import requests
+
+from graphGitHub import client as client_module
+from graphGitHub.client import GitHubClient
+from graphGitHub.http_cache import HttpCache
+
+
+def make_response(status_code, body=b"{}", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    # Answers the requests with the given responses, in order, raising the exceptions among them.
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(client_module.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def fake_client(responses, **kwargs):
+    client = GitHubClient("login", "token", **kwargs)
+    client.session = FakeSession(responses)
+    return client
+
+
+def test_retries(sleeps):
+    client = fake_client([make_response(502), requests.ConnectionError(), make_response(200)], backoff=2.0)
+    assert client.get("https://api.github.com/repositories").status_code == 200
+    assert len(client.session.requests) == 3
+    # Exponential backoff with full jitter.
+    assert 0 <= sleeps[0] <= 2.0 and 0 <= sleeps[1] <= 4.0
+
+
+def test_retry_headers(sleeps, monkeypatch):
+    monkeypatch.setattr(client_module.time, "time", lambda: 1000.0)
+    client = fake_client([make_response(403, headers={"Retry-After": "30"}),
+                          make_response(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1100"}),
+                          make_response(200)])
+    # Time doesn't pass during the sleeps : the rate limiter would wait for the reset again.
+    monkeypatch.setattr(client.rate_limiter, "acquire", lambda cost=1: None)
+    assert client.get("https://api.github.com/repositories").status_code == 200
+    assert sleeps == [30.0, 101.0]
+
+
+def test_no_retry(sleeps):
+    # Non transient errors are returned at once.
+    for status_code in (401, 404, 403):
+        client = fake_client([make_response(status_code)])
+        assert client.get("https://api.github.com/repositories").status_code == status_code
+    assert sleeps == []
+
+
+def test_max_retries(sleeps):
+    client = fake_client([make_response(502)] * 3, max_retries=2, max_backoff=1.5)
+    assert client.get("https://api.github.com/repositories").status_code == 502
+    assert len(sleeps) == 2 and all(delay <= 1.5 for delay in sleeps)
+
+    client = fake_client([requests.Timeout()] * 3, max_retries=2)
+    with pytest.raises(requests.Timeout):
+        client.get("https://api.github.com/repositories")
+
+
+def test_backoff_delay():
+    client = GitHubClient("login", "token", backoff=1.0, max_backoff=10.0)
+    for attempt in range(8):
+        assert 0 <= client.backoff_delay(attempt) <= min(10.0, 2 ** attempt)
+
+
+def test_cache_not_modified(tmp_path):
+    http_cache = HttpCache(str(tmp_path / "cache.db"))
+    url = "https://api.github.com/repos/a/one/contributors?per_page=100"
+    link = '<https://api.github.com/repos/a/one/contributors?per_page=100&page=2>; rel="next"'
+    client = fake_client([make_response(200, b'[{"id": 1}]', {"ETag": '"v1"', "Link": link}),
+                          make_response(304)], http_cache=http_cache)
+    client.rate_limiter.update(4000, time.time() + 3600)
+    assert client.get(url).json() == [{"id": 1}]
+    assert client.rate_limiter.remaining == 3999
+
+    # The page hasn't changed : it is served from the cache, with its links, and isn't charged.
+    response = client.get(url)
+    assert client.session.requests[1][2]["headers"]["If-None-Match"] == '"v1"'
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1}]
+    assert response.links["next"]["url"].endswith("page=2")
+    assert client.rate_limiter.remaining == 3999
+    http_cache.close()
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from graphGitHub import rest_api
+from graphGitHub.crawl_state import CsvCrawlState, SqliteCrawlState
+
+
+def contributor(user_id, login, contributions=1):
+    return {"id": user_id, "login": login, "contributions": contributions}
+
+
+def read(path):
+    with open(path, "r") as file:
+        return file.read()
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def open_state(request, tmp_path):
+    # Opens the state of a crawl in tmp_path, again after each close.
+    def open_state():
+        if request.param == "csv":
+            return CsvCrawlState(str(tmp_path))
+        return SqliteCrawlState(str(tmp_path / "crawl.db"), commit_interval=1)
+
+    return open_state
+
+
+def test_resume_points(open_state):
+    state = open_state()
+    assert state.last_repository() is None
+    assert state.last_repository_data_fetched() is None
+    state.add_repositories([{"id": 1, "full_name": "a/one"}, {"id": 2, "full_name": "b/two"},
+                            {"id": 3, "full_name": "c/three"}])
+    assert state.add_contributions("1", [contributor(10, "alice", 3), contributor(11, "bob")]) == 2
+    state.add_graphql_nodes([{"node": {"id": "u1"}, "cursor": "c1"}, {"node": {"id": "u2"}, "cursor": "c2"}])
+    state.set_graphql_slice_status("2008..2009", "split")
+    state.add_graphql_nodes([{"node": {"id": "u3"}, "cursor": "c3"}], "2008..2008")
+    state.close()
+
+    state = open_state()
+    assert str(state.last_repository()) == "3"
+    assert str(state.last_repository_data_fetched()) == "1"
+    assert state.last_page_cursor() == "c2"
+    assert state.graphql_slices() == {"2008..2009": "split", "2008..2008": "c3"}
+    assert [repo["full_name"] for repo in state.repositories("1")] == ["b/two", "c/three"]
+    state.close()
+
+
+def test_export_csv(open_state, tmp_path):
+    state = open_state()
+    state.add_repositories([{"id": 1, "full_name": "a/one"}, {"id": 2, "full_name": "b/two"}])
+    state.add_contributions("1", [contributor(10, "alice", 3), contributor(11, "bob")])
+    # Users are only registered once.
+    state.add_contributions("2", [contributor(11, "bob", 2)])
+    if isinstance(state, SqliteCrawlState):
+        # Exported to a folder that doesn't exist yet.
+        state.export_csv(str(tmp_path / "export" / "results"))
+        results_folder = tmp_path / "export" / "results"
+    else:
+        results_folder = tmp_path
+    state.close()
+
+    assert read(results_folder / "rest" / "repositories.csv") == "1,a/one\n2,b/two\n"
+    assert read(results_folder / "rest" / "users.csv") == "10, alice\n11, bob\n"
+    assert read(results_folder / "rest" / "contributions.csv") == "1,10,3\n1,11,1\n2,11,2\n"
+
+
+def test_csv_interrupted_batch(tmp_path):
+    state = CsvCrawlState(str(tmp_path))
+    state.add_contributions("1", [contributor(10, "alice")])
+    state.add_contributions("2", [contributor(11, "bob")])
+    state.close()
+    # Killed while writing the contributors of repository 3 : complete lines are left, and a partial one.
+    contributions_path = str(tmp_path / "rest" / "contributions.csv")
+    with open(contributions_path, "a") as contributions_file:
+        contributions_file.write("3,10,1\n3,11,1\n3,1")
+
+    state = CsvCrawlState(str(tmp_path))
+    assert state.last_repository_data_fetched() == "2"
+    # The getter doesn't repair the file : it is only repaired when opened for writing.
+    assert read(contributions_path).endswith("3,1")
+    assert rest_api.get_last_repository_data_fetched(str(tmp_path)) == "2"
+    state.add_contributions("3", [contributor(10, "alice"), contributor(11, "bob"), contributor(12, "carol")])
+    state.close()
+    assert read(contributions_path) == "1,10,1\n2,11,1\n3,10,1\n3,11,1\n3,12,1\n"
+
+
+def test_csv_interrupted_page(tmp_path):
+    state = CsvCrawlState(str(tmp_path))
+    state.add_graphql_nodes([{"node": {"id": "u1"}, "cursor": "c1"}])
+    state.close()
+    # Killed after writing the users of the next page, before its cursor.
+    with open(str(tmp_path / "graphql" / "graphql_data.txt"), "a") as raw_data:
+        raw_data.write('{"id": "u2"}\n{"id": "u3"}\n')
+
+    state = CsvCrawlState(str(tmp_path))
+    assert state.last_page_cursor() == "c1"
+    # The page is fetched again : its users are only written once.
+    state.add_graphql_nodes([{"node": {"id": "u2"}, "cursor": "c2"}, {"node": {"id": "u3"}, "cursor": "c3"}])
+    state.add_graphql_nodes([{"node": {"id": "u4"}, "cursor": "c4"}])
+    state.close()
+    assert read(tmp_path / "graphql" / "graphql_data.txt").split("\n") == ['{"id": "u1"}', '{"id": "u2"}',
+                                                                           '{"id": "u3"}', '{"id": "u4"}', '']
+    assert read(tmp_path / "graphql" / "page_cursors.txt") == "c1\nc2\nc3\nc4\n"
+
+
+def test_sqlite_uncommitted_batches(tmp_path):
+    state = SqliteCrawlState(str(tmp_path / "crawl.db"), commit_interval=2)
+    state.add_contributions("1", [contributor(10, "alice")])
+    state.add_contributions("2", [contributor(11, "bob")])
+    state.add_contributions("3", [contributor(12, "carol")])
+    # Interrupted without closing : the last batch, not committed yet, is lost with its checkpoint.
+    state._db.rollback()
+    state._db.close()
+
+    state = SqliteCrawlState(str(tmp_path / "crawl.db"))
+    assert state.last_repository_data_fetched() == "2"
+    state.export_csv(str(tmp_path))
+    state.close()
+    assert read(tmp_path / "rest" / "contributions.csv") == "1,10,1\n2,11,1\n"
+    assert not os.path.isfile(str(tmp_path / "rest" / "contributions.csv.committed"))
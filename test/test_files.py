@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from graphGitHub import files
+from graphGitHub.files import find_first_line_after, read_last_line, truncate_partial_line, truncate_uncommitted, \
+    write_committed_size
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Files are read backwards by blocks : small blocks make lines span several of them.
+    monkeypatch.setattr(files, "_BLOCK_SIZE", 4)
+
+
+def write(path, data):
+    with open(path, "wb") as file:
+        file.write(data)
+    return str(path)
+
+
+def test_read_last_line(tmp_path, small_blocks):
+    assert read_last_line(write(tmp_path / "file.csv", b"1,a\n22,bbbbbbbbbb\n\n")) == "22,bbbbbbbbbb"
+    assert read_last_line(write(tmp_path / "file.csv", b"1,a\n22,bb")) == "22,bb"
+    assert read_last_line(write(tmp_path / "file.csv", b"single line\n")) == "single line"
+    assert read_last_line(write(tmp_path / "file.csv", b"")) is None
+
+
+def test_truncate_partial_line(tmp_path, small_blocks):
+    path = write(tmp_path / "file.csv", b"1,a\n22,bbbbbbbbbb\n3,cccccccc")
+    truncate_partial_line(path)
+    assert open(path, "rb").read() == b"1,a\n22,bbbbbbbbbb\n"
+    truncate_partial_line(path)
+    assert open(path, "rb").read() == b"1,a\n22,bbbbbbbbbb\n"
+
+    path = write(tmp_path / "file.csv", b"no new line")
+    truncate_partial_line(path)
+    assert open(path, "rb").read() == b""
+
+
+def test_truncate_uncommitted(tmp_path):
+    path = str(tmp_path / "contributions.csv")
+    truncate_uncommitted(path)
+    with open(path, "a") as file, open(path + ".committed", "w") as committed_file:
+        file.write("1,10,1\n")
+        file.flush()
+        write_committed_size(file, committed_file)
+        file.write("2,10,1\n2,11,1\n")
+        file.flush()
+    truncate_uncommitted(path)
+    assert open(path, "rb").read() == b"1,10,1\n"
+
+    # An empty record, left by an interruption before the first size was written, is ignored.
+    write(path + ".committed", b"")
+    write(path, b"1,10,1\n2,10,1\n")
+    truncate_uncommitted(path)
+    assert open(path, "rb").read() == b"1,10,1\n2,10,1\n"
+
+
+def test_find_first_line_after(tmp_path):
+    rng = random.Random(0)
+    for _ in range(50):
+        keys = sorted(rng.sample(range(1000), rng.randint(0, 30)))
+        lines = [str(key) + ",owner/" + "x" * rng.randint(0, 20) + "\n" for key in keys]
+        path = write(tmp_path / "repositories.csv", "".join(lines).encode())
+        for key in range(-1, 1001, 7):
+            expected = sum(len(line) for line, line_key in zip(lines, keys) if line_key <= key)
+            assert find_first_line_after(path, key) == expected
@@ -0,0 +1,182 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from graphGitHub import gephi_delta
+from graphGitHub.gephi_delta import update_gephi
+
+GEPHI_FILES = ("nodes.csv", "edges.csv")
+
+
+def write_raw_files(folder, users, repositories, contributions, mode="w"):
+    # Writes (or appends) raw files in the format of the REST crawl.
+    with open(os.path.join(folder, "users.csv"), mode) as users_file:
+        users_file.write("".join(str(user_id) + ", " + login + "\n" for user_id, login in users))
+    with open(os.path.join(folder, "repositories.csv"), mode) as repositories_file:
+        repositories_file.write("".join(str(repo_id) + "," + name + "\n" for repo_id, name in repositories))
+    with open(os.path.join(folder, "contributions.csv"), mode) as contributions_file:
+        contributions_file.write("".join(",".join(str(value) for value in contribution) + "\n"
+                                         for contribution in contributions))
+
+
+def update(raw_folder, gephi_folder):
+    update_gephi(os.path.join(raw_folder, "users.csv"),
+                 os.path.join(raw_folder, "repositories.csv"),
+                 os.path.join(raw_folder, "contributions.csv"),
+                 gephi_folder)
+
+
+def read_files(folder, names=GEPHI_FILES):
+    contents = {}
+    for name in names:
+        with open(os.path.join(folder, name), "r") as file:
+            contents[name] = file.read()
+    return contents
+
+
+@pytest.fixture
+def folders(tmp_path):
+    raw_folder = tmp_path / "raw"
+    gephi_folder = tmp_path / "gephi"
+    raw_folder.mkdir()
+    gephi_folder.mkdir()
+    write_raw_files(str(raw_folder),
+                    [(1, "alice"), (2, "bob")],
+                    [(10, "alice/one"), (11, "bob/two")],
+                    [(10, 1, 5), (10, 2, 3), (11, 2, 7)])
+    update(str(raw_folder), str(gephi_folder))
+    return str(raw_folder), str(gephi_folder), tmp_path
+
+
+def from_scratch(raw_folder, tmp_path):
+    # Gephi files of a first update of the raw files, to which updates without new nodes must be equal.
+    gephi_folder = str(tmp_path / "from_scratch")
+    shutil.rmtree(gephi_folder, ignore_errors=True)
+    os.mkdir(gephi_folder)
+    update(raw_folder, gephi_folder)
+    return read_files(gephi_folder)
+
+
+def uninterrupted(raw_folder, gephi_folder, tmp_path):
+    # Copy of gephi_folder, updated without interruption.
+    reference_folder = str(tmp_path / "uninterrupted")
+    shutil.copytree(gephi_folder, reference_folder)
+    update(raw_folder, reference_folder)
+    return read_files(reference_folder)
+
+
+def test_first_update(folders):
+    raw_folder, gephi_folder, _ = folders
+    assert read_files(gephi_folder) == {
+        "nodes.csv": "id,label,type\n0, alice,user\n1, bob,user\n2,alice/one,repository\n3,bob/two,repository\n",
+        "edges.csv": "Source,Target,Weight\n0,2,5\n1,2,3\n1,3,7\n"}
+
+
+def test_appended_lines(folders):
+    raw_folder, gephi_folder, tmp_path = folders
+    write_raw_files(raw_folder, [(3, "carol")], [(12, "carol/three")], [(12, 3, 1), (11, 1, 2)], mode="a")
+    update(raw_folder, gephi_folder)
+
+    # New nodes are appended, after the existing ones.
+    assert read_files(gephi_folder) == {
+        "nodes.csv": "id,label,type\n0, alice,user\n1, bob,user\n2,alice/one,repository\n3,bob/two,repository\n"
+                     "4, carol,user\n5,carol/three,repository\n",
+        "edges.csv": "Source,Target,Weight\n0,2,5\n1,2,3\n1,3,7\n4,5,1\n0,3,2\n"}
+    assert read_files(gephi_folder, ("delta_nodes.csv", "delta_edges.csv")) == {
+        "delta_nodes.csv": "id,label,type\n4, carol,user\n5,carol/three,repository\n",
+        "delta_edges.csv": "Source,Target,Weight\n4,5,1\n0,3,2\n"}
+
+
+def test_partial_line_left_for_next_update(folders):
+    raw_folder, gephi_folder, tmp_path = folders
+    with open(os.path.join(raw_folder, "contributions.csv"), "a") as contributions_file:
+        contributions_file.write("11,1,")
+    update(raw_folder, gephi_folder)
+    assert read_files(gephi_folder)["edges.csv"] == "Source,Target,Weight\n0,2,5\n1,2,3\n1,3,7\n"
+
+    with open(os.path.join(raw_folder, "contributions.csv"), "a") as contributions_file:
+        contributions_file.write("4\n")
+    update(raw_folder, gephi_folder)
+    assert read_files(gephi_folder) == from_scratch(raw_folder, tmp_path)
+    assert read_files(gephi_folder)["edges.csv"].endswith("0,3,4\n")
+
+
+def test_changed_weight(folders):
+    raw_folder, gephi_folder, tmp_path = folders
+    # The contributors of repository 10 are fetched again.
+    write_raw_files(raw_folder, [], [], [(10, 1, 8), (10, 2, 3)], mode="a")
+    update(raw_folder, gephi_folder)
+
+    assert read_files(gephi_folder) == from_scratch(raw_folder, tmp_path)
+    assert read_files(gephi_folder)["edges.csv"] == "Source,Target,Weight\n0,2,8\n1,2,3\n1,3,7\n"
+    assert read_files(gephi_folder, ("delta_edges.csv",))["delta_edges.csv"] == "Source,Target,Weight\n0,2,8\n"
+
+    # Later updates start from the rewritten edges.csv.
+    write_raw_files(raw_folder, [], [], [(11, 2, 9), (11, 1, 1)], mode="a")
+    update(raw_folder, gephi_folder)
+    assert read_files(gephi_folder) == from_scratch(raw_folder, tmp_path)
+
+
+def test_interrupted_update_is_replayed(folders, monkeypatch):
+    raw_folder, gephi_folder, tmp_path = folders
+    write_raw_files(raw_folder, [(3, "carol")], [], [(11, 3, 1), (10, 1, 6)], mode="a")
+    expected = uninterrupted(raw_folder, gephi_folder, tmp_path)
+
+    def interrupt(state, watermark):
+        raise KeyboardInterrupt()
+
+    # Every file is written, but the watermark isn't.
+    monkeypatch.setattr(gephi_delta._DeltaState, "commit", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        update(raw_folder, gephi_folder)
+    monkeypatch.undo()
+
+    update(raw_folder, gephi_folder)
+    assert read_files(gephi_folder) == expected
+    assert expected["edges.csv"] == "Source,Target,Weight\n0,2,6\n1,2,3\n1,3,7\n4,3,1\n"
+
+
+def test_interrupted_rewrite_is_replayed(folders, monkeypatch):
+    raw_folder, gephi_folder, tmp_path = folders
+    write_raw_files(raw_folder, [], [], [(10, 1, 6)], mode="a")
+    write_edge_rows = gephi_delta._write_edge_rows
+
+    def interrupt(edge_file, rows):
+        # Interrupted in the middle of the rewrite of edges.csv, left shorter than before.
+        write_edge_rows(edge_file, rows[:1])
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(gephi_delta, "_write_edge_rows", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        update(raw_folder, gephi_folder)
+    monkeypatch.undo()
+    assert read_files(gephi_folder)["edges.csv"] == "Source,Target,Weight\n0,2,6\n"
+
+    update(raw_folder, gephi_folder)
+    assert read_files(gephi_folder) == from_scratch(raw_folder, tmp_path)
+    assert read_files(gephi_folder)["edges.csv"] == "Source,Target,Weight\n0,2,6\n1,2,3\n1,3,7\n"
+
+
+def test_rewritten_raw_file(folders):
+    raw_folder, gephi_folder, _ = folders
+    write_raw_files(raw_folder, [(1, "alice")], [(10, "alice/one")], [(10, 1, 5)])
+    with pytest.raises(ValueError):
+        update(raw_folder, gephi_folder)
+
+
+def test_state_files_appended(folders):
+    # The maps and the edge index of the previous updates are not written again.
+    raw_folder, gephi_folder, _ = folders
+    names = ("user_ids.bin", "repository_ids.bin", "edge_keys.bin")
+    delta_folder = os.path.join(gephi_folder, "delta")
+    before = {name: open(os.path.join(delta_folder, name), "rb").read() for name in names}
+    write_raw_files(raw_folder, [(3, "carol"), (0, "dan")], [(12, "carol/three")], [(12, 3, 1), (12, 0, 2)],
+                    mode="a")
+    update(raw_folder, gephi_folder)
+    for name in names:
+        data = open(os.path.join(delta_folder, name), "rb").read()
+        assert data.startswith(before[name]) and len(data) > len(before[name])
+    state = gephi_delta._DeltaState(delta_folder)
+    assert state.lookup("user", np.array([0, 1, 2, 3])).tolist() == [5, 0, 1, 4]
@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+
+import pytest
+
+from graphGitHub import graphql_api, queries
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_github import MockGitHub  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def server():
+    # Less users than the 1000 results limit of the search.
+    with MockGitHub(2000) as server:
+        yield server
+
+
+@pytest.fixture
+def mock_api(server, monkeypatch):
+    monkeypatch.setattr(graphql_api, "entry_point", server.url + "graphql")
+    return server
+
+
+def read_user_ids(results_folder):
+    return [node["id"] for node in graphql_api.read_graphql_nodes(results_folder)]
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def test_fetch_data(mock_api, tmp_path):
+    graphql_api.fetch_data("login", "token", total_node=50, users_by_query=20, results_folder=str(tmp_path))
+    user_ids = read_user_ids(str(tmp_path))
+    assert len(user_ids) == 60
+    assert len(set(user_ids)) == 60
+    with open(os.path.join(str(tmp_path), "graphql", "data.json"), "r") as data_file:
+        assert [node["id"] for node in json.load(data_file)] == user_ids
+
+
+@pytest.mark.parametrize("status_code, body, attempts", [(200, {"errors": [{"message": "Unsupported query"}]}, 3),
+                                                         (502, None, 3),
+                                                         (401, None, 1)])
+def test_fetch_data_failures(tmp_path, monkeypatch, status_code, body, attempts):
+    # Failed queries are retried a few times, with a backoff, and a rejected token stops the crawl at once.
+    posted = []
+    sleeps = []
+    monkeypatch.setattr(graphql_api, "post_query", lambda *args, **kwargs: posted.append(args) or
+                        FakeResponse(status_code, body))
+    monkeypatch.setattr(graphql_api.time, "sleep", sleeps.append)
+    graphql_api.fetch_data("login", "token", results_folder=str(tmp_path), write_json=False)
+    assert len(posted) == attempts
+    assert len(sleeps) == attempts - 1
+
+
+def test_persisted_queries_unsupported(mock_api, tmp_path):
+    # The mock, as GitHub, doesn't support persisted queries : they are sent again with their document, and only
+    # documents are sent after the first fallback.
+    requests_count = mock_api.requests_count
+    graphql_api.fetch_data("login", "token", total_node=60, users_by_query=20, results_folder=str(tmp_path),
+                           write_json=False, persisted_queries=True)
+    assert len(read_user_ids(str(tmp_path))) == 60
+    assert mock_api.requests_count - requests_count == 4
+
+
+def test_resumed_partitioned_crawl(mock_api, tmp_path, monkeypatch):
+    # Without created_to, the end of the range is recorded by the first call, and used again by the next ones.
+    results_folder = str(tmp_path)
+    graphql_api.fetch_partitioned_data("login", "token", total_node=40, results_folder=results_folder, workers=1,
+                                       write_json=False)
+    now = graphql_api.datetime.now
+    monkeypatch.setattr(graphql_api, "datetime", type("datetime", (graphql_api.datetime,), {
+        "now": staticmethod(lambda tz=None: now(tz) + graphql_api.timedelta(days=1))}))
+    graphql_api.fetch_partitioned_data("login", "token", total_node=40, results_folder=results_folder, workers=1,
+                                       write_json=False)
+    user_ids = read_user_ids(results_folder)
+    assert len(user_ids) == 80
+    assert len(set(user_ids)) == 80
+
+
+class FakeGraphQLClient:
+    # Answers the posted queries with the given responses, in order.
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.bodies = []
+        self.unpersisted_urls = set()
+
+    def post(self, url, cost=1, json=None):
+        self.bodies.append(json)
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("hash_response, unsupported", [
+    (FakeResponse(200, {"errors": [{"message": "Unsupported query"}]}), True),
+    (FakeResponse(200, {"errors": [{"message": "PersistedQueryNotFound"}]}), False),
+    (FakeResponse(502), False),
+    (FakeResponse(403), False)])
+def test_post_persisted_query(hash_response, unsupported):
+    client = FakeGraphQLClient([hash_response, FakeResponse(200, {"data": {}}), FakeResponse(200, {"data": {}})])
+    queries.post_query(client, "url", queries.SEARCH_USERS, {"first": 1}, persisted=True)
+    assert "query" not in client.bodies[0] and "query" in client.bodies[1]
+    # Only a server answering the hash with other GraphQL errors doesn't support persisted queries.
+    assert client.unpersisted_urls == ({"url"} if unsupported else set())
+    queries.post_query(client, "url", queries.SEARCH_USERS, {"first": 1}, persisted=True)
+    assert ("query" in client.bodies[2]) == unsupported
+
+
+def repository_node(repository_id):
+    return {"id": repository_id, "name": repository_id, "stargazers": {"totalCount": 1},
+            "primaryLanguage": {"name": "Python"}}
+
+
+def repositories_page(repository_ids, end_cursor, has_next_page, total_count=3):
+    return {"totalCount": total_count, "pageInfo": {"endCursor": end_cursor, "hasNextPage": has_next_page},
+            "nodes": [repository_node(repository_id) for repository_id in repository_ids]}
+
+
+def test_fetch_missing_repositories(tmp_path, monkeypatch):
+    results_folder = str(tmp_path)
+    os.makedirs(os.path.join(results_folder, "graphql"))
+    nodes = [{"id": "u1", "name": "one", "repositoriesContributedTo": repositories_page(["r1"], "c1", True)},
+             {"id": "u2", "name": "two", "repositoriesContributedTo": repositories_page(["r1"], "c2", False, 1)}]
+    with open(os.path.join(results_folder, "graphql", "graphql_data.txt"), "w") as raw_data:
+        raw_data.writelines(json.dumps(node) + "\n" for node in nodes)
+    graphql_api.graphql2csv(results_folder)
+
+    rate_limit = {"cost": 1, "remaining": 4999, "resetAt": "2030-01-01T00:00:00Z"}
+    responses = [FakeResponse(502),
+                 FakeResponse(200, {"data": {"rateLimit": rate_limit,
+                                             "user0": {"repositoriesContributedTo": repositories_page(["r2"], "c3",
+                                                                                                      True)}}}),
+                 FakeResponse(502), FakeResponse(502), FakeResponse(502)]
+    posted = []
+    sleeps = []
+    monkeypatch.setattr(graphql_api, "post_query", lambda client, url, query, variables, **kwargs:
+                        posted.append(dict(variables)) or responses.pop(0))
+    monkeypatch.setattr(graphql_api.time, "sleep", sleeps.append)
+    # The first failure is retried, and the run gives up after 3 failures in a row.
+    graphql_api.fetch_missing_repositories("login", "token", results_folder=results_folder)
+    assert [variables["after0"] for variables in posted] == ["c1", "c1", "c3", "c3", "c3"]
+    assert len(sleeps) == 3
+
+    # The fetched pages are kept when graphql_data.txt is written again, and resumed from.
+    with open(os.path.join(results_folder, "graphql", "graphql_data.txt"), "w") as raw_data:
+        raw_data.writelines(json.dumps(node) + "\n" for node in nodes)
+    responses[:] = [FakeResponse(200, {"data": {"rateLimit": rate_limit, "user0": {
+        "repositoriesContributedTo": repositories_page(["r2", "r3"], "c4", False)}}})]
+    graphql_api.fetch_missing_repositories("login", "token", results_folder=results_folder)
+    assert posted[-1]["after0"] == "c3"
+    assert [[repository["id"] for repository in node["repositoriesContributedTo"]["nodes"]]
+            for node in graphql_api.read_graphql_nodes(results_folder)] == [["r1", "r2", "r3"], ["r1"]]
+
+    # The incremental conversion adds the repositories of the users already converted.
+    graphql_api.graphql2csv(results_folder, incremental=True)
+    with open(os.path.join(results_folder, "graphql", "contributions.csv"), "r") as contributions_file:
+        assert contributions_file.read().split() == ["u1,r1", "u2,r1", "u1,r2", "u1,r3"]
+    with open(os.path.join(results_folder, "graphql", "repositories.csv"), "r") as repositories_file:
+        assert [line.split(",")[0] for line in repositories_file] == ["r1", "r2", "r3"]
+    graphql_api.graphql2csv(results_folder, incremental=True)
+    with open(os.path.join(results_folder, "graphql", "contributions.csv"), "r") as contributions_file:
+        assert contributions_file.read().split() == ["u1,r1", "u2,r1", "u1,r2", "u1,r3"]
+
+
+def write_raw_data(results_folder, nodes, mode="w"):
+    os.makedirs(os.path.join(results_folder, "graphql"), exist_ok=True)
+    with open(os.path.join(results_folder, "graphql", "graphql_data.txt"), mode) as raw_data:
+        raw_data.writelines(json.dumps(node) + "\n" for node in nodes)
+
+
+def user_node(user_id, repository_ids):
+    return {"id": user_id, "name": "name " + user_id,
+            "repositoriesContributedTo": repositories_page(repository_ids, None, False, len(repository_ids))}
+
+
+def read_csv_files(results_folder):
+    contents = {}
+    for name in ("users", "repositories", "contributions"):
+        with open(os.path.join(results_folder, "graphql", name + ".csv"), "r") as csv_file:
+            contents[name] = csv_file.read()
+    return contents
+
+
+def test_streamed_conversion(tmp_path):
+    # graphql_data.txt and data.json give the same csv files.
+    nodes = [user_node("u1", ["r1", "r2"]), user_node("u2", ["r2"]), user_node("u3", [])]
+    raw_folder = str(tmp_path / "raw")
+    write_raw_data(raw_folder, nodes)
+    with open(os.path.join(raw_folder, "graphql", "graphql_data.txt"), "a") as raw_data:
+        raw_data.write("\n")
+    graphql_api.graphql2csv(raw_folder)
+
+    json_folder = str(tmp_path / "json")
+    os.makedirs(os.path.join(json_folder, "graphql"))
+    graphql_api._raw2json(os.path.join(raw_folder, "graphql", "graphql_data.txt"),
+                          os.path.join(json_folder, "graphql", "data.json"))
+    with open(os.path.join(json_folder, "graphql", "data.json"), "r") as data_file:
+        assert json.load(data_file) == nodes
+    assert list(graphql_api.read_graphql_nodes(json_folder)) == nodes
+    graphql_api.graphql2csv(json_folder)
+
+    assert read_csv_files(raw_folder) == read_csv_files(json_folder)
+    assert read_csv_files(raw_folder) == {
+        "users": "u1,name u1\nu2,name u2\nu3,name u3\n",
+        "repositories": "r1,r1,1,Python\nr2,r2,1,Python\n",
+        "contributions": "u1,r1\nu1,r2\nu2,r2\n"}
+
+
+def test_incremental_conversion(tmp_path):
+    results_folder = str(tmp_path)
+    write_raw_data(results_folder, [user_node("u1", ["r1", "r2"]), user_node("u2", ["r2"])])
+    graphql_api.graphql2csv(results_folder)
+    # Interrupted while writing a row of the next conversion.
+    with open(os.path.join(results_folder, "graphql", "contributions.csv"), "a") as contributions_file:
+        contributions_file.write("u3,r")
+
+    # Only the new users are converted, and known repositories are not written again.
+    write_raw_data(results_folder, [user_node("u3", ["r2", "r3"])], mode="a")
+    graphql_api.graphql2csv(results_folder, incremental=True)
+    assert read_csv_files(results_folder) == {
+        "users": "u1,name u1\nu2,name u2\nu3,name u3\n",
+        "repositories": "r1,r1,1,Python\nr2,r2,1,Python\nr3,r3,1,Python\n",
+        "contributions": "u1,r1\nu1,r2\nu2,r2\nu3,r2\nu3,r3\n"}
+    graphql_api.graphql2csv(results_folder, incremental=True)
+    assert read_csv_files(results_folder)["contributions"] == "u1,r1\nu1,r2\nu2,r2\nu3,r2\nu3,r3\n"
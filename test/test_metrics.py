@@ -0,0 +1,73 @@
+import os
+import pstats
+
+import pytest
+
+from graphGitHub import metrics as metrics_module
+from graphGitHub.metrics import Metrics, disable_profiling, enable_profiling, record_file, stage
+
+
+def test_prometheus_text(tmp_path):
+    registry = Metrics()
+    updates = []
+    registry.add_listener(lambda *update: updates.append(update))
+    registry.increment("github_requests_total", labels={"method": "GET", "status": "200"})
+    registry.increment("github_requests_total", 2, {"method": "GET", "status": "200"})
+    registry.set_gauge("github_rate_limit_remaining", 4999)
+    registry.observe("stage_duration_seconds", 0.3, {"stage": 'a "quoted" stage'})
+    assert updates[0] == ("counter", "github_requests_total", {"method": "GET", "status": "200"}, 1)
+
+    registry.write_prometheus(str(tmp_path / "metrics.prom"))
+    with open(str(tmp_path / "metrics.prom"), "r") as prometheus_file:
+        lines = prometheus_file.read().splitlines()
+    assert lines[:4] == ["# TYPE github_requests_total counter",
+                         'github_requests_total{method="GET",status="200"} 3.0',
+                         "# TYPE github_rate_limit_remaining gauge",
+                         "github_rate_limit_remaining 4999.0"]
+    assert lines[4] == "# TYPE stage_duration_seconds histogram"
+    assert 'stage_duration_seconds_bucket{stage="a \\"quoted\\" stage",le="0.25"} 0' in lines
+    assert 'stage_duration_seconds_bucket{stage="a \\"quoted\\" stage",le="0.5"} 1' in lines
+    assert 'stage_duration_seconds_bucket{stage="a \\"quoted\\" stage",le="+Inf"} 1' in lines
+    assert lines[-1] == 'stage_duration_seconds_count{stage="a \\"quoted\\" stage"} 1'
+    assert not os.path.isfile(str(tmp_path / "metrics.prom.tmp"))
+
+
+def test_record_file(tmp_path, monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    path = str(tmp_path / "edges.csv")
+    with open(path, "w") as file:
+        file.write("Source,Target,Weight\n0,1,1\n")
+    record_file(path, 1, len("Source,Target,Weight\n"))
+    assert registry.counters == {("rows_written_total", (("output", "edges.csv"),)): 1,
+                                 ("bytes_written_total", (("output", "edges.csv"),)): len("0,1,1\n")}
+
+
+@pytest.fixture
+def profiling(tmp_path):
+    enable_profiling(str(tmp_path), cpu=True, memory=True)
+    yield str(tmp_path)
+    disable_profiling()
+
+
+def test_stage(profiling, monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+
+    @stage("inner")
+    def inner():
+        return [0] * 1000
+
+    @stage("outer")
+    def outer():
+        return len(inner())
+
+    assert outer() == 1000
+    assert registry.histograms[("stage_duration_seconds", (("stage", "outer"),))].count == 1
+    assert registry.histograms[("stage_duration_seconds", (("stage", "inner"),))].count == 1
+    # The inner stage is profiled with the outer one.
+    assert os.path.isfile(os.path.join(profiling, "outer.prof"))
+    assert not os.path.isfile(os.path.join(profiling, "inner.prof"))
+    assert any(function[2] == "inner" for function in pstats.Stats(os.path.join(profiling, "outer.prof")).stats)
+    assert os.path.isfile(os.path.join(profiling, "outer.tracemalloc.txt"))
+    assert registry.gauges[("stage_peak_traced_memory_bytes", (("stage", "outer"),))] > 0
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+from graphGitHub import clean_data, rest_api
+from graphGitHub.parallel import line_aligned_chunks
+
+
+def read_file(path):
+    with open(path, "r") as file:
+        return file.read()
+
+
+def test_line_aligned_chunks(tmp_path):
+    path = str(tmp_path / "edges.csv")
+    with open(path, "w") as file:
+        file.write("Source,Target,Weight\n" + "".join(str(i) + "," + "x" * (i % 7) + "\n" for i in range(100)))
+    for chunks_count in (1, 3, 8, 200):
+        chunks = line_aligned_chunks(path, chunks_count, skip_header=True)
+        assert len(chunks) <= chunks_count
+        # The chunks cover all the lines but the header, each one in a single chunk.
+        assert chunks[0][0] == len("Source,Target,Weight\n") and chunks[-1][1] == os.path.getsize(path)
+        with open(path, "rb") as file:
+            data = file.read()
+        for (start, end), (next_start, _) in zip(chunks, chunks[1:] + [(len(data), None)]):
+            assert end == next_start and data[end - 1:end] == b"\n"
+
+
+@pytest.fixture
+def raw_folder(tmp_path):
+    # Raw files of a random crawl, with contributions in a random order.
+    rng = np.random.default_rng(0)
+    with open(str(tmp_path / "users.csv"), "w") as users_file:
+        users_file.writelines(str(user_id) + ", user" + str(user_id) + "\n" for user_id in range(1000, 1100))
+    with open(str(tmp_path / "repositories.csv"), "w") as repositories_file:
+        repositories_file.writelines(str(repository_id) + ",owner/repository" + str(repository_id) + "\n"
+                                     for repository_id in range(1, 60))
+    contributions = np.unique(np.column_stack((rng.integers(1, 60, 2000), rng.integers(1000, 1100, 2000))), axis=0)
+    with open(str(tmp_path / "contributions.csv"), "w") as contributions_file:
+        contributions_file.writelines("{},{},{}\n".format(repository_id, user_id, weight) for (repository_id, user_id),
+                                      weight in zip(contributions.tolist(), rng.integers(1, 50, len(contributions))))
+    return tmp_path
+
+
+def test_parallel_parity(raw_folder):
+    # The parallel conversions give the same files as the serial ones.
+    results = {}
+    for workers in (1, 3):
+        folder = raw_folder / ("workers" + str(workers))
+        folder.mkdir()
+        rest_api.raw2gephi(str(raw_folder / "users.csv"), str(raw_folder / "repositories.csv"),
+                           str(raw_folder / "contributions.csv"), str(folder), chunk_size=100, workers=workers)
+        distributions = clean_data.compute_distributions(str(folder / "edges.csv"), plot=False, workers=workers)
+        clean_data.clean(str(folder / "nodes.csv"), str(folder / "edges.csv"), str(folder), 30, 20, workers=workers)
+        results[workers] = (distributions, [read_file(str(folder / name)) for name in
+                                            ("nodes.csv", "edges.csv", "clean_nodes.csv", "clean_edges.csv")])
+    assert results[1] == results[3]
+    assert results[1][1][3].count("\n") > 1
@@ -0,0 +1,65 @@
+import time
+
+from graphGitHub.metrics import metrics
+from graphGitHub.rate_limit import RateLimiter
+
+
+def waits_count():
+    return metrics.counters.get(("github_rate_limit_waits_total", ()), 0)
+
+
+def test_acquire_consumes_tokens():
+    limiter = RateLimiter(reserve=10)
+    # Nothing is known before the first response.
+    limiter.acquire(1000)
+    assert limiter.remaining is None
+    limiter.update(100, time.time() + 3600)
+    limiter.acquire(5)
+    assert limiter.remaining == 95
+    limiter.release(5)
+    assert limiter.remaining == 100
+
+
+def test_acquire_waits_until_reset():
+    limiter = RateLimiter(reserve=10)
+    reset = time.time() + 3600
+    limiter.update(12, reset)
+    timeouts = []
+
+    def wait(timeout):
+        # A response of the next window arrives while waiting.
+        timeouts.append(timeout)
+        limiter.update(5000, reset + 3600)
+
+    limiter._condition.wait = wait
+    waits = waits_count()
+    limiter.acquire(2)
+    assert limiter.remaining == 10
+    # The reserve is kept : the next request waits for the next window.
+    limiter.acquire(1)
+    assert len(timeouts) == 1 and 3590 < timeouts[0] <= 3601
+    assert waits_count() == waits + 1
+    assert limiter.remaining == 4999
+
+
+def test_acquire_after_reset():
+    # The window is over : the budget is unknown until the next response.
+    limiter = RateLimiter(reserve=10)
+    limiter.update(10, time.time() - 1)
+    waits = waits_count()
+    limiter.acquire(1)
+    assert limiter.remaining is None
+    assert waits_count() == waits
+
+
+def test_out_of_order_updates():
+    limiter = RateLimiter()
+    reset = time.time() + 3600
+    limiter.update(4000, reset)
+    # Late response of the same window.
+    limiter.update(4500, reset)
+    assert limiter.remaining == 4000
+    limiter.update_from_headers({"X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": str(int(reset) + 3600)})
+    assert limiter.remaining == 4999
+    limiter.update_from_graphql({"cost": 1, "remaining": 4990, "resetAt": "2000-01-01T00:00:00Z"})
+    assert limiter.remaining == 4990
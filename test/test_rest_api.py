@@ -0,0 +1,164 @@
+import csv
+import os
+import sys
+
+import pytest
+import requests
+
+from graphGitHub import columnar, rest_api
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_github import MockGitHub  # noqa: E402
+
+
+def read_rows(path, header=False):
+    with open(path, "r") as file:
+        rows = [tuple(row) for row in csv.reader(file)]
+    return rows[1:] if header else rows
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockGitHub(3000, repositories_by_page=20) as server:
+        yield server
+
+
+@pytest.fixture
+def mock_api(server, monkeypatch):
+    monkeypatch.setattr(rest_api, "entry_point", server.url)
+    return server
+
+
+def sequential_crawl(results_folder, total_repositories):
+    rest_api.fetch_repositories("login", "token", total_repositories=total_repositories,
+                                results_folder=results_folder)
+    rest_api.fetch_data("login", "token", results_folder=results_folder)
+
+
+def check_gephi_files(gephi_folder, results_folder):
+    # Each node is written once, and each contribution is an edge between the nodes of its user and repository.
+    nodes = read_rows(os.path.join(gephi_folder, "nodes.csv"), header=True)
+    assert [int(node[0]) for node in nodes] == list(range(len(nodes)))
+    ids = {(node_type, original_id): int(gephi_id)
+           for gephi_id, node_type, original_id in read_rows(os.path.join(gephi_folder, "id_map.csv"))}
+    assert len(ids) == len(nodes)
+    expected_edges = {(str(ids[("user", user_id)]), str(ids[("repository", repository_id)]), weight)
+                      for repository_id, user_id, weight
+                      in read_rows(os.path.join(results_folder, "rest", "contributions.csv"))}
+    edges = read_rows(os.path.join(gephi_folder, "edges.csv"), header=True)
+    assert len(edges) == len(expected_edges)
+    assert set(edges) == expected_edges
+
+
+def test_crawl(mock_api, tmp_path):
+    results_folder = str(tmp_path / "crawl")
+    gephi_folder = str(tmp_path / "crawl" / "gephi")
+    rest_api.crawl("login", "token", total_repositories=40, results_folder=results_folder, workers=4,
+                   gephi_folder=gephi_folder)
+    sequential_folder = str(tmp_path / "sequential")
+    sequential_crawl(sequential_folder, 40)
+
+    for name in ("repositories.csv", "users.csv", "contributions.csv"):
+        assert read_rows(os.path.join(results_folder, "rest", name)) == \
+               read_rows(os.path.join(sequential_folder, "rest", name))
+    check_gephi_files(gephi_folder, results_folder)
+
+
+def test_resumed_crawl(mock_api, tmp_path):
+    results_folder = str(tmp_path / "crawl")
+    gephi_folder = str(tmp_path / "crawl" / "gephi")
+    rest_api.crawl("login", "token", total_repositories=20, results_folder=results_folder, workers=2,
+                   gephi_folder=gephi_folder)
+    rest_api.crawl("login", "token", total_repositories=20, results_folder=results_folder, workers=2,
+                   gephi_folder=gephi_folder)
+    sequential_folder = str(tmp_path / "sequential")
+    sequential_crawl(sequential_folder, 40)
+
+    for name in ("repositories.csv", "users.csv", "contributions.csv"):
+        assert read_rows(os.path.join(results_folder, "rest", name)) == \
+               read_rows(os.path.join(sequential_folder, "rest", name))
+    check_gephi_files(gephi_folder, results_folder)
+
+
+def test_gephi_writer_interrupted_repository(tmp_path):
+    gephi_folder = str(tmp_path)
+    contributors = [{"id": 10, "login": "alice", "contributions": 2}, {"id": 11, "login": "bob", "contributions": 1}]
+    writer = rest_api._GephiWriter(gephi_folder)
+    writer.add_repository({"id": 1, "full_name": "a/one"}, contributors[:1])
+    writer.close()
+    id_map_size = os.path.getsize(os.path.join(gephi_folder, "id_map.csv"))
+    writer = rest_api._GephiWriter(gephi_folder)
+    writer.add_repository({"id": 2, "full_name": "b/two"}, contributors)
+    writer.close()
+    expected = {name: read_rows(os.path.join(gephi_folder, name)) for name in ("nodes.csv", "edges.csv", "id_map.csv")}
+
+    # Killed while writing the mapping of repository 2, after its nodes and edges.
+    with open(os.path.join(gephi_folder, "id_map.csv"), "rb+") as id_map:
+        id_map.truncate(id_map_size + len("2,repository,2\n"))
+    writer = rest_api._GephiWriter(gephi_folder)
+    writer.add_repository({"id": 2, "full_name": "b/two"}, contributors)
+    writer.close()
+    assert {name: read_rows(os.path.join(gephi_folder, name)) for name in expected} == expected
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, next_url=None):
+        self.status_code = status_code
+        self._body = body
+        self.links = {} if next_url is None else {"next": {"url": next_url}}
+
+    def json(self):
+        return self._body
+
+
+class FakeClient:
+    # Answers the requests with the given responses, in order.
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, params=None):
+        return self.responses.pop(0)
+
+
+def test_contributors_pages():
+    pages = [FakeResponse(200, [{"id": 1}, {"id": 2}], "page2"), FakeResponse(200, [{"id": 3}])]
+    assert rest_api._fetch_contributors(FakeClient(pages), "a/one", None) == [{"id": 1}, {"id": 2}, {"id": 3}]
+    # A deleted or blocked repository has no contributors.
+    assert rest_api._fetch_contributors(FakeClient([FakeResponse(404)]), "a/one", None) == []
+    assert rest_api._fetch_contributors(FakeClient([FakeResponse(204)]), "a/one", None) == []
+
+
+def test_contributors_pages_failure():
+    # Contributors already fetched are incomplete : the repository must not be written.
+    pages = [FakeResponse(200, [{"id": 1}, {"id": 2}], "page2"), FakeResponse(502)]
+    with pytest.raises(requests.HTTPError):
+        rest_api._fetch_contributors(FakeClient(pages), "a/one", None)
+
+
+def test_raw2gephi_quoted_labels(tmp_path):
+    pytest.importorskip("pyarrow")
+    # Labels containing commas or quotes are quoted, and the nodes are read back as written.
+    with open(str(tmp_path / "users.csv"), "w", newline="") as users_file:
+        csv.writer(users_file, lineterminator="\n").writerows([(10, "alice"), (11, 'bob "the, builder"')])
+    with open(str(tmp_path / "repositories.csv"), "w", newline="") as repositories_file:
+        csv.writer(repositories_file, lineterminator="\n").writerows([(1, "a/one, two")])
+    with open(str(tmp_path / "contributions.csv"), "w") as contributions_file:
+        contributions_file.write("1,10,2\n1,11,1\n")
+    gephi_folder = str(tmp_path / "gephi")
+    os.makedirs(gephi_folder)
+    rest_api.raw2gephi(str(tmp_path / "users.csv"), str(tmp_path / "repositories.csv"),
+                       str(tmp_path / "contributions.csv"), gephi_folder, columnar="parquet")
+    expected = [(0, "alice", "user"), (1, 'bob "the, builder"', "user"), (2, "a/one, two", "repository")]
+    assert [(int(node[0]), node[1], node[2])
+            for node in read_rows(os.path.join(gephi_folder, "nodes.csv"), header=True)] == expected
+    assert list(columnar.read_rows(os.path.join(gephi_folder, "nodes.parquet"))) == expected
+
+
+def test_gephi_writer_quoted_labels(tmp_path):
+    pytest.importorskip("pyarrow")
+    writer = rest_api._GephiWriter(str(tmp_path))
+    writer.add_repository({"id": 1, "full_name": 'a/"one"'}, [{"id": 10, "login": "a,b", "contributions": 2}])
+    writer.close()
+    columnar.csv2columnar(str(tmp_path / "nodes.csv"), str(tmp_path / "nodes.arrow"), columnar.NODES_COLUMNS)
+    assert list(columnar.read_rows(str(tmp_path / "nodes.arrow"))) == [(0, 'a/"one"', "repository"),
+                                                                       (1, "a,b", "user")]